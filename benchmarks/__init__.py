@@ -0,0 +1 @@
+"""YogiSync benchmarks (synthetic corpora + timing)."""
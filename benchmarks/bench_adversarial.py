@@ -0,0 +1,170 @@
+"""
+壊れた・悪意のある本文に対するパーサのベンチ（fuzz + 既知の最悪ケース）。
+
+    python -m benchmarks.bench_adversarial --scale 200000
+    python -m benchmarks.bench_adversarial --fuzz 2000 --regex-engine re2
+
+ParseStage（本文の上限 PARSE_MAX_BODY_CHARS・1通の締め切り PARSE_TIME_BUDGET 込み）に1通ずつ通し、
+ケースごとに最大・p95 の時間と、締め切りで諦めた件数・例外の件数を出す。
+最悪ケースは、以前のパターンで入力長の二乗になっていたもの:
+  - 括弧だらけで閉じ括弧で終わるタイトル（_cleanup_peatix_title）
+  - 「住所」の後に改行だけが続く本文（住所の fallback）
+  - 「確認番号」の後に空白だけが続く本文（_extract_reservation_id）
+  - text_plain が無く、1行が数百KBの HTML（extract_label_value の値）
+fuzz はコーパスのメールをランダムに切り貼り・複製・破壊したもの。
+一番遅い1通が --max-ms を超えたら exit 1。
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import random
+import sys
+import time
+from dataclasses import replace
+from typing import Callable, Dict, List, Optional, Sequence
+
+from yogisync_core.config import Config
+from yogisync_core.models import GmailMessage, SyncResult
+from yogisync_core.parsers import set_regex_engine
+from yogisync_core.stages import Detected, ParseStage, StageContext
+from yogisync_core.store import EventStore
+from yogisync_core.telemetry import Telemetry
+
+from .corpus import PROVIDERS, generate_corpus
+
+_FUZZ_TOKENS = ["(", ")", "（", "）", " ", "\n", "　", ":", "：", "住所", "確認番号", "予約番号", "<td>", "</td>", "&nbsp;"]
+
+
+def _html(body: str) -> str:
+    return f"<html><body><table><tr><td>{body}</td></tr></table></body></html>"
+
+
+def _cases(scale: int) -> Dict[str, List[Detected]]:
+    n = scale
+    return {
+        "peatix_title_parens": [
+            Detected(GmailMessage("adv-title", subject="【Peatix】" + "ヨガ(" * (n // 4) + "x)", text_html=_html("2026/01/10 10:00")), "peatix")
+        ],
+        "peatix_address_newlines": [
+            Detected(GmailMessage("adv-addr", subject="x", text_html=_html("2026/01/10 10:00<br>住所" + "<br>" * (n // 4))), "peatix")
+        ],
+        "peatix_reservation_spaces": [
+            Detected(GmailMessage("adv-rid", subject="x", text_html=_html("2026/01/10 10:00 確認番号" + " " * n)), "peatix")
+        ],
+        "html_only_long_line": [
+            Detected(
+                GmailMessage("adv-line-" + p, subject="x", text_html="予約番号: " + "<span>a</span>" * (n // 14) + " 2026/01/10 10:00"),
+                p,
+            )
+            for p in ("bonne", "yes_tokyo", "mosh", "life_tuning")
+        ],
+        "label_whitespace_runs": [
+            Detected(GmailMessage("adv-ws-" + p, subject="x", text_plain=("クラス" + " " * 50) * (n // 56) + "2026/01/10 10:00"), p)
+            for p in ("bonne", "yes_tokyo", "mosh")
+        ],
+    }
+
+
+def _fuzz(count: int, seed: int) -> List[Detected]:
+    rng = random.Random(seed)
+    base = {p: generate_corpus(p, 20, seed=seed) for p in PROVIDERS}
+    out: List[Detected] = []
+    for i in range(count):
+        provider = rng.choice(PROVIDERS)
+        src = rng.choice(base[provider])
+        body = src.text_html if provider == "peatix" or not src.text_plain else src.text_plain
+        body = body or ""
+        op = rng.randrange(4)
+        if op == 0:
+            # ランダムな位置を切り取って繰り返す
+            a = rng.randrange(len(body) + 1)
+            b = min(len(body), a + rng.randrange(1, 200))
+            body = body[:a] + body[a:b] * rng.randrange(1, 500) + body[b:]
+        elif op == 1:
+            # 区切り記号・ラベルを大量に差し込む
+            pos = rng.randrange(len(body) + 1)
+            body = body[:pos] + "".join(rng.choice(_FUZZ_TOKENS) for _ in range(rng.randrange(100, 5000))) + body[pos:]
+        elif op == 2:
+            # 途中で切る（閉じタグ・日付の途中で終わる）
+            body = body[: rng.randrange(len(body) + 1)]
+        else:
+            # 改行を全部落として1行にする
+            body = body.replace("\n", " ")
+        msg = GmailMessage(f"fuzz-{i}", subject=src.subject, from_email=src.from_email)
+        if provider == "peatix" or not src.text_plain:
+            msg.text_html = body
+        else:
+            msg.text_plain = body
+        out.append(Detected(msg, provider))
+    return out
+
+
+def _run(items: Sequence[Detected], ctx: StageContext, stage: ParseStage) -> Dict[str, float]:
+    samples: List[float] = []
+    before = ctx.telemetry.counter_total("parse_failures", reason="parse_budget")
+    errors_before = ctx.result.errors
+    for item in items:
+        start = time.perf_counter()
+        stage(item, ctx)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    p95 = samples[max(0, math.ceil(len(samples) * 0.95) - 1)] if samples else 0.0
+    return {
+        "items": len(samples),
+        "max_ms": samples[-1] * 1000 if samples else 0.0,
+        "p95_ms": p95 * 1000,
+        "abandoned": ctx.telemetry.counter_total("parse_failures", reason="parse_budget") - before,
+        "errors": ctx.result.errors - errors_before,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="YogiSync parser adversarial/fuzz benchmark")
+    ap.add_argument("--scale", type=int, default=100_000, help="Approximate size in chars of each worst-case body")
+    ap.add_argument("--fuzz", type=int, default=500, help="Number of fuzzed corpus messages")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--regex-engine", default="re", choices=["re", "re2"])
+    ap.add_argument("--time-budget", type=float, default=2.0, help="Per-message parse budget in seconds (0 = none)")
+    ap.add_argument("--max-body-chars", type=int, default=1_000_000)
+    ap.add_argument("--max-ms", type=float, default=0.0, help="Exit 1 if the slowest message exceeds this (0 = report only)")
+    args = ap.parse_args(argv)
+
+    engine = set_regex_engine(args.regex_engine)
+    config = Config(
+        gmail_query="",
+        google_client_secret_path="",
+        google_token_path="",
+        yogisync_calendar_id="bench",
+        timezone="Asia/Tokyo",
+        sqlite_path=":memory:",
+        default_event_duration_minutes=60,
+    )
+    config = replace(config, parse_time_budget=args.time_budget, parse_max_body_chars=args.max_body_chars)
+    store = EventStore(config.sqlite_path)
+    ctx = StageContext(config, store, None, Telemetry(), SyncResult())
+    stage = ParseStage()
+
+    suites: Dict[str, Callable[[], List[Detected]]] = {name: (lambda v=v: v) for name, v in _cases(args.scale).items()}
+    suites["fuzz"] = lambda: _fuzz(args.fuzz, args.seed)
+
+    print(f"regex engine: {engine}  time budget: {args.time_budget}s  max body: {args.max_body_chars} chars")
+    print(f"{'case':<28} {'items':>6} {'max ms':>10} {'p95 ms':>10} {'abandoned':>10} {'errors':>7}")
+    slowest = 0.0
+    for name, build in suites.items():
+        r = _run(build(), ctx, stage)
+        slowest = max(slowest, r["max_ms"])
+        print(
+            f"{name:<28} {int(r['items']):>6} {r['max_ms']:>10.1f} {r['p95_ms']:>10.1f} "
+            f"{int(r['abandoned']):>10} {int(r['errors']):>7}"
+        )
+    store.close()
+
+    if args.max_ms and slowest > args.max_ms:
+        print(f"slowest message took {slowest:.1f} ms (> {args.max_ms} ms)", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
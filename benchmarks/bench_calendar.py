@@ -0,0 +1,120 @@
+"""
+reconcile / dedupe のベンチ（ローカルカレンダーで、Google Calendar API は使わない）。
+
+    python -m benchmarks.bench_calendar --events 2000 --dup-ratio 0.2
+
+LocalCalendarBackend に対して
+  1. reconcile（空のカレンダーに insert）
+  2. reconcile（全件 update）
+  3. 一部の event_uid に重複を足してから dedupe_calendar
+を測る。ネットワーク待ちが無いので、reconcile / dedupe のロジックと検索そのものの重さが見える。
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+from yogisync_core.calendar_backend import LocalCalendarBackend
+from yogisync_core.config import Config
+from yogisync_core.dedupe import dedupe_calendar
+from yogisync_core.models import Event
+from yogisync_core.store import EventStore
+from yogisync_core.sync_gcal import _build_event_body, reconcile_event
+
+PROVIDERS = ("bonne", "yes_tokyo", "peatix", "mosh", "life_tuning")
+
+
+def make_events(n: int, seed: int = 1) -> List[Event]:
+    rng = random.Random(seed)
+    base = datetime(2026, 1, 1, 7, 0, tzinfo=ZoneInfo("Asia/Tokyo"))
+    events: List[Event] = []
+    for i in range(n):
+        events.append(
+            Event(
+                provider=PROVIDERS[i % len(PROVIDERS)],
+                title=f"Yoga class {i}",
+                date=base + timedelta(days=rng.randrange(365), hours=rng.randrange(14)),
+                location_name=f"Studio {i % 17}",
+                reservation_id=f"R{i:06d}",
+            )
+        )
+    return events
+
+
+def _row(label: str, count: int, seconds: float) -> None:
+    per_op = seconds / count * 1e6 if count else 0.0
+    print(f"{label:<18} {count:>7} ops {seconds:>8.3f}s {per_op:>9.1f} us/op")
+
+
+def _timed(fn: Callable[[], int]) -> tuple:
+    start = time.perf_counter()
+    count = fn()
+    return count, time.perf_counter() - start
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="YogiSync reconcile/dedupe benchmark (local calendar backend)")
+    ap.add_argument("--events", type=int, default=2000)
+    ap.add_argument("--dup-ratio", type=float, default=0.2, help="Share of event_uids given extra copies before dedupe")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config = Config(
+            gmail_query="",
+            google_client_secret_path="",
+            google_token_path="",
+            yogisync_calendar_id="bench",
+            timezone="Asia/Tokyo",
+            sqlite_path=os.path.join(tmpdir, "bench.db"),
+            default_event_duration_minutes=60,
+        )
+        backend = LocalCalendarBackend(config.sqlite_path, calendar_id="bench", tz=config.timezone)
+        store = EventStore(config.sqlite_path)
+        events = make_events(args.events, args.seed)
+
+        def reconcile_all() -> int:
+            for ev in events:
+                store.upsert_event(ev)
+                kept = reconcile_event(config, ev, None, service=backend)
+                if kept:
+                    store.update_gcal_event_id(ev.ensure_event_uid(), kept)
+            return len(events)
+
+        def update_all() -> int:
+            for ev in events:
+                row = store.get_event(ev.ensure_event_uid())
+                reconcile_event(config, ev, row["gcal_event_id"] if row else None, service=backend)
+            return len(events)
+
+        count, seconds = _timed(reconcile_all)
+        _row("reconcile.insert", count, seconds)
+        count, seconds = _timed(update_all)
+        _row("reconcile.update", count, seconds)
+
+        rng = random.Random(args.seed)
+        for ev in rng.sample(events, int(len(events) * args.dup_ratio)):
+            # 二重作成の再現: 同じ内容の予定を 1〜3 件足す
+            for _ in range(rng.randint(1, 3)):
+                backend.insert(_build_event_body(config, ev))
+        start = time.perf_counter()
+        result = dedupe_calendar(config, backend, store)
+        _row("dedupe", result.scanned, time.perf_counter() - start)
+        print(
+            f"dedupe: scanned={result.scanned} duplicate_groups={result.duplicate_groups} "
+            f"deleted={result.deleted} store_fixes={result.store_fixes} errors={result.errors}"
+        )
+        store.close()
+        backend.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
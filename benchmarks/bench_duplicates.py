@@ -0,0 +1,114 @@
+"""
+cross-dedupe（別 provider から届いた同じクラスの検出）のベンチ。カレンダー API は使わない。
+
+    python -m benchmarks.bench_duplicates --years 5 --per-day 8 --dup-ratio 0.1
+    python -m benchmarks.bench_duplicates --years 10 --threshold 0.7
+
+何年分かのイベントを store に入れ、その一部を「同じクラスを別の provider でも予約した」形
+（タイトルの表記ゆれ・【Peatix】タグ・開始時刻の数分のずれ・会場名の有無）で複製してから
+find_duplicate_groups を流す。イベント数・比較した組の数（総当たりの n(n-1)/2 との比）・秒数と、
+仕込んだ重複に対する precision / recall を出す。
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Optional, Sequence, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from yogisync_core.crossdedupe import find_duplicate_groups
+from yogisync_core.models import CrossDedupeResult, Event
+from yogisync_core.store import EventStore
+
+from .corpus import PROVIDERS, _TITLES, _VENUES
+
+
+def _variant(rng: random.Random, title: str) -> str:
+    """同じクラスを別のチャネルで予約したときのタイトルの揺れ。"""
+    op = rng.randrange(4)
+    if op == 0:
+        return "【Peatix】" + title
+    if op == 1:
+        return unicodedata.normalize("NFKC", title).replace(" ", "")
+    if op == 2:
+        return title + "（予約確定）"
+    return title.upper()
+
+
+def populate(store: EventStore, years: int, per_day: int, dup_ratio: float, seed: int) -> Set[Tuple[str, str]]:
+    """イベントを入れ、仕込んだ重複の組（event_uid の組）を返す。"""
+    rng = random.Random(seed)
+    base = datetime(2020, 1, 1, tzinfo=ZoneInfo("Asia/Tokyo"))
+    expected: Set[Tuple[str, str]] = set()
+    for day in range(365 * years):
+        # 1日の中ではクラス（タイトル × 会場 × 時刻）が重ならないようにする
+        slots = rng.sample(range(7 * 2, 21 * 2), per_day)
+        for n, slot in enumerate(slots):
+            provider = rng.choice(PROVIDERS)
+            start = base + timedelta(days=day, minutes=slot * 30)
+            title = _TITLES[(day + n) % len(_TITLES)]
+            venue = _VENUES[n % len(_VENUES)]
+            ev = Event(provider=provider, title=title, date=start, location_name=venue, reservation_id=f"R{day}-{n}")
+            store.upsert_event(ev)
+            if rng.random() < dup_ratio:
+                other = rng.choice([p for p in PROVIDERS if p != provider])
+                dup = Event(
+                    provider=other,
+                    title=_variant(rng, title),
+                    date=start + timedelta(minutes=rng.choice((0, 0, 5, -10))),
+                    location_name=venue if rng.random() < 0.7 else None,
+                    reservation_id=f"X{day}-{n}",
+                )
+                store.upsert_event(dup)
+                expected.add(tuple(sorted((ev.ensure_event_uid(), dup.ensure_event_uid()))))
+    return expected
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="YogiSync cross-provider duplicate detection benchmark")
+    ap.add_argument("--years", type=int, default=3)
+    ap.add_argument("--per-day", type=int, default=6, help="Distinct classes per day (max 28)")
+    ap.add_argument("--dup-ratio", type=float, default=0.1, help="Share of classes also booked via another provider")
+    ap.add_argument("--threshold", type=float, default=0.8)
+    ap.add_argument("--tolerance-minutes", type=int, default=30)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = EventStore(os.path.join(tmpdir, "bench.db"))
+        start = time.perf_counter()
+        expected = populate(store, args.years, min(args.per_day, 28), args.dup_ratio, args.seed)
+        print(f"populate: {time.perf_counter() - start:.2f}s")
+
+        result = CrossDedupeResult(threshold=args.threshold)
+        found: Set[Tuple[str, str]] = set()
+        start = time.perf_counter()
+        groups = 0
+        for group in find_duplicate_groups(
+            store.iter_events(), threshold=args.threshold, tolerance_minutes=args.tolerance_minutes, result=result
+        ):
+            groups += 1
+            for dup in group.duplicates:
+                found.add(tuple(sorted((group.keep["event_uid"], dup["event_uid"]))))
+        seconds = time.perf_counter() - start
+        store.close()
+
+    n = result.scanned
+    naive = n * (n - 1) // 2
+    hits = len(found & expected)
+    precision = hits / len(found) if found else 1.0
+    recall = hits / len(expected) if expected else 1.0
+    print(f"events: {n}  blocks: {result.blocks}  comparisons: {result.comparisons}  naive: {naive}")
+    print(f"scan: {seconds:.3f}s ({seconds / max(n, 1) * 1e6:.1f} us/event)  groups: {groups}")
+    print(f"expected pairs: {len(expected)}  found: {len(found)}  precision: {precision:.3f}  recall: {recall:.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+ローカル mbox 取り込みのベンチ。
+
+    python -m benchmarks.bench_import --size 5000 --html-bloat-kb 20
+    python -m benchmarks.bench_import --mbox ~/Takeout/Mail/all.mbox --read-only
+
+合成メールを mbox に書き出し（--mbox を渡せばそのファイルを使う）、
+MboxSource で読むだけの速度（MB/s）と、run_sync まで通した速度を測る。
+読むだけの MB/s がディスクの読み出し速度に近ければ、取り込みはディスク律速になっている。
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from email.message import EmailMessage
+from email.utils import format_datetime
+from datetime import datetime, timezone
+from typing import Optional, Sequence
+
+from yogisync_core.config import Config
+from yogisync_core.models import GmailMessage
+from yogisync_core.pipeline import run_sync
+from yogisync_core.sources import MboxSource
+
+from .corpus import iter_mixed_corpus
+from .fakes import FakeCalendarService
+
+
+def _to_email(msg: GmailMessage, charset: str) -> bytes:
+    em = EmailMessage()
+    em["Message-ID"] = f"<{msg.id}@bench.yogisync>"
+    em["Subject"] = msg.subject or ""
+    em["From"] = msg.from_email or ""
+    em["Date"] = format_datetime(datetime.fromtimestamp((msg.internal_date or 1_700_000_000_000) / 1000, timezone.utc))
+    if msg.text_plain:
+        em.set_content(msg.text_plain, charset=charset)
+        if msg.text_html:
+            em.add_alternative(msg.text_html, subtype="html")
+    else:
+        em.set_content(msg.text_html or "", subtype="html")
+    return em.as_bytes()
+
+
+def write_mbox(path: str, size: int, html_bloat_kb: int) -> None:
+    """合成メールを mbox に書く（4通に1通は日本語メールでよくある ISO-2022-JP）。"""
+    with open(path, "wb") as f:
+        for i, msg in enumerate(iter_mixed_corpus(size, html_bloat_kb=html_bloat_kb, seed=size)):
+            charset = "iso-2022-jp" if i % 4 == 0 else "utf-8"
+            try:
+                raw = _to_email(msg, charset)
+            except UnicodeError:
+                raw = _to_email(msg, "utf-8")
+            f.write(b"From bench@yogisync Thu Jan  1 00:00:00 2026\n")
+            # mboxrd: 本文中の "From " 行をエスケープ
+            f.write(raw.replace(b"\nFrom ", b"\n>From "))
+            f.write(b"\n")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="YogiSync mbox import benchmark")
+    ap.add_argument("--size", type=int, default=2000)
+    ap.add_argument("--html-bloat-kb", type=int, default=20)
+    ap.add_argument("--mbox", help="Existing mbox to read instead of a generated one")
+    ap.add_argument("--read-only", action="store_true", help="Only measure MboxSource, skip run_sync")
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = args.mbox or os.path.join(tmpdir, "bench.mbox")
+        if not args.mbox:
+            write_mbox(path, args.size, args.html_bloat_kb)
+        mb = os.path.getsize(path) / (1024 * 1024)
+
+        start = time.perf_counter()
+        count = sum(1 for _ in MboxSource(path))
+        read_s = time.perf_counter() - start
+        print(f"read     {count:>7} msgs {mb:>8.1f} MB {read_s:>7.2f}s {mb / read_s:>8.1f} MB/s {count / read_s:>8.0f} msgs/s")
+
+        if not args.read_only:
+            config = Config(
+                gmail_query="",
+                google_client_secret_path="",
+                google_token_path="",
+                yogisync_calendar_id="bench",
+                timezone="Asia/Tokyo",
+                sqlite_path=os.path.join(tmpdir, "bench.db"),
+                default_event_duration_minutes=60,
+            )
+            start = time.perf_counter()
+            result = run_sync(
+                config,
+                messages=MboxSource(path),
+                gmail_service=object(),
+                calendar_service=FakeCalendarService(),
+            )
+            sync_s = time.perf_counter() - start
+            print(
+                f"run_sync {count:>7} msgs {mb:>8.1f} MB {sync_s:>7.2f}s {mb / sync_s:>8.1f} MB/s "
+                f"{count / sync_s:>8.0f} msgs/s  created={result.created} skipped={result.skipped} errors={result.errors}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+run_sync の負荷試験（benchmarks.fake_google のローカル API サーバに向けて、設定を変えながら throughput を測る）。
+
+    python -m benchmarks.bench_load --messages 100000 --limit 1000 --latency-ms 30 --pool-sizes 4 8 16 --reconcile 1 4
+    python -m benchmarks.bench_load --error-rate 0.02 --rate-limit-rate 0.01 --partitioned
+    python -m benchmarks.bench_load --thread-size 3 --threads   # GMAIL_THREADS（スレッドごとに最新だけ取得）と比べる
+    python -m benchmarks.bench_load --endpoint http://127.0.0.1:8765   # 別プロセスで起動した fake_google を使う
+
+組み合わせ（HTTP_POOL_SIZE × reconcile の並行数 × 一覧の仕方（query / partitioned / threads））ごとに、空の SQLite と空のカレンダー（/_admin/reset）から
+run_sync を1回流し、秒数・メール/秒・イベント/秒・API 呼び出し（クライアント側）・リトライ・
+サーバが返した 429 / 5xx・quota units・エラー件数を出す。msgs はダウンロードしたメールの数。オフラインで動く（認証もしない）。
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional, Sequence
+
+from yogisync_core.config import Config
+from yogisync_core.pipeline import run_sync
+from yogisync_core.telemetry import Telemetry
+
+from .fake_google import FakeGoogleServer, add_fault_arguments, api_from_args
+
+
+def _admin(endpoint: str, path: str, method: str = "GET") -> Dict[str, Any]:
+    req = urllib.request.Request(endpoint.rstrip("/") + path, method=method, data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        body = resp.read()
+    return json.loads(body) if body else {}
+
+
+def run_once(
+    endpoint: str, tmpdir: str, limit: int, pool_size: int, reconcile: int, partitioned: bool, threads: bool = False
+) -> Dict[str, Any]:
+    _admin(endpoint, "/_admin/reset", "POST")
+    db = os.path.join(tmpdir, f"load-{pool_size}-{reconcile}-{int(partitioned)}-{int(threads)}.db")
+    config = Config(
+        gmail_query="newer_than:365d",
+        google_client_secret_path="",
+        google_token_path="",
+        yogisync_calendar_id="load",
+        timezone="Asia/Tokyo",
+        sqlite_path=db,
+        default_event_duration_minutes=60,
+        http_pool_size=pool_size,
+        stage_concurrency={"reconcile": reconcile},
+        gmail_partitioned=partitioned,
+        gmail_threads=threads,
+        api_endpoint=endpoint,
+    )
+    telemetry = Telemetry()
+    start = time.perf_counter()
+    result = run_sync(config, limit=limit, telemetry=telemetry)
+    seconds = time.perf_counter() - start
+    stats = _admin(endpoint, "/_stats")
+    events = result.created + result.updated
+    return {
+        "pool": pool_size,
+        "reconcile": reconcile,
+        "mode": ("partitioned" if partitioned else "query") + ("+threads" if threads else ""),
+        "seconds": seconds,
+        "messages": telemetry.counter_total("messages_fetched"),
+        "events": events,
+        "api_calls": telemetry.counter_total("api_calls"),
+        "retries": telemetry.counter_total("api_retries"),
+        "served_429": stats["injected"].get("429", 0) + sum(stats["throttled"].values()),
+        "served_5xx": stats["injected"].get("500", 0) + stats["injected"].get("503", 0),
+        "units": sum(stats["units"].values()),
+        "errors": result.errors,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="YogiSync run_sync load test against a local fake Google API")
+    ap.add_argument("--endpoint", default="", help="Use an already running fake_google server instead of starting one")
+    ap.add_argument(
+        "--limit", type=int, default=1000, help="Messages (threads with --threads) per run, per provider with --partitioned"
+    )
+    ap.add_argument("--pool-sizes", type=int, nargs="+", default=[8])
+    ap.add_argument("--reconcile", type=int, nargs="+", default=[1, 4], help="Reconcile stage workers to try")
+    ap.add_argument("--partitioned", action="store_true", help="Also run with GMAIL_PARTITIONED")
+    ap.add_argument("--threads", action="store_true", help="Also run with GMAIL_THREADS")
+    ap.add_argument("--json", default="", help="Write the rows to this JSON file")
+    add_fault_arguments(ap)
+    args = ap.parse_args(argv)
+    # リトライの warning が表を埋めないようにする
+    logging.basicConfig(level=logging.ERROR)
+
+    server: Optional[FakeGoogleServer] = None
+    endpoint = args.endpoint
+    if not endpoint:
+        server = FakeGoogleServer(api_from_args(args)).start()
+        endpoint = server.endpoint
+    modes = list(
+        itertools.product([False, True] if args.partitioned else [False], [False, True] if args.threads else [False])
+    )
+    rows: List[Dict[str, Any]] = []
+    print(f"endpoint: {endpoint}  limit: {args.limit}  latency: {args.latency_ms}±{args.jitter_ms} ms")
+    print(
+        f"{'pool':>4} {'recon':>5} {'mode':<19} {'seconds':>8} {'msg/s':>8} {'evt/s':>8} "
+        f"{'calls':>7} {'retries':>7} {'429':>5} {'5xx':>5} {'units':>7} {'errors':>6}"
+    )
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for pool_size, reconcile, (partitioned, threads) in itertools.product(args.pool_sizes, args.reconcile, modes):
+                # threads の limit はスレッド数なので、同じ範囲のメールになるよう --thread-size で割る
+                limit = max(1, args.limit // args.thread_size) if threads else args.limit
+                r = run_once(endpoint, tmpdir, limit, pool_size, reconcile, partitioned, threads)
+                rows.append(r)
+                secs = r["seconds"] or 1e-9
+                print(
+                    f"{r['pool']:>4} {r['reconcile']:>5} {r['mode']:<19} {secs:>8.2f} {r['messages'] / secs:>8.1f} "
+                    f"{r['events'] / secs:>8.1f} {int(r['api_calls']):>7} {int(r['retries']):>7} {r['served_429']:>5} "
+                    f"{r['served_5xx']:>5} {r['units']:>7} {r['errors']:>6}"
+                )
+    finally:
+        if server is not None:
+            server.close()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+バックフィル時のメモリ使用量ベンチ。
+
+    python -m benchmarks.bench_memory --sizes 500 2000 8000
+    python -m benchmarks.bench_memory --sizes 500 2000 8000 --mode list
+
+件数ごとに子プロセスで run_sync を回し、最大RSS（ru_maxrss）を比べる。
+--mode stream（既定）はメールを1通ずつ流す今の経路、--mode list は全件をリストに溜めてから処理する旧経路。
+stream では件数を増やしても RSS がほぼ横ばいになるはず。
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Sequence
+
+from yogisync_core.config import Config
+from yogisync_core.pipeline import run_sync
+
+from .corpus import iter_mixed_corpus
+from .fakes import FakeCalendarService
+
+
+def _child(size: int, mode: str, html_bloat_kb: int) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        config = Config(
+            gmail_query="",
+            google_client_secret_path="",
+            google_token_path="",
+            yogisync_calendar_id="bench",
+            timezone="Asia/Tokyo",
+            sqlite_path=os.path.join(tmpdir, "bench.db"),
+            default_event_duration_minutes=60,
+        )
+        messages = iter_mixed_corpus(size, html_bloat_kb=html_bloat_kb, seed=size)
+        if mode == "list":
+            messages = list(messages)  # type: ignore[assignment]
+
+        start = time.perf_counter()
+        result = run_sync(
+            config,
+            limit=size,
+            messages=messages,
+            gmail_service=object(),
+            calendar_service=FakeCalendarService(),
+        )
+        elapsed = time.perf_counter() - start
+
+    return {
+        "size": size,
+        "mode": mode,
+        "seconds": round(elapsed, 3),
+        "per_sec": round(size / elapsed, 1) if elapsed > 0 else 0.0,
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "created": result.created,
+        "errors": result.errors,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="YogiSync backfill memory benchmark")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 8000])
+    ap.add_argument("--mode", choices=["stream", "list"], default="stream")
+    ap.add_argument("--html-bloat-kb", type=int, default=20)
+    ap.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.child is not None:
+        print(json.dumps(_child(args.child, args.mode, args.html_bloat_kb)))
+        return 0
+
+    rows: List[Dict[str, float]] = []
+    for size in args.sizes:
+        # 1件ごとに新しいプロセスにしないと ru_maxrss が前の件数の値を引きずる
+        out = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.bench_memory",
+                "--child",
+                str(size),
+                "--mode",
+                args.mode,
+                "--html-bloat-kb",
+                str(args.html_bloat_kb),
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+            env=dict(os.environ, LOG_LEVEL="WARNING"),
+        )
+        rows.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"{'messages':>9} {'mode':>7} {'seconds':>8} {'msgs/sec':>9} {'max RSS MiB':>12}")
+    for r in rows:
+        print(f"{r['size']:>9} {r['mode']:>7} {r['seconds']:>8.2f} {r['per_sec']:>9.1f} {r['max_rss_kib'] / 1024:>12.1f}")
+    if len(rows) > 1:
+        growth = rows[-1]["max_rss_kib"] / rows[0]["max_rss_kib"]
+        print(f"RSS growth {rows[0]['size']} -> {rows[-1]['size']} messages: {growth:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
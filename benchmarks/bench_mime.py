@@ -0,0 +1,88 @@
+"""
+messages.get の format="full" と format="raw"（MimeIndex + 遅延デコード）の比較。ネットワークは使わない。
+
+    python -m benchmarks.bench_mime --size 2000 --html-bloat-kb 20
+    python -m benchmarks.bench_mime --size 1000 --attachment-kb 200    # 添付付き（raw では添付も届く）
+
+合成メールを Gmail の応答（full: 分解済みパート / raw: RFC 822 全体、4通に1通は ISO-2022-JP）にしておき、
+fetch_message → provider 判定 → retain_for → パーサが読む本文の読み出し → release_bodies を1通ずつ流す。
+1通あたりの時間（パーサ自体は含まない）・tracemalloc で見た1通分のピークメモリ・応答の JSON の大きさを出す。
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Sequence
+
+from yogisync_core.collector_gmail import fetch_message
+from yogisync_core.provider_detect import detect_provider
+
+from .corpus import iter_mixed_corpus
+from .fakes import FakeGmailService, gmail_raw_resource, gmail_resource
+
+
+def _consume(service: FakeGmailService, ids: Sequence[str], message_format: str) -> int:
+    """パイプラインと同じ順で本文に触る。provider が分かったメールの数を返す。"""
+    detected = 0
+    for msg_id in ids:
+        msg = fetch_message(service, msg_id, None, message_format)
+        provider = detect_provider(msg)
+        if provider:
+            detected += 1
+            msg.retain_for(provider)
+            # ParseStage が読むもの（.ics と、残した方の本文）
+            _ = msg.calendar_parts, msg.text_plain, msg.text_html
+        msg.release_bodies()
+    return detected
+
+
+def _peak_per_message(service: FakeGmailService, ids: Sequence[str], message_format: str) -> int:
+    peak = 0
+    for msg_id in ids:
+        tracemalloc.start()
+        _consume(service, [msg_id], message_format)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return peak
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="YogiSync Gmail full vs raw message decoding benchmark")
+    ap.add_argument("--size", type=int, default=1000)
+    ap.add_argument("--html-bloat-kb", type=int, default=20)
+    ap.add_argument("--attachment-kb", type=int, default=0, help="Attach a PDF of this size to every message")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    full: Dict[str, Dict] = {}
+    raw: Dict[str, Dict] = {}
+    for i, msg in enumerate(iter_mixed_corpus(args.size, html_bloat_kb=args.html_bloat_kb, seed=args.size)):
+        msg.id = f"m{i:06d}"
+        full[msg.id] = gmail_resource(msg)
+        raw[msg.id] = gmail_raw_resource(msg, charset="iso-2022-jp" if i % 4 == 0 else "utf-8", attachment_kb=args.attachment_kb)
+    service = FakeGmailService(full, raw)
+    ids: List[str] = list(full)
+
+    print(f"messages: {len(ids)}  html bloat: {args.html_bloat_kb} KB  attachment: {args.attachment_kb} KB")
+    print(f"{'format':<6} {'us/msg':>10} {'peak KB/msg':>12} {'response KB/msg':>16} {'detected':>9}")
+    for message_format, resources in (("full", full), ("raw", raw)):
+        best = float("inf")
+        detected = 0
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            detected = _consume(service, ids, message_format)
+            best = min(best, time.perf_counter() - start)
+        peak = _peak_per_message(service, ids[: min(len(ids), 300)], message_format)
+        response = sum(len(json.dumps(r)) for r in resources.values()) / len(ids)
+        print(
+            f"{message_format:<6} {best / len(ids) * 1e6:>10.1f} {peak / 1024:>12.1f} "
+            f"{response / 1024:>16.1f} {detected:>9}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""
+パーサ/ストアのベンチマーク。
+
+    python -m benchmarks.bench_parsers --size 500 --html-bloat-kb 20
+    python -m benchmarks.bench_parsers --compare benchmarks/baseline.json
+    python -m benchmarks.bench_parsers --save-baseline benchmarks/baseline.json
+
+各ベンチは messages/sec と tracemalloc のピークメモリを出す。
+ベースラインとの比較は同一マシン上での相対値として見ること。
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from yogisync_core.models import Event, GmailMessage
+from yogisync_core.parsers import parse_first_datetime
+from yogisync_core.pipeline import PARSER_MAP
+from yogisync_core.provider_detect import detect_provider
+from yogisync_core.store import EventStore
+
+from .corpus import PROVIDERS, generate_corpus, generate_mixed_corpus
+
+# 比較時にこれ以上遅くなっていたら regression 扱い
+DEFAULT_TOLERANCE = 0.25
+
+
+def _measure(fn: Callable[[], int], repeat: int) -> Dict[str, float]:
+    """fn は処理件数を返す。時間は repeat 回のうち最速、メモリは別パスで計測する。"""
+    best = float("inf")
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = fn()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "items": items,
+        "seconds": round(best, 6),
+        "per_sec": round(items / best, 1) if best > 0 else 0.0,
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def _bench_detect(messages: Sequence[GmailMessage]) -> Callable[[], int]:
+    def run() -> int:
+        for msg in messages:
+            detect_provider(msg)
+        return len(messages)
+
+    return run
+
+
+def _bench_parse(provider: str, messages: Sequence[GmailMessage]) -> Callable[[], int]:
+    parser = PARSER_MAP[provider]
+
+    def run() -> int:
+        for msg in messages:
+            parser(msg)
+        return len(messages)
+
+    return run
+
+
+def _bench_datetime(texts: Sequence[str]) -> Callable[[], int]:
+    def run() -> int:
+        for text in texts:
+            parse_first_datetime(text)
+        return len(texts)
+
+    return run
+
+
+def _bench_content_hash(events: Sequence[Event]) -> Callable[[], int]:
+    def run() -> int:
+        for event in events:
+            event.content_hash()
+        return len(events)
+
+    return run
+
+
+def _bench_upsert(events: Sequence[Event], tmpdir: str) -> Callable[[], int]:
+    counter = {"n": 0}
+
+    def run() -> int:
+        # 毎回新しいDBに対して insert パス → 同じ内容で skipped パス
+        counter["n"] += 1
+        store = EventStore(os.path.join(tmpdir, f"bench-{counter['n']}.db"))
+        try:
+            for event in events:
+                store.upsert_event(event)
+            for event in events:
+                store.upsert_event(event)
+        finally:
+            store.close()
+        return len(events) * 2
+
+    return run
+
+
+def run_benchmarks(size: int, html_bloat_kb: int, seed: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    corpora = {p: generate_corpus(p, size, html_bloat_kb=html_bloat_kb, seed=seed) for p in PROVIDERS}
+    mixed = generate_mixed_corpus(size * len(PROVIDERS), html_bloat_kb=html_bloat_kb, seed=seed)
+
+    results["detect_provider"] = _measure(_bench_detect(mixed), repeat)
+
+    events: List[Event] = []
+    for provider, messages in corpora.items():
+        results[f"parse_{provider}"] = _measure(_bench_parse(provider, messages), repeat)
+        for msg in messages:
+            event = PARSER_MAP[provider](msg)
+            if event:
+                event.ensure_event_uid()
+                events.append(event)
+
+    texts = [m.text_plain for p in ("bonne", "yes_tokyo", "mosh") for m in corpora[p] if m.text_plain]
+    results["parse_first_datetime"] = _measure(_bench_datetime(texts), repeat)
+    results["content_hash"] = _measure(_bench_content_hash(events), repeat)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results["store_upsert_event"] = _measure(_bench_upsert(events, tmpdir), repeat)
+
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """baseline より tolerance 以上遅いものを返す。"""
+    regressions: List[str] = []
+    base_results = baseline.get("results", {})
+    for name, cur in results.items():
+        base = base_results.get(name)
+        if not base or not base.get("per_sec"):
+            continue
+        ratio = cur["per_sec"] / base["per_sec"]
+        cur["vs_baseline"] = round(ratio, 3)
+        if ratio < 1.0 - tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def _print_table(results: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'benchmark':<24} {'items':>7} {'msgs/sec':>12} {'peak KiB':>10} {'vs base':>8}")
+    for name, r in results.items():
+        vs = r.get("vs_baseline")
+        vs_s = f"{vs:.2f}x" if vs is not None else "-"
+        print(f"{name:<24} {int(r['items']):>7} {r['per_sec']:>12.1f} {r['peak_kib']:>10.1f} {vs_s:>8}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="YogiSync parser/store benchmarks")
+    ap.add_argument("--size", type=int, help="Messages per provider (default: 200 or baseline's)")
+    ap.add_argument("--html-bloat-kb", type=int, help="Extra HTML markup per message in KiB (default: 0 or baseline's)")
+    ap.add_argument("--seed", type=int)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--compare", help="Baseline JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    ap.add_argument("--save-baseline", help="Write results as a new baseline JSON")
+    ap.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = ap.parse_args(argv)
+
+    baseline: Optional[Dict[str, Any]] = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    # 比較するときは未指定のパラメータをベースラインに揃える
+    params = (baseline or {}).get("params", {})
+    size = args.size if args.size is not None else params.get("size", 200)
+    html_bloat_kb = args.html_bloat_kb if args.html_bloat_kb is not None else params.get("html_bloat_kb", 0)
+    seed = args.seed if args.seed is not None else params.get("seed", 0)
+
+    results = run_benchmarks(size, html_bloat_kb, seed, args.repeat)
+
+    regressions: List[str] = []
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        _print_table(results)
+
+    if args.save_baseline:
+        payload = {
+            "params": {"size": size, "html_bloat_kb": html_bloat_kb, "seed": seed},
+            "python": platform.python_version(),
+            "results": results,
+        }
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+
+    if regressions:
+        print(f"regressions (>{args.tolerance:.0%} slower): {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import random
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional
+
+from yogisync_core.models import GmailMessage
+
+PROVIDERS = ["peatix", "bonne", "yes_tokyo", "mosh", "life_tuning"]
+
+_TITLES = [
+    "ヨガと本格的南インドカレーと ～ Spine Twist Spicy Curry Yoga",
+    "朝ヨガ 60分 ベーシック",
+    "リストラティブヨガ入門",
+    "パワーヨガ 中級",
+    "マタニティヨガ",
+    "陰ヨガ & 瞑想ナイト",
+    "Vinyasa Flow Workshop",
+    "Hatha Yoga Beginners",
+]
+_VENUES = ["渋谷スタジオ", "代官山ホール", "中目黒ルーム", "吉祥寺スペース", "表参道ルーム"]
+_ADDRESSES = [
+    "東京都渋谷区神南1-2-3 4F",
+    "東京都目黒区上目黒2-10-5",
+    "東京都武蔵野市吉祥寺本町1-1-1",
+    "東京都港区北青山3-5-12",
+]
+_INSTRUCTORS = ["山田 花子", "佐藤 美咲", "Emma Wilson", "鈴木 一郎"]
+
+# 本文の肥大化用（Gmailのニュースレター風HTMLを模したもの）
+_BLOAT_BLOCK = (
+    '<table role="presentation" width="100%" cellpadding="0" cellspacing="0" '
+    'style="border-collapse:collapse;mso-table-lspace:0pt;mso-table-rspace:0pt">'
+    '<tr><td style="padding:12px 24px;font-family:Helvetica,Arial,sans-serif;font-size:13px;color:#666">'
+    '<span style="display:none">おすすめのイベント</span>'
+    '<a href="https://example.com/track?u=abcdef0123456789&amp;m=42">関連するイベントを見る</a>'
+    "</td></tr></table>\n"
+)
+
+
+def _bloat(rng: random.Random, html_bloat_kb: int) -> str:
+    if html_bloat_kb <= 0:
+        return ""
+    repeat = max(1, (html_bloat_kb * 1024) // len(_BLOAT_BLOCK.encode("utf-8")))
+    return _BLOAT_BLOCK * (repeat + rng.randint(0, 2))
+
+
+def _random_date(rng: random.Random, base: datetime) -> datetime:
+    return (base + timedelta(days=rng.randint(-300, 60))).replace(
+        hour=rng.choice([7, 9, 10, 12, 18, 19, 20]), minute=rng.choice([0, 15, 30]), second=0, microsecond=0
+    )
+
+
+def _fmt_jp(dt: datetime) -> str:
+    return f"{dt.year}年{dt.month}月{dt.day}日 {dt.hour}:{dt.minute:02d}"
+
+
+def _fmt_slash(dt: datetime) -> str:
+    return dt.strftime("%Y/%m/%d %H:%M")
+
+
+def _peatix(rng: random.Random, idx: int, dt: datetime, html_bloat_kb: int) -> GmailMessage:
+    title = rng.choice(_TITLES)
+    venue = rng.choice(_VENUES)
+    address = rng.choice(_ADDRESSES)
+    confirmation = 30000000 + idx
+    html = (
+        "<html><head><style>.card{border:1px solid #eee}</style></head><body>"
+        '<div class="card">'
+        "<p>受信トレイ</p>"
+        f"<p>{title} ({venue})</p>"
+        "<p>予定のタイトル</p>"
+        f"<p>{title}</p>"
+        f"<p>日時：{_fmt_jp(dt)}</p>"
+        f"<p>会場：{venue}</p>"
+        f"<p>住所：{address}</p>"
+        f"<p>確認番号：{confirmation}</p>"
+        f'<p><a href="https://peatix.com/event/{4000000 + idx}">イベントページ</a></p>'
+        "</div>"
+        f"{_bloat(rng, html_bloat_kb)}"
+        "</body></html>"
+    )
+    return GmailMessage(
+        id=f"peatix-{idx}",
+        thread_id=f"t-peatix-{idx}",
+        subject=f"【Peatix】{title}のチケットお申し込み詳細",
+        from_email="Peatix <noreply@peatix.com>",
+        snippet=f"{title} のチケットお申し込みが完了しました",
+        text_plain=None,
+        text_html=html,
+    )
+
+
+def _bonne(rng: random.Random, idx: int, dt: datetime, html_bloat_kb: int) -> GmailMessage:
+    text = (
+        "スタジオBONNE ご予約確認\n\n"
+        f"プログラム：{rng.choice(_TITLES)}\n"
+        f"日時：{_fmt_slash(dt)}\n"
+        f"インストラクター：{rng.choice(_INSTRUCTORS)}\n"
+        f"予約番号：B{100000 + idx}\n"
+        "https://studio-bonne.example.jp/reserve/detail\n"
+    )
+    return GmailMessage(
+        id=f"bonne-{idx}",
+        thread_id=f"t-bonne-{idx}",
+        subject="【スタジオBONNE】ご予約ありがとうございます",
+        from_email="Studio BONNE <info@studio-bonne.example.jp>",
+        snippet="ご予約ありがとうございます",
+        text_plain=text,
+        text_html=None,
+    )
+
+
+def _yes_tokyo(rng: random.Random, idx: int, dt: datetime, html_bloat_kb: int) -> GmailMessage:
+    text = (
+        "YES TOKYO ご予約完了のお知らせ\n\n"
+        f"クラス：{rng.choice(_TITLES)}\n"
+        f"日時：{_fmt_jp(dt)}\n"
+        f"店舗：{rng.choice(_VENUES)}\n"
+        f"予約番号：Y{200000 + idx}\n"
+        "https://yes-tokyo.example.jp/mypage\n"
+    )
+    return GmailMessage(
+        id=f"yes_tokyo-{idx}",
+        thread_id=f"t-yes_tokyo-{idx}",
+        subject="ご予約完了のお知らせ | YES TOKYO",
+        from_email="YES TOKYO <noreply@yes-tokyo.example.jp>",
+        snippet="ご予約が完了しました",
+        text_plain=text,
+        text_html=None,
+    )
+
+
+def _mosh(rng: random.Random, idx: int, dt: datetime, html_bloat_kb: int) -> GmailMessage:
+    text = (
+        "ご予約が確定しました。\n\n"
+        f"サービス：{rng.choice(_TITLES)}\n"
+        f"日時：{_fmt_slash(dt)}\n"
+        f"https://mosh.jp/services/{500000 + idx}\n"
+    )
+    return GmailMessage(
+        id=f"mosh-{idx}",
+        thread_id=f"t-mosh-{idx}",
+        subject="【MOSH】予約確定のお知らせ",
+        from_email="MOSH <noreply@mosh.jp>",
+        snippet="ご予約が確定しました",
+        text_plain=text,
+        text_html=None,
+    )
+
+
+def _life_tuning(rng: random.Random, idx: int, dt: datetime, html_bloat_kb: int) -> GmailMessage:
+    # Life Tuning は時刻付き / 日付のみ、plain / HTML のみが混在する
+    with_time = rng.random() < 0.7
+    date_line = _fmt_jp(dt) if with_time else f"{dt.year}年{dt.month}月{dt.day}日"
+    body_lines = [
+        "LIFE TUNING DAYS ご注文確認",
+        f"商品名：{rng.choice(_TITLES)}",
+        f"開催日：{date_line}",
+        f"会場：{rng.choice(_VENUES)}",
+        f"住所：{rng.choice(_ADDRESSES)}",
+        f"注文番号：LT{300000 + idx}",
+        "https://lifetuning.example.jp/order",
+    ]
+    if rng.random() < 0.5:
+        text_plain: Optional[str] = "\n".join(body_lines) + "\n"
+        text_html: Optional[str] = None
+    else:
+        text_plain = None
+        text_html = (
+            "<html><body>"
+            + "".join(f"<div>{line}</div>" for line in body_lines)
+            + _bloat(rng, html_bloat_kb)
+            + "</body></html>"
+        )
+    return GmailMessage(
+        id=f"life_tuning-{idx}",
+        thread_id=f"t-life_tuning-{idx}",
+        subject="ご注文ありがとうございます",
+        from_email="shop@lifetuning.example.jp",
+        snippet="LIFE TUNING DAYS ご注文確認",
+        text_plain=text_plain,
+        text_html=text_html,
+    )
+
+
+def _negative(rng: random.Random, idx: int, dt: datetime, html_bloat_kb: int) -> GmailMessage:
+    """provider判定に引っかからない / 引っかかってもパースできないメール。"""
+    kind = rng.choice(["newsletter", "receipt", "provider_no_date"])
+    if kind == "provider_no_date":
+        return GmailMessage(
+            id=f"negative-{idx}",
+            thread_id=f"t-negative-{idx}",
+            subject="【Peatix】新着イベントのお知らせ",
+            from_email="Peatix <news@peatix.com>",
+            snippet="今週のおすすめイベント",
+            text_plain=None,
+            text_html="<html><body><p>今週のおすすめ</p>" + _bloat(rng, html_bloat_kb) + "</body></html>",
+        )
+    if kind == "receipt":
+        return GmailMessage(
+            id=f"negative-{idx}",
+            thread_id=f"t-negative-{idx}",
+            subject="ご購入ありがとうございます",
+            from_email="store@example.com",
+            snippet="領収書",
+            text_plain=f"ご注文日：{_fmt_slash(dt)}\n合計：3,300円\n",
+            text_html=None,
+        )
+    return GmailMessage(
+        id=f"negative-{idx}",
+        thread_id=f"t-negative-{idx}",
+        subject="Weekly digest",
+        from_email="digest@example.com",
+        snippet="This week's highlights",
+        text_plain=None,
+        text_html="<html><body><h1>Highlights</h1>" + _bloat(rng, html_bloat_kb) + "</body></html>",
+    )
+
+
+GENERATORS: Dict[str, Callable[[random.Random, int, datetime, int], GmailMessage]] = {
+    "peatix": _peatix,
+    "bonne": _bonne,
+    "yes_tokyo": _yes_tokyo,
+    "mosh": _mosh,
+    "life_tuning": _life_tuning,
+    "negative": _negative,
+}
+
+
+def generate_corpus(
+    provider: str,
+    size: int,
+    *,
+    html_bloat_kb: int = 0,
+    seed: int = 0,
+    base: Optional[datetime] = None,
+) -> List[GmailMessage]:
+    """
+    provider ごとの合成メールを size 件生成する。
+    provider="negative" で判定/パースに失敗するメールを生成する。
+    同じ seed なら同じコーパスになる。
+    """
+    if provider not in GENERATORS:
+        raise ValueError(f"unknown provider: {provider}")
+    rng = random.Random(f"{provider}:{seed}")
+    base = base or datetime(2025, 1, 1)
+    gen = GENERATORS[provider]
+    return [gen(rng, i, _random_date(rng, base), html_bloat_kb) for i in range(size)]
+
+
+def generate_mixed_corpus(
+    size: int,
+    *,
+    html_bloat_kb: int = 0,
+    negative_ratio: float = 0.2,
+    seed: int = 0,
+) -> List[GmailMessage]:
+    """全providerとネガティブを混ぜた、受信箱っぽい並びのコーパス。"""
+    rng = random.Random(seed)
+    negatives = int(size * negative_ratio)
+    per_provider, extra = divmod(size - negatives, len(PROVIDERS))
+    messages: List[GmailMessage] = []
+    for i, provider in enumerate(PROVIDERS):
+        n = per_provider + (1 if i < extra else 0)
+        messages.extend(generate_corpus(provider, n, html_bloat_kb=html_bloat_kb, seed=seed))
+    messages.extend(generate_corpus("negative", negatives, html_bloat_kb=html_bloat_kb, seed=seed))
+    rng.shuffle(messages)
+    return messages
+
+
+def iter_mixed_corpus(
+    size: int,
+    *,
+    html_bloat_kb: int = 0,
+    negative_ratio: float = 0.2,
+    seed: int = 0,
+) -> Iterator[GmailMessage]:
+    """generate_mixed_corpus の遅延版。1通ずつ作るので件数が増えてもメモリを食わない。"""
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1)
+    for i in range(size):
+        kind = "negative" if rng.random() < negative_ratio else rng.choice(PROVIDERS)
+        yield GENERATORS[kind](rng, i, _random_date(rng, base), html_bloat_kb)
@@ -0,0 +1,618 @@
+"""
+負荷試験用のローカル Google API サーバ（Gmail / Calendar のうち YogiSync が使う分だけ）。ネットワーク不要。
+
+    python -m benchmarks.fake_google --port 8765 --messages 100000 --latency-ms 40 --error-rate 0.01
+    API_ENDPOINT=http://127.0.0.1:8765 python -m yogisync_core.cli sync --limit 500
+
+- Gmail: users.getProfile / messages.list / messages.get（format=full / raw）/ history.list /
+  threads.list / threads.get（format=metadata）
+  メールボックスは benchmarks.corpus の合成メール（1通ずつ index から作るので 10万通でもメモリを食わない）。
+  --thread-size N なら連続する N 通を1スレッドにする（同じ予約の通知が N 回届いた形。中身は先頭のメールと同じ）。
+  q は provider別の検索式（partition_query）と after: だけを見て、それ以外の条件は無視する
+- Calendar: events.list / insert / update / patch / delete と batch（/batch/calendar/v3）
+  q は description の event_uid 完全一致で引く（fakes.FakeCalendarService と同じ）
+- 1リクエストごとの遅延（--latency-ms ± --jitter-ms）、確率で 429 / 5xx を返す fault injection、
+  Gmail の per-user quota（--gmail-units-per-sec, 既定 250 units/秒）と Calendar の req/秒 の上限を超えたら 429
+- 管理用: GET /_stats（呼び出し数・quota units・返した 429/5xx）/ POST /_admin/reset（カレンダーと統計を空に）/
+  POST /_admin/deliver?count=N（新着を N 通足す。history.list で取れる）
+fields（partial response）は無視して全部返す。認証ヘッダも見ない。
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from email.policy import HTTP
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from yogisync_core.models import GmailMessage
+from yogisync_core.provider_detect import PROVIDER_RULES
+from yogisync_core.telemetry import GMAIL_QUOTA_UNITS
+
+from .corpus import GENERATORS, PROVIDERS, _random_date
+from .fakes import gmail_raw_resource, gmail_resource
+
+_UID_RE = re.compile(r"^event_uid: (.*)$", re.MULTILINE)
+_AFTER_RE = re.compile(r"\bafter:(\d+)\b")
+
+# 一番古いメールの受信日時（epoch 秒）。index が1増えるごとに1分新しくなる
+_MAILBOX_EPOCH = 1_700_000_000
+_HISTORY_BASE = 1000
+
+# (status, JSON body)。body が None なら本文なし（204）
+Response = Tuple[int, Optional[Dict[str, Any]]]
+
+
+@dataclass
+class FaultConfig:
+    """遅延・エラー注入・quota の設定。0 は「無し / 無制限」。"""
+
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    # 確率で返す 5xx（500/503）と 429（rateLimitExceeded）
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    # Gmail の per-user quota（units/秒）/ Calendar の req/秒
+    gmail_units_per_sec: int = 250
+    calendar_qps: float = 0.0
+
+
+def _error(status: int, reason: str, message: str) -> Response:
+    return status, {"error": {"code": status, "message": message, "errors": [{"reason": reason, "message": message}]}}
+
+
+class _Window:
+    """直近1秒の消費量（quota の判定用）。"""
+
+    def __init__(self) -> None:
+        self._spent: Deque[Tuple[float, float]] = deque()
+        self._total = 0.0
+
+    def try_spend(self, amount: float, limit: float, now: float) -> bool:
+        while self._spent and now - self._spent[0][0] >= 1.0:
+            self._total -= self._spent.popleft()[1]
+        if self._total + amount > limit:
+            return False
+        self._spent.append((now, amount))
+        self._total += amount
+        return True
+
+
+class Mailbox:
+    """index から決まった合成メールを作る受信箱。index が大きいほど新しい。"""
+
+    def __init__(
+        self, size: int, *, seed: int = 0, negative_ratio: float = 0.2, html_bloat_kb: int = 0, thread_size: int = 1
+    ) -> None:
+        rng = random.Random(seed)
+        self.seed = seed
+        self.html_bloat_kb = html_bloat_kb
+        self.negative_ratio = negative_ratio
+        self.thread_size = max(1, thread_size)
+        self._rng = rng
+        self.kinds: List[str] = []
+        for _ in range(size):
+            self.kinds.append(self._next_kind())
+        # history: 新着の (historyId, index)。初期のメールは history に載らない
+        self.history: List[Tuple[int, int]] = []
+        self.history_id = _HISTORY_BASE
+        self._lock = threading.Lock()
+        self._queries: Dict[str, List[int]] = {}
+
+    def _pick_kind(self) -> str:
+        return "negative" if self._rng.random() < self.negative_ratio else self._rng.choice(PROVIDERS)
+
+    def _next_kind(self) -> str:
+        """次に足すメールの種類（スレッドの2通目以降は先頭と同じ）。"""
+        index = len(self.kinds)
+        return self.kinds[self.thread_head(index)] if index % self.thread_size else self._pick_kind()
+
+    def thread_head(self, index: int) -> int:
+        return index - index % self.thread_size
+
+    @staticmethod
+    def message_id(index: int) -> str:
+        return f"{index:016x}"
+
+    @staticmethod
+    def internal_date(index: int) -> int:
+        return (_MAILBOX_EPOCH + index * 60) * 1000
+
+    def deliver(self, count: int) -> List[int]:
+        """新着を count 通足す（それぞれ historyId を1つ進める）。"""
+        with self._lock:
+            added = []
+            for _ in range(count):
+                self.kinds.append(self._next_kind())
+                self.history_id += 1
+                self.history.append((self.history_id, len(self.kinds) - 1))
+                added.append(len(self.kinds) - 1)
+            self._queries.clear()
+            return added
+
+    def matching(self, q: Optional[str]) -> List[int]:
+        """q に当たるメールの index（新しい順）。"""
+        key = q or ""
+        with self._lock:
+            cached = self._queries.get(key)
+            if cached is not None:
+                return cached
+            provider = next((r.provider for r in PROVIDER_RULES if r.gmail_query() in key), None)
+            m = _AFTER_RE.search(key)
+            after = int(m.group(1)) if m else 0
+            indices = [
+                i
+                for i in range(len(self.kinds) - 1, -1, -1)
+                if (provider is None or self.kinds[i] == provider) and self.internal_date(i) // 1000 > after
+            ]
+            self._queries[key] = indices
+            return indices
+
+    def matching_threads(self, q: Optional[str]) -> List[int]:
+        """q に当たるメールのあるスレッドの先頭 index（新しいメールのあるスレッドから順）。"""
+        indices = self.matching(q)
+        seen = set()
+        heads = []
+        for i in indices:
+            head = self.thread_head(i)
+            if head not in seen:
+                seen.add(head)
+                heads.append(head)
+        return heads
+
+    def thread(self, head: int) -> List[int]:
+        """スレッドのメールの index（古い順）。"""
+        with self._lock:
+            return list(range(head, min(head + self.thread_size, len(self.kinds))))
+
+    @lru_cache(maxsize=4096)
+    def message(self, index: int) -> GmailMessage:
+        head = self.thread_head(index)
+        rng = random.Random(f"{self.seed}:{head}")
+        msg = GENERATORS[self.kinds[index]](rng, head, _random_date(rng, datetime(2025, 1, 1)), self.html_bloat_kb)
+        msg.id = self.message_id(index)
+        msg.thread_id = self.message_id(head)
+        return msg
+
+
+def _event_start(item: Dict[str, Any], key: str) -> Optional[datetime]:
+    spec = item.get(key) or {}
+    value = spec.get("dateTime") or spec.get("date")
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+class Calendar:
+    """1つのカレンダー（calendarId は見ない）。"""
+
+    def __init__(self) -> None:
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self.deleted: set = set()
+        self._by_uid: Dict[str, List[str]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _store(self, event_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+        item = dict(body, id=event_id, updated=now, status="confirmed")
+        self.items[event_id] = item
+        m = _UID_RE.search(body.get("description") or "")
+        if m:
+            ids = self._by_uid.setdefault(m.group(1), [])
+            if event_id not in ids:
+                ids.append(event_id)
+        return item
+
+    def list(self, params: Dict[str, str]) -> Response:
+        with self._lock:
+            q = params.get("q")
+            if q is not None:
+                items = [self.items[i] for i in self._by_uid.get(q, []) if i in self.items]
+            else:
+                items = list(self.items.values())
+        time_min = params.get("timeMin")
+        time_max = params.get("timeMax")
+        if time_min or time_max:
+            lo = datetime.fromisoformat(time_min.replace("Z", "+00:00")) if time_min else None
+            hi = datetime.fromisoformat(time_max.replace("Z", "+00:00")) if time_max else None
+            items = [
+                it
+                for it in items
+                if (hi is None or (_event_start(it, "start") or hi) < hi)
+                and (lo is None or (_event_start(it, "end") or lo) >= lo)
+            ]
+        offset = int(params.get("pageToken") or 0)
+        size = min(2500, int(params.get("maxResults") or 250))
+        resp: Dict[str, Any] = {"items": items[offset:offset + size]}
+        if offset + size < len(items):
+            resp["nextPageToken"] = str(offset + size)
+        return 200, resp
+
+    def insert(self, body: Dict[str, Any]) -> Response:
+        with self._lock:
+            return 200, self._store(f"fake{next(self._ids):08d}", body)
+
+    def update(self, event_id: str, body: Dict[str, Any], patch: bool = False) -> Response:
+        with self._lock:
+            if event_id not in self.items:
+                return self._missing(event_id)
+            if patch:
+                body = dict(self.items[event_id], **body)
+            return 200, self._store(event_id, body)
+
+    def get(self, event_id: str) -> Response:
+        with self._lock:
+            return (200, self.items[event_id]) if event_id in self.items else self._missing(event_id)
+
+    def delete(self, event_id: str) -> Response:
+        with self._lock:
+            if event_id not in self.items:
+                return self._missing(event_id)
+            item = self.items.pop(event_id)
+            self.deleted.add(event_id)
+            m = _UID_RE.search(item.get("description") or "")
+            if m and event_id in self._by_uid.get(m.group(1), []):
+                self._by_uid[m.group(1)].remove(event_id)
+            return 204, None
+
+    def _missing(self, event_id: str) -> Response:
+        if event_id in self.deleted:
+            return _error(410, "deleted", "Resource has been deleted")
+        return _error(404, "notFound", "Not Found")
+
+
+_ROUTES: Tuple[Tuple[str, "re.Pattern[str]", str], ...] = tuple(
+    (method, re.compile(pattern), name)
+    for method, pattern, name in (
+        ("GET", r"^/gmail/v1/users/[^/]+/profile$", "gmail.getProfile"),
+        ("GET", r"^/gmail/v1/users/[^/]+/messages$", "gmail.messages.list"),
+        ("GET", r"^/gmail/v1/users/[^/]+/messages/([^/]+)$", "gmail.messages.get"),
+        ("GET", r"^/gmail/v1/users/[^/]+/history$", "gmail.history.list"),
+        ("GET", r"^/gmail/v1/users/[^/]+/threads$", "gmail.threads.list"),
+        ("GET", r"^/gmail/v1/users/[^/]+/threads/([^/]+)$", "gmail.threads.get"),
+        ("GET", r"^/calendar/v3/calendars/[^/]+/events$", "calendar.events.list"),
+        ("POST", r"^/calendar/v3/calendars/[^/]+/events$", "calendar.events.insert"),
+        ("GET", r"^/calendar/v3/calendars/[^/]+/events/([^/]+)$", "calendar.events.get"),
+        ("PUT", r"^/calendar/v3/calendars/[^/]+/events/([^/]+)$", "calendar.events.update"),
+        ("PATCH", r"^/calendar/v3/calendars/[^/]+/events/([^/]+)$", "calendar.events.patch"),
+        ("DELETE", r"^/calendar/v3/calendars/[^/]+/events/([^/]+)$", "calendar.events.delete"),
+    )
+)
+
+
+class FakeGoogleApi:
+    """HTTP に依らない本体。FakeGoogleServer と batch の中の1件がここを呼ぶ。"""
+
+    def __init__(self, mailbox: Mailbox, faults: Optional[FaultConfig] = None, seed: int = 0) -> None:
+        self.mailbox = mailbox
+        self.calendar = Calendar()
+        self.faults = faults or FaultConfig()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._windows = {"gmail": _Window(), "calendar": _Window()}
+        self.calls: Counter = Counter()
+        self.units: Counter = Counter()
+        self.injected: Counter = Counter()
+        self.throttled: Counter = Counter()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calendar = Calendar()
+            self.calls.clear()
+            self.units.clear()
+            self.injected.clear()
+            self.throttled.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "units": dict(self.units),
+                "injected": dict(self.injected),
+                "throttled": dict(self.throttled),
+                "events": len(self.calendar.items),
+                "messages": len(self.mailbox.kinds),
+                "faults": asdict(self.faults),
+            }
+
+    def sleep(self) -> None:
+        f = self.faults
+        if f.latency_ms or f.jitter_ms:
+            with self._lock:
+                delay = f.latency_ms + self._rng.uniform(-f.jitter_ms, f.jitter_ms)
+            time.sleep(max(0.0, delay) / 1000)
+
+    def _admit(self, name: str) -> Optional[Response]:
+        """呼び出しを数え、quota / fault injection で弾くならそのエラー応答。"""
+        api, _, method = name.partition(".")
+        cost = GMAIL_QUOTA_UNITS.get(method, 5) if api == "gmail" else 1
+        f = self.faults
+        with self._lock:
+            self.calls[name] += 1
+            limit = f.gmail_units_per_sec if api == "gmail" else f.calendar_qps
+            if limit and not self._windows[api].try_spend(cost, limit, time.monotonic()):
+                self.throttled[api] += 1
+                return _error(429, "rateLimitExceeded", "User-rate limit exceeded")
+            self.units[api] += cost
+            roll = self._rng.random()
+            if roll < f.rate_limit_rate:
+                self.injected["429"] += 1
+                return _error(429, "rateLimitExceeded", "Rate Limit Exceeded (injected)")
+            if roll < f.rate_limit_rate + f.error_rate:
+                status = self._rng.choice((500, 503))
+                self.injected[str(status)] += 1
+                return _error(status, "backendError", "Backend Error (injected)")
+        return None
+
+    def handle(self, method: str, path: str, params: Dict[str, str], body: Optional[Dict[str, Any]]) -> Response:
+        for route_method, pattern, name in _ROUTES:
+            m = pattern.match(path)
+            if m and route_method == method:
+                rejected = self._admit(name)
+                if rejected is not None:
+                    return rejected
+                return self._dispatch(name, unquote(m.group(1)) if m.groups() else "", params, body or {})
+        return _error(404, "notFound", f"no fake route for {method} {path}")
+
+    def _dispatch(self, name: str, target: str, params: Dict[str, str], body: Dict[str, Any]) -> Response:
+        mb = self.mailbox
+        if name == "gmail.getProfile":
+            return 200, {"emailAddress": "me@example.com", "messagesTotal": len(mb.kinds), "historyId": str(mb.history_id)}
+        if name == "gmail.messages.list":
+            indices = mb.matching(params.get("q"))
+            offset = int(params.get("pageToken") or 0)
+            size = min(500, int(params.get("maxResults") or 100))
+            resp: Dict[str, Any] = {
+                "messages": [
+                    {"id": mb.message_id(i), "threadId": mb.message_id(mb.thread_head(i))}
+                    for i in indices[offset:offset + size]
+                ],
+                "resultSizeEstimate": len(indices),
+            }
+            if offset + size < len(indices):
+                resp["nextPageToken"] = str(offset + size)
+            return 200, resp
+        if name == "gmail.messages.get":
+            try:
+                index = int(target, 16)
+                msg = mb.message(index)
+            except (ValueError, IndexError):
+                return _error(404, "notFound", "Requested entity was not found.")
+            if params.get("format") == "raw":
+                # 4通に1通は日本語メールでよくある ISO-2022-JP
+                charset = "iso-2022-jp" if index % 4 == 0 else "utf-8"
+                return 200, gmail_raw_resource(msg, mb.internal_date(index), charset)
+            return 200, gmail_resource(msg, mb.internal_date(index))
+        if name == "gmail.threads.list":
+            heads = mb.matching_threads(params.get("q"))
+            offset = int(params.get("pageToken") or 0)
+            size = min(500, int(params.get("maxResults") or 100))
+            resp = {"threads": [{"id": mb.message_id(h)} for h in heads[offset:offset + size]]}
+            if offset + size < len(heads):
+                resp["nextPageToken"] = str(offset + size)
+            return 200, resp
+        if name == "gmail.threads.get":
+            try:
+                head = int(target, 16)
+                indices = mb.thread(head) if head < len(mb.kinds) and mb.thread_head(head) == head else []
+            except ValueError:
+                indices = []
+            if not indices:
+                return _error(404, "notFound", "Requested entity was not found.")
+            messages = []
+            for i in indices:
+                msg = mb.message(i)
+                messages.append(
+                    {
+                        "id": mb.message_id(i),
+                        "threadId": mb.message_id(head),
+                        "labelIds": ["INBOX"],
+                        "snippet": msg.snippet or "",
+                        "internalDate": str(mb.internal_date(i)),
+                        "payload": {
+                            "headers": [
+                                {"name": "Subject", "value": msg.subject or ""},
+                                {"name": "From", "value": msg.from_email or ""},
+                            ]
+                        },
+                    }
+                )
+            return 200, {"id": mb.message_id(head), "messages": messages}
+        if name == "gmail.history.list":
+            start = int(params.get("startHistoryId") or 0)
+            if start < _HISTORY_BASE:
+                return _error(404, "notFound", "Requested entity was not found.")
+            added = [(h, i) for h, i in mb.history if h > start]
+            offset = int(params.get("pageToken") or 0)
+            size = min(500, int(params.get("maxResults") or 100))
+            page = added[offset:offset + size]
+            resp = {
+                "history": [
+                    {"id": str(h), "messagesAdded": [{"message": {"id": mb.message_id(i), "labelIds": ["INBOX"]}}]}
+                    for h, i in page
+                ],
+                "historyId": str(mb.history_id),
+            }
+            if offset + size < len(added):
+                resp["nextPageToken"] = str(offset + size)
+            return 200, resp
+        cal = self.calendar
+        if name == "calendar.events.list":
+            return cal.list(params)
+        if name == "calendar.events.insert":
+            return cal.insert(body)
+        if name == "calendar.events.get":
+            return cal.get(target)
+        if name in ("calendar.events.update", "calendar.events.patch"):
+            return cal.update(target, body, patch=name.endswith("patch"))
+        return cal.delete(target)
+
+    def handle_batch(self, content_type: str, raw: bytes) -> Tuple[str, bytes]:
+        """multipart/mixed の batch を1件ずつ handle し、multipart/mixed の応答を返す（Content-ID は response-<id>）。"""
+        envelope = BytesParser(policy=HTTP).parsebytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + raw)
+        boundary = f"batch_{self._rng.getrandbits(64):016x}"
+        out: List[str] = []
+        for part in envelope.iter_parts():
+            payload = part.get_payload(decode=True) or b""
+            head, _, body = payload.replace(b"\r\n", b"\n").partition(b"\n\n")
+            request_line = head.split(b"\n", 1)[0].decode("utf-8")
+            method, target, _ = request_line.split(" ", 2)
+            url = urlsplit(target)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            status, resp = self.handle(method, url.path, params, json.loads(body) if body.strip() else None)
+            content_id = (part.get("Content-ID") or "").strip("<>")
+            text = json.dumps(resp) if resp is not None else ""
+            out.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\nContent-Length: {len(text.encode())}\r\n\r\n{text}\r\n"
+            )
+        out.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(out).encode("utf-8")
+
+
+class FakeGoogleServer:
+    """FakeGoogleApi を ThreadingHTTPServer（keep-alive）でデーモンスレッドから出す。port=0 なら空いているポート。"""
+
+    def __init__(self, api: FakeGoogleApi, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.api = api
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # keep-alive でヘッダと本文を別々に書くので、Nagle と delayed ACK で1往復 40ms 待たないようにする
+            disable_nagle_algorithm = True
+
+            def _send(self, status: int, content_type: str, data: bytes) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _reply(self, response: Response) -> None:
+                status, body = response
+                self._send(status, "application/json; charset=UTF-8", json.dumps(body).encode() if body is not None else b"")
+
+            def _serve(self, method: str) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                url = urlsplit(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if url.path == "/_stats":
+                    self._reply((200, api.stats()))
+                elif url.path == "/_admin/reset":
+                    api.reset()
+                    self._reply((204, None))
+                elif url.path == "/_admin/deliver":
+                    added = api.mailbox.deliver(int(params.get("count") or 1))
+                    self._reply((200, {"added": len(added), "historyId": str(api.mailbox.history_id)}))
+                elif url.path.startswith("/batch/"):
+                    api.sleep()
+                    content_type, data = api.handle_batch(self.headers.get("Content-Type") or "", raw)
+                    self._send(200, content_type, data)
+                else:
+                    api.sleep()
+                    self._reply(api.handle(method, url.path, params, json.loads(raw) if raw.strip() else None))
+
+            def do_GET(self) -> None:  # noqa: N802
+                self._serve("GET")
+
+            def do_POST(self) -> None:  # noqa: N802
+                self._serve("POST")
+
+            def do_PUT(self) -> None:  # noqa: N802
+                self._serve("PUT")
+
+            def do_PATCH(self) -> None:  # noqa: N802
+                self._serve("PATCH")
+
+            def do_DELETE(self) -> None:  # noqa: N802
+                self._serve("DELETE")
+
+            def log_message(self, format: str, *args: object) -> None:
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-google", daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeGoogleServer":
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeGoogleServer":
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def add_fault_arguments(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--messages", type=int, default=100_000, help="Mailbox size")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--html-bloat-kb", type=int, default=0)
+    ap.add_argument("--thread-size", type=int, default=1, help="Consecutive messages sharing one Gmail thread")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per HTTP request")
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered with 500/503")
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of calls answered with 429")
+    ap.add_argument("--gmail-units-per-sec", type=int, default=250, help="Gmail per-user quota (0 = unlimited)")
+    ap.add_argument("--calendar-qps", type=float, default=0.0, help="Calendar requests per second (0 = unlimited)")
+
+
+def api_from_args(args: argparse.Namespace) -> FakeGoogleApi:
+    faults = FaultConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        gmail_units_per_sec=args.gmail_units_per_sec,
+        calendar_qps=args.calendar_qps,
+    )
+    mailbox = Mailbox(args.messages, seed=args.seed, html_bloat_kb=args.html_bloat_kb, thread_size=args.thread_size)
+    return FakeGoogleApi(mailbox, faults, seed=args.seed)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Local fake Gmail/Calendar API server for load tests")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    add_fault_arguments(ap)
+    args = ap.parse_args(argv)
+
+    server = FakeGoogleServer(api_from_args(args), args.host, args.port)
+    print(f"fake Google API on {server.endpoint} ({args.messages} messages); set API_ENDPOINT={server.endpoint}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""ベンチ用のオフライン Google API クライアント（googleapiclient と同じ呼び出し形）。"""
+from __future__ import annotations
+
+import base64
+import itertools
+import re
+from datetime import datetime, timezone
+from email.message import EmailMessage
+from email.utils import format_datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from yogisync_core.models import GmailMessage
+
+_UID_RE = re.compile(r"^event_uid: (.*)$", re.MULTILINE)
+
+
+class _Request:
+    def __init__(self, fn: Callable[[], Any]) -> None:
+        self._fn = fn
+
+    def execute(self, num_retries: int = 0) -> Any:
+        return self._fn()
+
+
+class FakeCalendarService:
+    """
+    events().list/insert/update/delete だけを持つ in-memory カレンダー。
+    q は description の event_uid 完全一致で引く（件数が増えても O(1)）。
+    """
+
+    def __init__(self) -> None:
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self._by_uid: Dict[str, List[str]] = {}
+        self._ids = itertools.count(1)
+        self.calls: Dict[str, int] = {}
+
+    def events(self) -> "FakeCalendarService":
+        return self
+
+    def _count(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _store(self, event_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        item = dict(body, id=event_id, updated=datetime.utcnow().isoformat() + "Z")
+        self.items[event_id] = item
+        m = _UID_RE.search(body.get("description") or "")
+        if m:
+            ids = self._by_uid.setdefault(m.group(1), [])
+            if event_id not in ids:
+                ids.append(event_id)
+        return item
+
+    def list(self, calendarId: str, q: Optional[str] = None, **kwargs: Any) -> _Request:
+        self._count("list")
+
+        def run() -> Dict[str, Any]:
+            if q is None:
+                return {"items": list(self.items.values())}
+            return {"items": [self.items[i] for i in self._by_uid.get(q, []) if i in self.items]}
+
+        return _Request(run)
+
+    def insert(self, calendarId: str, body: Dict[str, Any], **kwargs: Any) -> _Request:
+        self._count("insert")
+        return _Request(lambda: self._store(f"ev{next(self._ids)}", body))
+
+    def update(self, calendarId: str, eventId: str, body: Dict[str, Any], **kwargs: Any) -> _Request:
+        self._count("update")
+        return _Request(lambda: self._store(eventId, body))
+
+    def delete(self, calendarId: str, eventId: str, **kwargs: Any) -> _Request:
+        self._count("delete")
+        return _Request(lambda: self.items.pop(eventId, None) and "")
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def gmail_resource(msg: GmailMessage, internal_date: int = 0) -> Dict[str, Any]:
+    """messages.get(format="full") の応答（Gmail が分解したパート。本文は base64url）。"""
+    parts = []
+    if msg.text_plain:
+        parts.append({"mimeType": "text/plain", "body": {"data": _b64(msg.text_plain.encode("utf-8"))}})
+    if msg.text_html:
+        parts.append({"mimeType": "text/html", "body": {"data": _b64(msg.text_html.encode("utf-8"))}})
+    headers = [{"name": "Subject", "value": msg.subject or ""}, {"name": "From", "value": msg.from_email or ""}]
+    return {
+        "id": msg.id,
+        "threadId": msg.thread_id,
+        "labelIds": ["INBOX"],
+        "snippet": msg.snippet or "",
+        "internalDate": str(internal_date or msg.internal_date or 0),
+        "payload": {"mimeType": "multipart/alternative", "headers": headers, "parts": parts},
+    }
+
+
+def rfc822_bytes(msg: GmailMessage, charset: str = "utf-8", attachment_kb: int = 0) -> bytes:
+    """
+    GmailMessage を RFC 822 のメールにする（text/plain を charset で、HTML は UTF-8 の alternative）。
+    attachment_kb > 0 なら PDF 風の添付を付ける（format="raw" では添付も一緒に届く）。
+    charset で書けない文字があれば UTF-8 にする。
+    """
+    em = EmailMessage()
+    em["Subject"] = msg.subject or ""
+    em["From"] = msg.from_email or ""
+    em["Date"] = format_datetime(datetime.fromtimestamp((msg.internal_date or 1_700_000_000_000) / 1000, timezone.utc))
+    try:
+        if msg.text_plain:
+            em.set_content(msg.text_plain, charset=charset)
+        else:
+            em.set_content(msg.text_html or "", subtype="html", charset=charset)
+    except UnicodeError:
+        return rfc822_bytes(msg, "utf-8", attachment_kb)
+    if msg.text_plain and msg.text_html:
+        em.add_alternative(msg.text_html, subtype="html")
+    if attachment_kb:
+        em.add_attachment(b"%PDF-1.4\n" + bytes(range(256)) * (attachment_kb * 4), maintype="application", subtype="pdf", filename="ticket.pdf")
+    return em.as_bytes()
+
+
+def gmail_raw_resource(msg: GmailMessage, internal_date: int = 0, charset: str = "utf-8", attachment_kb: int = 0) -> Dict[str, Any]:
+    """messages.get(format="raw") の応答（メール全体を base64url で）。"""
+    return {
+        "id": msg.id,
+        "threadId": msg.thread_id,
+        "labelIds": ["INBOX"],
+        "snippet": msg.snippet or "",
+        "internalDate": str(internal_date or msg.internal_date or 0),
+        "raw": _b64(rfc822_bytes(msg, charset, attachment_kb)),
+    }
+
+
+class FakeGmailService:
+    """
+    users().messages().get だけを持つ in-memory Gmail。応答は id ごとに用意しておく
+    （format="full" なら full_resources、"raw" なら raw_resources から返す）。
+    """
+
+    def __init__(self, full_resources: Dict[str, Dict[str, Any]], raw_resources: Dict[str, Dict[str, Any]]) -> None:
+        self.full_resources = full_resources
+        self.raw_resources = raw_resources
+
+    def users(self) -> "FakeGmailService":
+        return self
+
+    def messages(self) -> "FakeGmailService":
+        return self
+
+    def get(self, userId: str, id: str, format: str = "full", **kwargs: Any) -> _Request:
+        resources = self.raw_resources if format == "raw" else self.full_resources
+        return _Request(lambda: resources[id])
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import contextvars
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from google.auth.exceptions import RefreshError
+from google.oauth2.credentials import Credentials
+
+from .auth import load_credentials, refresh_if_expired
+from .calendar_backend import CalendarBackend, open_calendar_backend
+from .collector_gmail import HISTORY_ID_KEY, collect_incremental, get_gmail_service, gmail_scopes
+from .config import Config
+from .metrics import MetricsRegistry
+from .models import SyncResult
+from .pipeline import run_sync
+from .ratelimit import RateLimiter, use_rate_limiter
+from .store import EventStore
+from .telemetry import Telemetry
+from .transport import PooledHttp
+
+logger = logging.getLogger(__name__)
+
+LAST_SYNC_KEY = "last_sync_at"
+
+
+class AccountSession:
+    """
+    1アカウント分の使い回す状態: 認証・Gmail/Calendar クライアント・store のビュー・API 上限。
+    単一アカウント運用（config.accounts が空）では account="" の1セッションになる。
+    """
+
+    def __init__(self, config: Config, store: EventStore) -> None:
+        self.config = config
+        self.name = config.account or "default"
+        self.store = store.for_account(config.account)
+        self.limiter = RateLimiter(config.api_qps) if config.api_qps > 0 else None
+        self._creds: Optional[Credentials] = None
+        self._http: Optional[PooledHttp] = None
+        self.gmail: Any = None
+        self.calendar: Optional[CalendarBackend] = None
+
+    def ensure_clients(self) -> None:
+        if self._creds is None:
+            self._creds = load_credentials(self.config, gmail_scopes(self.config))
+            # Gmail と Calendar で1つの接続プールを共有する（スレッドをまたいで使える）
+            self._http = PooledHttp(self._creds, pool_size=self.config.http_pool_size)
+            self.gmail = get_gmail_service(self.config, http=self._http)
+            self.calendar = open_calendar_backend(self.config, http=self._http)
+            logger.info("account[%s]: clients ready", self.name)
+        elif refresh_if_expired(self._creds, self.config.google_token_path):
+            logger.info("account[%s]: token refreshed", self.name)
+
+    def reset(self) -> None:
+        """次回 ensure_clients() で認証からやり直す。"""
+        if self.calendar is not None:
+            self.calendar.close()
+        if self._http is not None:
+            self._http.close()
+        self._creds = None
+        self._http = None
+        self.gmail = None
+        self.calendar = None
+
+    def sync(
+        self,
+        limit: int,
+        *,
+        metrics: Optional[MetricsRegistry] = None,
+        incremental: bool = False,
+    ) -> SyncResult:
+        """
+        incremental=True: 前回の historyId 以降の新着だけ（起点はこのアカウントの sync_state）
+        incremental=False: GMAIL_QUERY で limit 件（`cli sync` と同じ）
+        """
+        telemetry = Telemetry()
+        with use_rate_limiter(self.limiter):
+            self.ensure_clients()
+            messages = None
+            next_history_id: Optional[str] = None
+            if incremental:
+                with telemetry.stage("gmail.fetch"):
+                    messages, next_history_id = collect_incremental(
+                        self.config, self.gmail, self.store, limit=limit, telemetry=telemetry
+                    )
+            result = run_sync(
+                self.config,
+                limit=limit,
+                telemetry=telemetry,
+                metrics=metrics,
+                messages=messages,
+                gmail_service=self.gmail,
+                calendar_service=self.calendar,
+                store=self.store,
+            )
+
+        # 処理し終えてから起点を進める（途中で落ちたら次回やり直す）。
+        # リトライし切れなかった Calendar の 5xx / 429 などで errors があれば進めず、次の周回で同じ新着をもう一度取る
+        # （書き終えた分は store が skipped にする）
+        if next_history_id:
+            if result.errors:
+                logger.warning(
+                    "account[%s]: %d errors; keeping history_id so the next cycle fetches these messages again",
+                    self.name,
+                    result.errors,
+                )
+            else:
+                self.store.set_state(HISTORY_ID_KEY, next_history_id)
+        self.store.set_state(LAST_SYNC_KEY, datetime.utcnow().isoformat())
+        return result
+
+
+def open_sessions(config: Config, store: EventStore) -> List[AccountSession]:
+    if not config.accounts:
+        return [AccountSession(config, store)]
+    return [AccountSession(config.for_account(profile), store) for profile in config.accounts]
+
+
+def _sync_one(
+    session: AccountSession, limit: int, metrics: Optional[MetricsRegistry], incremental: bool
+) -> SyncResult:
+    try:
+        return session.sync(limit, metrics=metrics, incremental=incremental)
+    except RefreshError:
+        logger.exception("account[%s]: token refresh failed; re-authenticating next time", session.name)
+        session.reset()
+    except Exception:
+        logger.exception("account[%s]: sync failed", session.name)
+    return SyncResult(errors=1)
+
+
+def sync_accounts(
+    sessions: List[AccountSession],
+    limit: int,
+    *,
+    metrics: Optional[MetricsRegistry] = None,
+    incremental: bool = False,
+    executor: Optional[Executor] = None,
+    max_workers: int = 4,
+) -> SyncResult:
+    """
+    全アカウントを1つのスレッドプールで並行に同期する。
+    1アカウントの失敗は他に波及させず、そのアカウントの errors として数える。
+    戻り値は合計で、accounts にアカウント別の結果が入る。
+    """
+    if len(sessions) == 1 and not sessions[0].config.account:
+        return _sync_one(sessions[0], limit, metrics, incremental)
+
+    if metrics is None and sessions and sessions[0].config.metrics_path:
+        # 全アカウント分を1ファイルに出すため registry を共有する
+        metrics = MetricsRegistry()
+
+    own_executor = executor is None
+    pool = executor or ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="yogisync-account")
+    try:
+        futures = {
+            s.name: pool.submit(contextvars.copy_context().run, _sync_one, s, limit, metrics, incremental)
+            for s in sessions
+        }
+        per_account: Dict[str, SyncResult] = {name: f.result() for name, f in futures.items()}
+    finally:
+        if own_executor:
+            pool.shutdown(wait=True)
+
+    total = SyncResult(accounts=per_account)
+    for r in per_account.values():
+        total.created += r.created
+        total.updated += r.updated
+        total.skipped += r.skipped
+        total.errors += r.errors
+        total.deferred += r.deferred
+    return total
@@ -1,11 +1,27 @@
 from __future__ import annotations
 
-from typing import List
+import json
+from typing import List, Optional, Set
 
+from google.auth import credentials as auth_credentials
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 
+from .config import Config
+
+
+def _granted_scopes(token_path: str) -> Optional[Set[str]]:
+    """token.json に記録された同意済みの scope（記録が無ければ None）。"""
+    try:
+        with open(token_path, encoding="utf-8") as f:
+            scopes = json.load(f).get("scopes")
+    except Exception:
+        return None
+    if isinstance(scopes, str):
+        scopes = scopes.split()
+    return set(scopes) if scopes else None
+
 
 def get_credentials(scopes: List[str], client_secret_path: str, token_path: str) -> Credentials:
     creds = None
@@ -14,6 +30,11 @@ def get_credentials(scopes: List[str], client_secret_path: str, token_path: str)
     except Exception:
         creds = None
 
+    granted = _granted_scopes(token_path)
+    if creds and granted is not None and not set(scopes) <= granted:
+        # scope を足した（GMAIL_PROCESSED_LABEL の gmail.modify など）ので同意し直す
+        creds = None
+
     if creds and creds.expired and creds.refresh_token:
         creds.refresh(Request())
         with open(token_path, "w", encoding="utf-8") as f:
@@ -25,3 +46,26 @@ def get_credentials(scopes: List[str], client_secret_path: str, token_path: str)
             f.write(creds.to_json())
 
     return creds
+
+
+def load_credentials(config: Config, scopes: List[str]) -> auth_credentials.Credentials:
+    """
+    config の token / client_secret で get_credentials する。
+    API_ENDPOINT（ローカルの fake サーバなど）に向けるときは OAuth をせず匿名の資格情報にする。
+    """
+    if config.api_endpoint:
+        return auth_credentials.AnonymousCredentials()
+    return get_credentials(scopes, config.google_client_secret_path, config.google_token_path)
+
+
+def refresh_if_expired(creds: Credentials, token_path: str) -> bool:
+    """
+    常駐モード用: 期限切れ（または間もなく切れる）なら refresh して token.json も更新する。
+    refresh_token が失効している場合は google.auth.exceptions.RefreshError をそのまま投げる。
+    """
+    if creds.valid or not creds.refresh_token:
+        return False
+    creds.refresh(Request())
+    with open(token_path, "w", encoding="utf-8") as f:
+        f.write(creds.to_json())
+    return True
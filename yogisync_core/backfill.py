@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from googleapiclient.errors import HttpError
+
+from .accounts import AccountSession, open_sessions
+from .collector_gmail import MESSAGE_LIST_FIELDS, exclude_processed, fetch_message
+from .config import Config
+from .models import GmailMessage, SyncResult
+from .pipeline import run_sync
+from .ratelimit import use_rate_limiter
+from .stages import build_stages
+from .store import EventStore
+from .telemetry import Telemetry, timed_execute
+
+logger = logging.getLogger(__name__)
+
+# sync_state のキー: backfill:<since>:<until>:<shards>:<shard番号>
+SHARD_KEY = "backfill:{since}:{until}:{shards}:{index}"
+
+
+@dataclass
+class ShardCursor:
+    """1シャードの進み具合。1ページ処理するごとに sync_state に JSON で保存する。"""
+
+    index: int
+    after: int  # epoch秒（この時刻を含む）
+    before: int  # epoch秒（この時刻を含まない）
+    page_token: Optional[str] = None  # 次に一覧するページ（None で先頭から）
+    last_message_id: Optional[str] = None  # 最後に処理し終えたメール
+    fetched: int = 0
+    missing: int = 0  # 一覧の後に削除されていて取得できなかった（404）メール
+    done: bool = False
+
+
+def split_range(since: date, until: date, shards: int, tz: str) -> List[Tuple[int, int]]:
+    """
+    [since, until) を日単位でおおよそ均等に shards 個に分け、epoch秒の (after, before) で返す。
+    日付の区切りは config.timezone で数える。
+    """
+    if until <= since:
+        raise ValueError(f"--until ({until}) must be after --since ({since})")
+    days = (until - since).days
+    shards = max(1, min(shards, days))
+    zone = ZoneInfo(tz)
+
+    def epoch(d: date) -> int:
+        return int(datetime(d.year, d.month, d.day, tzinfo=zone).timestamp())
+
+    bounds = [since + timedelta(days=days * i // shards) for i in range(shards)] + [until]
+    return [(epoch(a), epoch(b)) for a, b in zip(bounds, bounds[1:])]
+
+
+def shard_query(config: Config, cursor: ShardCursor) -> str:
+    # after: / before: は epoch秒なら秒単位で効く（after は「より後」なので1秒戻す）
+    parts = [f"after:{cursor.after - 1}", f"before:{cursor.before}"]
+    if config.gmail_query:
+        parts.insert(0, f"({config.gmail_query})")
+    return exclude_processed(config, " ".join(parts))
+
+
+class Backfill:
+    """
+    `cli backfill` の本体（1アカウント分）。
+
+    - 期間を shards 個の日付シャードに分け、シャードを並行に処理する
+    - 各シャードは1ページ（page_size 通）ずつ 一覧→取得→run_sync し、終わるたびにカーソルを保存する
+    - 途中で落ちても、同じ --since/--until/--shards で再実行すれば保存したページから続きをやる
+    - 前回までに予算切れで回されたイベント（deferred_events）はシャードを始める前に1回だけ流す。
+      シャードの run_sync は読み戻さない（同じ行を複数のシャードが同時に reconcile しない）
+    - 同じ event_uid が別のシャード（確認メールと変更通知の日付が違う）から来ても、
+      reconcile は store.event_lock で1つずつになるので、カレンダーに2件作らない
+    """
+
+    def __init__(
+        self,
+        session: AccountSession,
+        since: date,
+        until: date,
+        shards: int = 4,
+        page_size: int = 100,
+    ) -> None:
+        self.session = session
+        self.config = session.config
+        self.store = session.store
+        self.since = since
+        self.until = until
+        self.page_size = max(1, min(500, page_size))
+        self.telemetry = Telemetry()
+        # token の refresh を複数シャードから同時にしない
+        self._clients_lock = threading.Lock()
+        self.stages = build_stages(self.config, load_deferred=False)
+        ranges = split_range(since, until, shards, self.config.timezone)
+        self.shards = len(ranges)
+        self.cursors = [self._load(i, after, before) for i, (after, before) in enumerate(ranges)]
+
+    def _key(self, index: int) -> str:
+        return SHARD_KEY.format(
+            since=self.since.isoformat(), until=self.until.isoformat(), shards=self.shards, index=index
+        )
+
+    def _load(self, index: int, after: int, before: int) -> ShardCursor:
+        raw = self.store.get_state(self._key(index))
+        if raw:
+            return ShardCursor(**json.loads(raw))
+        return ShardCursor(index=index, after=after, before=before)
+
+    def _save(self, cursor: ShardCursor) -> None:
+        self.store.set_state(self._key(cursor.index), json.dumps(asdict(cursor)))
+
+    def _clients(self) -> Tuple[object, object]:
+        with self._clients_lock:
+            self.session.ensure_clients()
+            return self.session.gmail, self.session.calendar
+
+    def _run_shard(self, cursor: ShardCursor, total: SyncResult) -> None:
+        query = shard_query(self.config, cursor)
+        logger.info(
+            "backfill[%s]: shard %d/%d q=%s page_token=%s",
+            self.session.name,
+            cursor.index + 1,
+            self.shards,
+            query,
+            cursor.page_token,
+        )
+
+        while not cursor.done:
+            gmail, calendar = self._clients()
+            resp = timed_execute(
+                gmail.users().messages().list(
+                    userId="me",
+                    q=query,
+                    maxResults=self.page_size,
+                    pageToken=cursor.page_token,
+                    fields=MESSAGE_LIST_FIELDS,
+                ),
+                self.telemetry,
+                "gmail.messages.list",
+            )
+            ids = [m["id"] for m in resp.get("messages", []) or [] if m.get("id")]
+            messages: List[GmailMessage] = []
+            for msg_id in ids:
+                try:
+                    messages.append(fetch_message(gmail, msg_id, self.telemetry, self.config.gmail_format))
+                except HttpError as e:
+                    # 一覧の後に削除されたメールは 404 になる。飛ばさないと再開のたびに同じページで止まる
+                    if getattr(e.resp, "status", None) != 404:
+                        raise
+                    cursor.missing += 1
+                    logger.warning(
+                        "backfill[%s]: shard %d/%d skipped message %s (deleted after listing)",
+                        self.session.name,
+                        cursor.index + 1,
+                        self.shards,
+                        msg_id,
+                    )
+            if messages:
+                r = run_sync(
+                    self.config,
+                    limit=len(messages),
+                    telemetry=self.telemetry,
+                    messages=messages,
+                    gmail_service=gmail,
+                    calendar_service=calendar,
+                    store=self.store,
+                    stages=self.stages,
+                )
+                total.created += r.created
+                total.updated += r.updated
+                total.skipped += r.skipped
+                total.errors += r.errors
+                total.deferred += r.deferred
+                if r.errors:
+                    # 失敗したメールを含むページは進めない。再開時にこのページから取り直す
+                    logger.warning(
+                        "backfill[%s]: shard %d/%d stopped at page_token=%s (%d errors)",
+                        self.session.name,
+                        cursor.index + 1,
+                        self.shards,
+                        cursor.page_token,
+                        r.errors,
+                    )
+                    self._save(cursor)
+                    return
+
+            # このページを処理し終えたので次のページへ進める
+            cursor.page_token = resp.get("nextPageToken")
+            cursor.last_message_id = ids[-1] if ids else cursor.last_message_id
+            cursor.fetched += len(ids)
+            cursor.done = not cursor.page_token
+            self._save(cursor)
+
+        logger.info(
+            "backfill[%s]: shard %d/%d done fetched=%d missing=%d",
+            self.session.name,
+            cursor.index + 1,
+            self.shards,
+            cursor.fetched,
+            cursor.missing,
+        )
+
+    def _run_shard_safe(self, cursor: ShardCursor) -> SyncResult:
+        total = SyncResult()
+        try:
+            with use_rate_limiter(self.session.limiter):
+                self._run_shard(cursor, total)
+        except Exception:
+            # カーソルは最後に終えたページまで保存済み。再実行でここから続ける
+            logger.exception("backfill[%s]: shard %d/%d stopped", self.session.name, cursor.index + 1, self.shards)
+            total.errors += 1
+        return total
+
+    def _run_deferred(self, total: SyncResult) -> None:
+        """deferred_events だけを1回流す（メールは無し。予算は QUOTA_BUDGET / TIME_BUDGET のまま）。"""
+        try:
+            gmail, calendar = self._clients()
+            with use_rate_limiter(self.session.limiter):
+                r = run_sync(
+                    self.config,
+                    limit=0,
+                    telemetry=self.telemetry,
+                    messages=[],
+                    gmail_service=gmail,
+                    calendar_service=calendar,
+                    store=self.store,
+                )
+        except Exception:
+            # 残った行は次の sync / backfill でもう一度読み戻す
+            logger.exception("backfill[%s]: deferred events failed", self.session.name)
+            total.errors += 1
+            return
+        total.created += r.created
+        total.updated += r.updated
+        total.skipped += r.skipped
+        total.errors += r.errors
+        total.deferred += r.deferred
+
+    def run(self) -> SyncResult:
+        pending = [c for c in self.cursors if not c.done]
+        if len(pending) < len(self.cursors):
+            logger.info(
+                "backfill[%s]: resuming, %d/%d shards already done",
+                self.session.name,
+                len(self.cursors) - len(pending),
+                len(self.cursors),
+            )
+
+        total = SyncResult()
+        if pending and self.store.deferred_events():
+            self._run_deferred(total)
+        if pending:
+            with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="yogisync-backfill") as pool:
+                futures = [pool.submit(contextvars.copy_context().run, self._run_shard_safe, c) for c in pending]
+                for f in futures:
+                    r = f.result()
+                    total.created += r.created
+                    total.updated += r.updated
+                    total.skipped += r.skipped
+                    total.errors += r.errors
+                    total.deferred += r.deferred
+        total.timings = self.telemetry.summary()
+        return total
+
+
+def run_backfill(config: Config, since: date, until: date, shards: int = 4, page_size: int = 100) -> SyncResult:
+    """全アカウントを順に backfill する（アカウント内のシャードは並行）。"""
+    store = EventStore(config.sqlite_path, archive_path=config.archive_path)
+    try:
+        sessions = open_sessions(config, store)
+        per_account: Dict[str, SyncResult] = {}
+        for session in sessions:
+            per_account[session.name] = Backfill(session, since, until, shards=shards, page_size=page_size).run()
+    finally:
+        store.close()
+
+    if len(sessions) == 1 and not sessions[0].config.account:
+        return next(iter(per_account.values()))
+
+    total = SyncResult(accounts=per_account)
+    for r in per_account.values():
+        total.created += r.created
+        total.updated += r.updated
+        total.skipped += r.skipped
+        total.errors += r.errors
+        total.deferred += r.deferred
+    return total
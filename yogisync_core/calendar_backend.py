@@ -0,0 +1,422 @@
+from __future__ import annotations
+
+import copy
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
+
+from .auth import load_credentials
+from .config import Config
+from .telemetry import Telemetry, timed, timed_execute
+from .transport import PooledHttp, build_service
+
+logger = logging.getLogger(__name__)
+
+# NOTE:
+# token.json を 1つで運用しているなら、モジュールごとに scope がズレると 403 になりがちなので
+# Gmail/Calendar 両方を入れておくのが安全（あなたの運用に合わせている）
+SCOPES_CAL = [
+    "https://www.googleapis.com/auth/gmail.readonly",
+    "https://www.googleapis.com/auth/calendar",
+]
+
+# partial response（fields=）: 検索結果は id / updated / description しか見ない。
+# insert/update の戻りは id だけ使う。
+EVENT_LIST_FIELDS = "items(id,updated,description),nextPageToken"
+EVENT_WRITE_FIELDS = "id"
+
+# Calendar の batch は 50件/リクエストまでが推奨
+BATCH_SIZE = 50
+
+# Config.calendar_backend の値
+BACKEND_GOOGLE = "google"
+BACKEND_LOCAL = "local"
+
+
+class EventNotFound(LookupError):
+    """update / delete の対象の予定が無い（Google なら 404 / 410）。"""
+
+
+def get_calendar_service(config: Config, creds: Optional[Credentials] = None, http: Optional[PooledHttp] = None):
+    if http is None:
+        if creds is None:
+            creds = load_credentials(config, SCOPES_CAL)
+        http = PooledHttp(creds, pool_size=config.http_pool_size)
+    return build_service("calendar", "v3", http, config.api_endpoint)
+
+
+class CalendarBackend(ABC):
+    """
+    reconcile / dedupe が使うカレンダー操作。予定は Google Calendar の events リソースと同じ形の dict で扱い、
+    検索結果の各要素は少なくとも id / updated / description を持つ。
+
+    実装:
+      - GoogleCalendarBackend: Google Calendar API（本番）
+      - LocalCalendarBackend: SQLite のローカルカレンダー（オフライン実行・ベンチ用。重複や updated も同じように持つ）
+    """
+
+    telemetry: Optional[Telemetry] = None
+
+    def with_telemetry(self, telemetry: Optional[Telemetry]) -> "CalendarBackend":
+        """同じ接続を使い、計測先だけ差し替えたビュー（run_sync の実行ごとに作る）。"""
+        view = copy.copy(self)
+        view.telemetry = telemetry
+        return view
+
+    @abstractmethod
+    def list_window(self, time_min: str, time_max: str, q: Optional[str] = None) -> List[Dict[str, Any]]:
+        """[time_min, time_max) に重なる予定（q があれば全文検索で絞る。緩い一致で良い）。"""
+
+    @abstractmethod
+    def iter_all(self) -> Iterator[Dict[str, Any]]:
+        """カレンダーの全予定を1回だけ先頭から読む（dedupe 用）。"""
+
+    @abstractmethod
+    def insert(self, body: Dict[str, Any]) -> str:
+        """予定を作って id を返す（同じ内容でも毎回別の予定になる）。"""
+
+    @abstractmethod
+    def update(self, event_id: str, body: Dict[str, Any]) -> str:
+        """予定を body で置き換えて id を返す。無ければ EventNotFound（Google は HttpError）。"""
+
+    @abstractmethod
+    def delete(self, event_id: str) -> None:
+        """予定を消す。無ければ EventNotFound（Google は HttpError）。"""
+
+    def find_by_uid(self, event_uid: str, time_min: str, time_max: str) -> List[Dict[str, Any]]:
+        """description に event_uid を含む予定（q 検索は緩いことがあるので最後に必ず絞る）。"""
+        return [it for it in self.list_window(time_min, time_max, q=event_uid) if event_uid in (it.get("description") or "")]
+
+    def delete_many(self, event_ids: List[str]) -> List[str]:
+        """まとめて消し、消せなかった id を返す（既に無いものは成功扱い）。"""
+        failed: List[str] = []
+        for eid in event_ids:
+            try:
+                self.delete(eid)
+            except EventNotFound:
+                pass
+            except Exception as e:
+                logger.warning("calendar: delete failed id=%s: %s", eid, e)
+                failed.append(eid)
+        return failed
+
+    def close(self) -> None:
+        pass
+
+
+class GoogleCalendarBackend(CalendarBackend):
+    """
+    googleapiclient の Calendar クライアント（build 済み）を包む。
+    接続の close は PooledHttp の持ち主がやる。http を渡したとき（open_calendar_backend が専用に作ったプール）は
+    この backend が持ち主で、close() で閉じる。
+    """
+
+    def __init__(
+        self, config: Config, service, telemetry: Optional[Telemetry] = None, http: Optional[PooledHttp] = None
+    ) -> None:
+        if not config.yogisync_calendar_id:
+            raise ValueError("YOGISYNC_CALENDAR_ID is not set")
+        self.calendar_id = config.yogisync_calendar_id
+        self.service = service
+        self.telemetry = telemetry
+        self._http = http
+
+    def _list(self, **params: Any) -> Iterator[Dict[str, Any]]:
+        page_token: Optional[str] = None
+        while True:
+            resp = timed_execute(
+                self.service.events().list(
+                    calendarId=self.calendar_id,
+                    singleEvents=True,
+                    maxResults=2500,
+                    pageToken=page_token,
+                    fields=EVENT_LIST_FIELDS,
+                    **params,
+                ),
+                self.telemetry,
+                "calendar.events.list",
+            )
+            yield from resp.get("items", []) or []
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                break
+
+    def list_window(self, time_min: str, time_max: str, q: Optional[str] = None) -> List[Dict[str, Any]]:
+        return list(self._list(q=q, timeMin=time_min, timeMax=time_max))
+
+    def iter_all(self) -> Iterator[Dict[str, Any]]:
+        return self._list(showDeleted=False)
+
+    def insert(self, body: Dict[str, Any]) -> str:
+        created = timed_execute(
+            self.service.events().insert(calendarId=self.calendar_id, body=body, fields=EVENT_WRITE_FIELDS),
+            self.telemetry,
+            "calendar.events.insert",
+        )
+        return created.get("id")
+
+    def update(self, event_id: str, body: Dict[str, Any]) -> str:
+        updated = timed_execute(
+            self.service.events().update(
+                calendarId=self.calendar_id, eventId=event_id, body=body, fields=EVENT_WRITE_FIELDS
+            ),
+            self.telemetry,
+            "calendar.events.update",
+        )
+        return updated.get("id")
+
+    def delete(self, event_id: str) -> None:
+        timed_execute(
+            self.service.events().delete(calendarId=self.calendar_id, eventId=event_id),
+            self.telemetry,
+            "calendar.events.delete",
+        )
+
+    def delete_many(self, event_ids: List[str]) -> List[str]:
+        """BATCH_SIZE 件ずつ batch で削除する。"""
+        failed: List[str] = []
+
+        def on_done(request_id: str, response: Any, exception: Optional[Exception]) -> None:
+            if exception is None:
+                return
+            # 既に消えているものは成功扱い
+            if isinstance(exception, HttpError) and getattr(exception.resp, "status", None) in (404, 410):
+                return
+            logger.warning("calendar: delete failed id=%s: %s", request_id, exception)
+            failed.append(request_id)
+
+        for start in range(0, len(event_ids), BATCH_SIZE):
+            chunk = event_ids[start:start + BATCH_SIZE]
+            batch = self.service.new_batch_http_request(callback=on_done)
+            for eid in chunk:
+                batch.add(self.service.events().delete(calendarId=self.calendar_id, eventId=eid), request_id=eid)
+            if self.telemetry is not None:
+                # batch の中身も1件ずつ quota を消費する
+                self.telemetry.incr("api_calls", len(chunk) - 1, api="calendar", method="events.delete")
+                self.telemetry.incr("quota_units", len(chunk) - 1, api="calendar")
+            timed_execute(batch, self.telemetry, "calendar.events.delete")
+        return failed
+
+    def close(self) -> None:
+        if self._http is not None:
+            self._http.close()
+
+
+_LOCAL_DDL = """
+    CREATE TABLE IF NOT EXISTS local_calendar_events (
+        calendar_id TEXT NOT NULL,
+        id TEXT NOT NULL,
+        start_utc TEXT NOT NULL,
+        end_utc TEXT NOT NULL,
+        updated TEXT NOT NULL,
+        description TEXT,
+        body TEXT NOT NULL,
+        PRIMARY KEY (calendar_id, id)
+    )
+"""
+
+
+def _utc_text(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class LocalCalendarBackend(CalendarBackend):
+    """
+    SQLite に予定を持つローカルカレンダー。Google Calendar と同じ振る舞いをする:
+    - insert は毎回新しい id を振る（同じ event_uid の重複もそのまま残る）
+    - insert / update のたびに updated（RFC 3339, ミリ秒）が進む
+    - list_window は時間帯が重なる予定を返し、q は description の部分一致
+    - 無い id への update / delete は EventNotFound
+    - quota_units{api="calendar"} も Google と同じだけ数える（1操作 1 unit、一覧は 2500件ごと、まとめての削除は1件ごと）。
+      QUOTA_BUDGET が実際の消費でも効くようにするため
+    EventStore と同じファイルに置いても良い（テーブルは別）。
+    """
+
+    def __init__(self, path: str, calendar_id: str = "local", tz: str = "Asia/Tokyo", telemetry: Optional[Telemetry] = None) -> None:
+        self.path = path
+        self.calendar_id = calendar_id
+        self.zone = ZoneInfo(tz)
+        self.telemetry = telemetry
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock, self.conn:
+            self.conn.execute(_LOCAL_DDL)
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS local_calendar_by_start ON local_calendar_events (calendar_id, start_utc)"
+            )
+        # with_telemetry() のビューとも共有する（最後に振った updated）
+        self._clock = [""]
+
+    def _bound(self, value: Any) -> str:
+        """timeMin / timeMax（tz 無しならカレンダーの tz）を UTC の文字列にする。"""
+        dt = value if isinstance(value, datetime) else datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=self.zone)
+        return _utc_text(dt)
+
+    def _time(self, spec: Dict[str, Any]) -> str:
+        """events リソースの start / end（dateTime か date）を UTC の文字列にする。"""
+        if spec.get("dateTime"):
+            dt = datetime.fromisoformat(spec["dateTime"].replace("Z", "+00:00"))
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=ZoneInfo(spec.get("timeZone") or self.zone.key))
+            return _utc_text(dt)
+        d = date.fromisoformat(spec["date"])
+        return _utc_text(datetime(d.year, d.month, d.day, tzinfo=self.zone))
+
+    def _next_updated(self) -> str:
+        # 同じミリ秒に2回書いても updated が前後しないようにする（reconcile が新しい方を残すのに使う）
+        now = datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+        if now <= self._clock[0]:
+            last = datetime.fromisoformat(self._clock[0].replace("Z", "+00:00"))
+            now = datetime.fromtimestamp(last.timestamp() + 0.001, timezone.utc).isoformat(timespec="milliseconds")
+            now = now.replace("+00:00", "Z")
+        self._clock[0] = now
+        return now
+
+    def _row(self, event_id: str, body: Dict[str, Any]) -> Tuple[str, str, str, str, str, Optional[str], str]:
+        updated = self._next_updated()
+        item = dict(body, id=event_id, updated=updated)
+        return (
+            self.calendar_id,
+            event_id,
+            self._time(body["start"]),
+            self._time(body["end"]),
+            updated,
+            body.get("description"),
+            json.dumps(item, ensure_ascii=False),
+        )
+
+    @staticmethod
+    def _item(row: sqlite3.Row) -> Dict[str, Any]:
+        return json.loads(row["body"])
+
+    def _spend(self, units: int = 1) -> None:
+        if self.telemetry is not None and units > 0:
+            self.telemetry.incr("quota_units", units, api="calendar")
+
+    def list_window(self, time_min: str, time_max: str, q: Optional[str] = None) -> List[Dict[str, Any]]:
+        sql = (
+            "SELECT body FROM local_calendar_events"
+            " WHERE calendar_id = ? AND start_utc < ? AND end_utc > ?"
+        )
+        params: List[Any] = [self.calendar_id, self._bound(time_max), self._bound(time_min)]
+        if q:
+            sql += " AND instr(description, ?) > 0"
+            params.append(q)
+        with timed(self.telemetry, "calendar.local.list"), self._lock:
+            rows = self.conn.execute(sql + " ORDER BY start_utc, id", params).fetchall()
+        self._spend(max(1, -(-len(rows) // 2500)))
+        return [self._item(r) for r in rows]
+
+    def iter_all(self) -> Iterator[Dict[str, Any]]:
+        with timed(self.telemetry, "calendar.local.list"), self._lock:
+            rows = self.conn.execute(
+                "SELECT body FROM local_calendar_events WHERE calendar_id = ? ORDER BY start_utc, id",
+                (self.calendar_id,),
+            ).fetchall()
+        self._spend(max(1, -(-len(rows) // 2500)))
+        return (self._item(r) for r in rows)
+
+    def get(self, event_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT body FROM local_calendar_events WHERE calendar_id = ? AND id = ?",
+                (self.calendar_id, event_id),
+            ).fetchone()
+        if row is None:
+            raise EventNotFound(event_id)
+        return self._item(row)
+
+    def insert(self, body: Dict[str, Any]) -> str:
+        event_id = uuid.uuid4().hex
+        with timed(self.telemetry, "calendar.local.insert"), self._lock, self.conn:
+            self.conn.execute("INSERT INTO local_calendar_events VALUES (?, ?, ?, ?, ?, ?, ?)", self._row(event_id, body))
+        self._spend()
+        return event_id
+
+    def update(self, event_id: str, body: Dict[str, Any]) -> str:
+        with timed(self.telemetry, "calendar.local.update"), self._lock, self.conn:
+            row = self._row(event_id, body)
+            cur = self.conn.execute(
+                "UPDATE local_calendar_events SET start_utc = ?, end_utc = ?, updated = ?, description = ?, body = ?"
+                " WHERE calendar_id = ? AND id = ?",
+                row[2:] + row[:2],
+            )
+        self._spend()
+        if cur.rowcount == 0:
+            raise EventNotFound(event_id)
+        return event_id
+
+    def delete(self, event_id: str) -> None:
+        with timed(self.telemetry, "calendar.local.delete"), self._lock, self.conn:
+            cur = self.conn.execute(
+                "DELETE FROM local_calendar_events WHERE calendar_id = ? AND id = ?", (self.calendar_id, event_id)
+            )
+        self._spend()
+        if cur.rowcount == 0:
+            raise EventNotFound(event_id)
+
+    def delete_many(self, event_ids: List[str]) -> List[str]:
+        # 1トランザクションで消す（既に無いものは成功扱い）
+        with timed(self.telemetry, "calendar.local.delete"), self._lock, self.conn:
+            self.conn.executemany(
+                "DELETE FROM local_calendar_events WHERE calendar_id = ? AND id = ?",
+                [(self.calendar_id, eid) for eid in event_ids],
+            )
+        self._spend(len(event_ids))
+        return []
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+
+def open_calendar_backend(
+    config: Config, http: Optional[PooledHttp] = None, telemetry: Optional[Telemetry] = None
+) -> CalendarBackend:
+    """Config.calendar_backend に従ってバックエンドを開く（閉じるのは呼び出し側）。"""
+    if config.calendar_backend == BACKEND_LOCAL:
+        return LocalCalendarBackend(
+            config.local_calendar_path or config.sqlite_path,
+            calendar_id=config.yogisync_calendar_id or "local",
+            tz=config.timezone,
+            telemetry=telemetry,
+        )
+    if config.calendar_backend != BACKEND_GOOGLE:
+        raise ValueError(f"unknown CALENDAR_BACKEND: {config.calendar_backend!r} (google or local)")
+    owned: Optional[PooledHttp] = None
+    if http is None:
+        # この backend 専用の接続プール（backend の close() で閉じる）
+        http = owned = PooledHttp(load_credentials(config, SCOPES_CAL), pool_size=config.http_pool_size)
+    return GoogleCalendarBackend(config, get_calendar_service(config, http=http), telemetry=telemetry, http=owned)
+
+
+@contextmanager
+def as_calendar_backend(config: Config, service=None, telemetry: Optional[Telemetry] = None) -> Iterator[CalendarBackend]:
+    """
+    reconcile_event / dedupe_calendar の service 引数を CalendarBackend にする（with で使う）。
+    CalendarBackend ならそのまま（計測先だけ差し替え）、googleapiclient のクライアントなら Google 実装で包む。
+    None なら Config に従って開き、with を抜けるときに閉じる（渡されたものは閉じない）。
+    """
+    if isinstance(service, CalendarBackend):
+        yield service.with_telemetry(telemetry) if telemetry is not None else service
+    elif service is None:
+        backend = open_calendar_backend(config, telemetry=telemetry)
+        try:
+            yield backend
+        finally:
+            backend.close()
+    else:
+        yield GoogleCalendarBackend(config, service, telemetry=telemetry)
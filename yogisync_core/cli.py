@@ -1,8 +1,13 @@
 from __future__ import annotations
 
 import argparse
+import cProfile
 import logging
 import os
+import pstats
+import sys
+from dataclasses import replace
+from datetime import date, timedelta
 
 logging.basicConfig(
     level=os.getenv("LOG_LEVEL", "INFO"),
@@ -12,8 +17,29 @@ logging.getLogger().setLevel(os.getenv("LOG_LEVEL", "INFO"))
 logger = logging.getLogger(__name__)
 logger.info("cli: logger alive (after basicConfig)")
 
-from .config import load_config
+from .accounts import open_sessions, sync_accounts
+from .backfill import run_backfill
+from .config import Config, load_config
+from .crossdedupe import run_cross_dedupe
+from .dedupe import run_dedupe
+from .export import run_export
+from .label_migration import migrate_processed_labels
+from .maintenance import run_maintenance
+from .models import SyncResult
 from .pipeline import run_sync
+from .sources import import_archive
+from .store import EventStore
+from .watch import Watcher
+
+
+def _sync_all(config: Config, limit: int) -> SyncResult:
+    """ACCOUNTS_PATH のアカウントをまとめて1回同期する（1つの SQLite・スレッドプールを共有）。"""
+    store = EventStore(config.sqlite_path, archive_path=config.archive_path)
+    try:
+        sessions = open_sessions(config, store)
+        return sync_accounts(sessions, limit, max_workers=config.account_concurrency)
+    finally:
+        store.close()
 
 
 def main() -> None:
@@ -23,6 +49,75 @@ def main() -> None:
 
     sync_parser = subparsers.add_parser("sync", help="Sync Gmail to Google Calendar")
     sync_parser.add_argument("--limit", type=int, default=50, help="Max messages to fetch")
+    sync_parser.add_argument(
+        "--partitioned", action="store_true", help="One Gmail query per provider, in parallel (GMAIL_PARTITIONED)"
+    )
+    sync_parser.add_argument(
+        "--threads",
+        action="store_true",
+        help="List threads; fetch only the newest message per provider and change notices (GMAIL_THREADS)",
+    )
+    sync_parser.add_argument(
+        "--quota-budget", type=int, help="Max Calendar quota units for this run; the rest waits for the next run (QUOTA_BUDGET)"
+    )
+    sync_parser.add_argument(
+        "--time-budget", type=float, help="Seconds this run may spend before deferring the rest (TIME_BUDGET)"
+    )
+    sync_parser.add_argument("--profile", action="store_true", help="Run under cProfile and print pstats to stderr")
+    sync_parser.add_argument("--profile-out", default="sync.prof", help="Where to dump raw cProfile stats (with --profile)")
+
+    watch_parser = subparsers.add_parser("watch", help="Keep running and sync new mail every --interval seconds")
+    watch_parser.add_argument("--interval", type=float, default=60, help="Seconds between mailbox checks")
+    watch_parser.add_argument("--limit", type=int, default=50, help="Max messages for the initial listing")
+
+    backfill_parser = subparsers.add_parser(
+        "backfill", help="Sync a date range in parallel date shards; rerun with the same arguments to resume"
+    )
+    backfill_parser.add_argument("--since", type=date.fromisoformat, required=True, help="First day (YYYY-MM-DD)")
+    backfill_parser.add_argument(
+        "--until", type=date.fromisoformat, help="Day after the last day (YYYY-MM-DD, default: tomorrow)"
+    )
+    backfill_parser.add_argument("--shards", type=int, default=4, help="Number of date shards processed in parallel")
+    backfill_parser.add_argument("--page-size", type=int, default=100, help="Messages per page (cursor saved per page)")
+    backfill_parser.add_argument(
+        "--query", help="Gmail query ANDed with each shard's date range (default: GMAIL_QUERY)"
+    )
+
+    import_parser = subparsers.add_parser("import", help="Sync reservation mail from a local mbox file or Maildir")
+    import_parser.add_argument("path", help="mbox file (e.g. Google Takeout) or Maildir directory")
+    import_parser.add_argument("--limit", type=int, help="Max messages to read")
+    import_parser.add_argument("--account", help="Account name from ACCOUNTS_PATH to import into")
+
+    export_parser = subparsers.add_parser("export", help="Write ICS/JSON feeds for the viewer from the local DB")
+    export_parser.add_argument("--out", help="Output directory (default: EXPORT_DIR)")
+    export_parser.add_argument("--full", action="store_true", help="Rewrite every month instead of only changed ones")
+
+    dedupe_parser = subparsers.add_parser("dedupe", help="Remove duplicate YogiSync events from the whole calendar")
+    dedupe_parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted")
+
+    cross_parser = subparsers.add_parser(
+        "cross-dedupe", help="Merge the same class booked through different providers (e.g. Peatix and the studio)"
+    )
+    cross_parser.add_argument("--dry-run", action="store_true", help="Only report the duplicate groups (audit)")
+    cross_parser.add_argument(
+        "--link-only", action="store_true", help="Record the links in the DB but keep both calendar events"
+    )
+    cross_parser.add_argument("--threshold", type=float, help="Similarity score 0-1 to treat as the same class (DUPLICATE_THRESHOLD)")
+
+    label_parser = subparsers.add_parser(
+        "label-processed", help="Give the processed label to existing mail whose events are already synced"
+    )
+    label_parser.add_argument("--limit", type=int, default=0, help="Max messages to scan per account (0 = all)")
+    label_parser.add_argument("--dry-run", action="store_true", help="Only report what would be labeled")
+
+    maintain_parser = subparsers.add_parser(
+        "maintain", help="Archive past events beyond the retention period, then incremental VACUUM and ANALYZE"
+    )
+    maintain_parser.add_argument(
+        "--retention-days", type=int, help="Keep this many days of past events in the hot table (RETENTION_DAYS)"
+    )
+    maintain_parser.add_argument("--dry-run", action="store_true", help="Only count what would be archived/pruned")
+    maintain_parser.add_argument("--no-vacuum", action="store_true", help="Skip VACUUM/ANALYZE")
 
     args = parser.parse_args()
 
@@ -30,7 +125,62 @@ def main() -> None:
 
     if args.command == "sync":
         config = load_config()
-        result = run_sync(config, limit=args.limit)
+        if args.partitioned:
+            config = replace(config, gmail_partitioned=True)
+        if args.threads:
+            config = replace(config, gmail_threads=True)
+        if args.quota_budget is not None:
+            config = replace(config, quota_budget=args.quota_budget)
+        if args.time_budget is not None:
+            config = replace(config, time_budget=args.time_budget)
+        sync = _sync_all if config.accounts else run_sync
+        if args.profile:
+            profiler = cProfile.Profile()
+            result = profiler.runcall(sync, config, limit=args.limit)
+            profiler.dump_stats(args.profile_out)
+            # stdout は SyncResult の JSON 専用にしておく
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(30)
+        else:
+            result = sync(config, limit=args.limit)
+        print(result.model_dump_json())
+    elif args.command == "watch":
+        config = load_config()
+        Watcher(config, interval=args.interval, limit=args.limit).run()
+    elif args.command == "backfill":
+        config = load_config()
+        if args.query is not None:
+            config = replace(config, gmail_query=args.query)
+        until = args.until or date.today() + timedelta(days=1)
+        result = run_backfill(config, args.since, until, shards=args.shards, page_size=args.page_size)
+        print(result.model_dump_json())
+    elif args.command == "import":
+        config = load_config()
+        if args.account:
+            profile = next((p for p in config.accounts if p.name == args.account), None)
+            if profile is None:
+                parser.error(f"unknown account: {args.account}")
+            config = config.for_account(profile)
+        print(import_archive(config, args.path, limit=args.limit).model_dump_json())
+    elif args.command == "export":
+        config = load_config()
+        results = run_export(config, out_dir=args.out, full=args.full)
+        print("[" + ",".join(r.model_dump_json() for r in results) + "]")
+    elif args.command == "dedupe":
+        config = load_config()
+        print(run_dedupe(config, dry_run=args.dry_run).model_dump_json())
+    elif args.command == "cross-dedupe":
+        config = load_config()
+        if args.threshold is not None:
+            config = replace(config, duplicate_threshold=args.threshold)
+        print(run_cross_dedupe(config, dry_run=args.dry_run, link_only=args.link_only).model_dump_json())
+    elif args.command == "label-processed":
+        config = load_config()
+        print(migrate_processed_labels(config, limit=args.limit, dry_run=args.dry_run).model_dump_json())
+    elif args.command == "maintain":
+        config = load_config()
+        result = run_maintenance(
+            config, retention_days=args.retention_days, dry_run=args.dry_run, vacuum=not args.no_vacuum
+        )
         print(result.model_dump_json())
     else:
         parser.print_help()
@@ -1,26 +1,81 @@
 from __future__ import annotations
 
 import base64
-from typing import Dict, List, Optional, Tuple
+import contextvars
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
 
-from googleapiclient.discovery import build
+from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
 
-from .auth import get_credentials
+from .auth import load_credentials
 from .config import Config
-from .models import GmailMessage
+from .mime import MimeIndex, charset_of, decode_header_value, decode_text
+from .models import GmailMessage, Provider
+from .parsers.ics import MAX_CALENDAR_PART_BYTES, is_calendar_part
+from .provider_detect import PROVIDER_RULES, detect_provider
+from .store import EventStore
+from .telemetry import Telemetry, timed_execute
+from .transport import PooledHttp, build_service
+
+logger = logging.getLogger(__name__)
+
+# sync_state に保存する差分取得の起点
+HISTORY_ID_KEY = "gmail.history_id"
+# provider別クエリの起点（最後に最後まで取り切ったときの一番新しい受信日時, epoch秒）
+PARTITION_AFTER_KEY = "gmail.partition.{provider}.after"
 
 SCOPES_GMAIL = [
     "https://www.googleapis.com/auth/gmail.readonly",
     "https://www.googleapis.com/auth/calendar",
 ]
+# GMAIL_PROCESSED_LABEL のときだけ足す（ラベルの作成・付与）
+SCOPE_GMAIL_MODIFY = "https://www.googleapis.com/auth/gmail.modify"
+
+# 処理し終えたメールに付けるラベル / その id を覚える sync_state のキー（アカウントごと）
+PROCESSED_LABEL = "YogiSync/processed"
+PROCESSED_LABEL_ID_KEY = "gmail.processed_label_id"
+# messages.batchModify が1回で受け付ける id の上限
+BATCH_MODIFY_MAX_IDS = 1000
+
+# partial response（fields=）: 下流で読むものだけを返させる
+# parts は再帰するので4段まではマスクし、それより深い部分はそのまま受け取る
+# filename / attachmentId / size は .ics の添付を見つけるため。
+# headers は Content-Type の charset のため（Gmail は本文を元の charset のまま返す。ISO-2022-JP / Shift_JIS のメールがある）
+_PART = "mimeType,filename,headers(name,value),body(data,attachmentId,size)"
+_PART_FIELDS = f"{_PART},parts({_PART},parts({_PART},parts({_PART},parts)))"
+MESSAGE_GET_FIELDS = f"threadId,snippet,internalDate,payload(headers(name,value),{_PART_FIELDS})"
+# GMAIL_FORMAT=raw: パートの分解は手元の MimeIndex でする
+MESSAGE_GET_RAW_FIELDS = "threadId,snippet,internalDate,raw"
+MESSAGE_LIST_FIELDS = "messages/id,nextPageToken"
+# GMAIL_THREADS: スレッドの一覧と、スレッド内のメールの件名・送信元・snippet（format=metadata, 本文は返らない）
+THREAD_LIST_FIELDS = "threads/id,nextPageToken"
+THREAD_GET_FIELDS = "messages(id,labelIds,snippet,internalDate,payload/headers)"
+THREAD_METADATA_HEADERS = ["Subject", "From"]
+HISTORY_LIST_FIELDS = "history/messagesAdded/message(id,labelIds),historyId,nextPageToken"
+PROFILE_FIELDS = "historyId"
+
+# GMAIL_THREADS: 件名にこれを含むメールは、スレッドの一番新しいメールでなくても取得する（予約の変更・キャンセルの通知）
+THREAD_CHANGE_TERMS = ("変更", "キャンセル", "取消", "取り消", "中止", "振替", "cancel", "changed", "reschedul")
+
 
-def _decode_body(data: str) -> str:
+def _decode_body(data: str, charset: Optional[str] = None) -> str:
     try:
-        return base64.urlsafe_b64decode(data.encode("utf-8")).decode("utf-8", errors="replace")
+        return decode_text(base64.urlsafe_b64decode(data.encode("utf-8")), charset)
     except Exception:
         return ""
 
 
+def _part_charset(part: Dict) -> Optional[str]:
+    for h in part.get("headers", []) or []:
+        if (h.get("name") or "").lower() == "content-type":
+            return charset_of(h.get("value"))
+    return None
+
+
 def _extract_parts(payload: Dict) -> Tuple[Optional[str], Optional[str]]:
     text_plain = None
     text_html = None
@@ -31,9 +86,9 @@ def _extract_parts(payload: Dict) -> Tuple[Optional[str], Optional[str]]:
         body = part.get("body", {})
         data = body.get("data")
         if mime_type == "text/plain" and data and text_plain is None:
-            text_plain = _decode_body(data)
+            text_plain = _decode_body(data, _part_charset(part))
         elif mime_type == "text/html" and data and text_html is None:
-            text_html = _decode_body(data)
+            text_html = _decode_body(data, _part_charset(part))
 
         for child in part.get("parts", []) or []:
             walk(child)
@@ -42,6 +97,28 @@ def _extract_parts(payload: Dict) -> Tuple[Optional[str], Optional[str]]:
     return text_plain, text_html
 
 
+def _extract_calendar_parts(payload: Dict) -> Tuple[List[str], List[str]]:
+    """
+    text/calendar（.ics）のパート。戻り値: (本文に data が入っていたものをデコードした ICS, 添付 id)
+    添付 id のものは fetch_message が messages.attachments.get で取る。
+    """
+    texts: List[str] = []
+    attachment_ids: List[str] = []
+
+    def walk(part: Dict) -> None:
+        if is_calendar_part(part.get("mimeType"), part.get("filename")):
+            body = part.get("body", {})
+            if body.get("data"):
+                texts.append(_decode_body(body["data"], _part_charset(part)))
+            elif body.get("attachmentId") and int(body.get("size") or 0) <= MAX_CALENDAR_PART_BYTES:
+                attachment_ids.append(body["attachmentId"])
+        for child in part.get("parts", []) or []:
+            walk(child)
+
+    walk(payload)
+    return texts, attachment_ids
+
+
 def _parse_headers(headers: List[Dict]) -> Dict[str, str]:
     result: Dict[str, str] = {}
     for h in headers:
@@ -52,48 +129,672 @@ def _parse_headers(headers: List[Dict]) -> Dict[str, str]:
     return result
 
 
-def get_gmail_service(config: Config):
-    creds = get_credentials(SCOPES_GMAIL, config.google_client_secret_path, config.google_token_path)
-    return build("gmail", "v1", credentials=creds)
+def gmail_scopes(config: Config) -> List[str]:
+    """GMAIL_PROCESSED_LABEL が有効なら gmail.modify も要求する（既存の token は同意し直しになる）。"""
+    if config.gmail_processed_label:
+        return SCOPES_GMAIL + [SCOPE_GMAIL_MODIFY]
+    return list(SCOPES_GMAIL)
 
 
-def fetch_messages(config: Config, limit: int = 50) -> List[GmailMessage]:
-    service = get_gmail_service(config)
-    user_id = "me"
-    query = config.gmail_query
+def exclude_processed(config: Config, query: str) -> str:
+    """
+    GMAIL_PROCESSED_LABEL が有効なら、処理済みラベルの付いたメールを検索式で除外する。
+    検索演算子ではラベル名の "/" と空白は "-" になる（YogiSync/processed → yogisync-processed）。
+    """
+    if not config.gmail_processed_label:
+        return query
+    term = "-label:" + PROCESSED_LABEL.lower().replace("/", "-").replace(" ", "-")
+    return f"({query}) {term}" if query else term
+
+
+def get_gmail_service(config: Config, creds: Optional[Credentials] = None, http: Optional[PooledHttp] = None):
+    """
+    creds / http を渡せば使い回す（Gmail/Calendar が同じ認証と接続プールを共有する）。
+    http を渡さなければ、このクライアント専用の PooledHttp を作る（閉じる持ち主がいないので、使い回すなら http を渡す）。
+    """
+    if http is None:
+        if creds is None:
+            creds = load_credentials(config, gmail_scopes(config))
+        http = PooledHttp(creds, pool_size=config.http_pool_size)
+    return build_service("gmail", "v1", http, config.api_endpoint)
+
+
+class HistoryExpired(Exception):
+    """startHistoryId が古すぎて history.list が使えない（通常の一覧取得にフォールバックする）。"""
+
+
+def _message_from_raw(msg_id: str, resp: Dict) -> GmailMessage:
+    """
+    format="raw" の応答から GmailMessage を作る。ここでは MIME の索引（ヘッダと境界）だけを作り、
+    本文・.ics のデコードは GmailMessage が最初に読まれたときにそのパートだけ行う。
+    """
+    index = MimeIndex(base64.urlsafe_b64decode(resp.get("raw") or ""))
+    return GmailMessage(
+        id=msg_id,
+        thread_id=resp.get("threadId"),
+        subject=decode_header_value(index.headers.get("subject")),
+        from_email=decode_header_value(index.headers.get("from")),
+        snippet=resp.get("snippet"),
+        internal_date=int(resp.get("internalDate") or 0) or None,
+        lazy=index,
+    )
+
 
+def fetch_message(
+    service, msg_id: str, telemetry: Optional[Telemetry] = None, message_format: str = "full"
+) -> GmailMessage:
+    """
+    メール1通を取得する。message_format は GMAIL_FORMAT（"full" / "raw"）。
+    full は Gmail が分解したパートのうち最初の text/plain・text/html を今ここでデコードし、添付の .ics は
+    attachments.get で取る。raw はメール全体を受け取り、パーサが読むパートだけを後でデコードする。
+    """
+    if message_format == "raw":
+        resp = timed_execute(
+            service.users().messages().get(userId="me", id=msg_id, format="raw", fields=MESSAGE_GET_RAW_FIELDS),
+            telemetry,
+            "gmail.messages.get",
+        )
+        if telemetry is not None:
+            telemetry.incr("messages_fetched")
+        return _message_from_raw(msg_id, resp)
+
+    full = timed_execute(
+        service.users().messages().get(userId="me", id=msg_id, format="full", fields=MESSAGE_GET_FIELDS),
+        telemetry,
+        "gmail.messages.get",
+    )
+    payload = full.get("payload", {})
+    headers = _parse_headers(payload.get("headers", []) or [])
+    text_plain, text_html = _extract_parts(payload)
+    calendar_parts, attachment_ids = _extract_calendar_parts(payload)
+    for attachment_id in attachment_ids:
+        try:
+            attachment = timed_execute(
+                service.users().messages().attachments().get(userId="me", messageId=msg_id, id=attachment_id, fields="data"),
+                telemetry,
+                "gmail.messages.attachments.get",
+            )
+        except HttpError:
+            # .ics が取れなくても本文のパーサで読める
+            logger.warning("collector: could not fetch calendar attachment of message %s", msg_id, exc_info=True)
+            continue
+        if attachment.get("data"):
+            calendar_parts.append(_decode_body(attachment["data"]))
+    if telemetry is not None:
+        telemetry.incr("messages_fetched")
+    return GmailMessage(
+        id=msg_id,
+        thread_id=full.get("threadId"),
+        subject=headers.get("subject"),
+        from_email=headers.get("from"),
+        snippet=full.get("snippet"),
+        text_plain=text_plain,
+        text_html=text_html,
+        internal_date=int(full.get("internalDate") or 0) or None,
+        calendar_parts=calendar_parts or None,
+    )
+
+
+def select_thread_messages(metas: List[GmailMessage]) -> List[GmailMessage]:
+    """
+    スレッドのメール（本文の無いメタデータ）から本文まで取得するものを選ぶ。戻り値は古い順。
+    - provider ごとに一番新しいメール（同じ予約の通知は後のものほど新しい内容）
+    - provider が分かり、件名が変更・キャンセル（THREAD_CHANGE_TERMS）を示すメール
+    件名・送信元・snippet で provider の分かるメールが無いスレッドは、一番新しいメールだけ（本文で判定する）。
+    """
+    newest: Dict[Optional[Provider], GmailMessage] = {}
+    chosen: Dict[str, GmailMessage] = {}
+    for meta in metas:
+        provider = detect_provider(meta)
+        current = newest.get(provider)
+        if current is None or (meta.internal_date or 0) >= (current.internal_date or 0):
+            newest[provider] = meta
+        subject = (meta.subject or "").lower()
+        if provider and any(t in subject for t in THREAD_CHANGE_TERMS):
+            chosen[meta.id] = meta
+    if len(newest) > 1:
+        # provider の分かったメールがあれば、分からないメールは予約の通知ではない（返信・案内など）
+        newest.pop(None, None)
+    for meta in newest.values():
+        chosen[meta.id] = meta
+    return sorted(chosen.values(), key=lambda m: m.internal_date or 0)
+
+
+def fetch_thread(
+    service,
+    thread_id: str,
+    telemetry: Optional[Telemetry] = None,
+    message_format: str = "full",
+    skip_label_id: Optional[str] = None,
+) -> Tuple[List[GmailMessage], List[str]]:
+    """
+    threads.get（format=metadata）でスレッドの全メールの件名・送信元・snippet を1回で取り、
+    select_thread_messages で選んだメールだけを fetch_message で取得する。
+    自分が送ったメール・下書き・skip_label_id（処理済みラベル）の付いたメールは候補にしない。
+    戻り値: (取得したメール, 選ばなかった（新しいメールに置き換わった）メールの id)
+    """
+    resp = timed_execute(
+        service.users()
+        .threads()
+        .get(
+            userId="me",
+            id=thread_id,
+            format="metadata",
+            metadataHeaders=THREAD_METADATA_HEADERS,
+            fields=THREAD_GET_FIELDS,
+        ),
+        telemetry,
+        "gmail.threads.get",
+    )
+    metas: List[GmailMessage] = []
+    for m in resp.get("messages", []) or []:
+        labels = m.get("labelIds") or []
+        if not m.get("id") or "SENT" in labels or "DRAFT" in labels or (skip_label_id and skip_label_id in labels):
+            continue
+        headers = _parse_headers((m.get("payload") or {}).get("headers", []) or [])
+        metas.append(
+            GmailMessage(
+                id=m["id"],
+                thread_id=thread_id,
+                subject=headers.get("subject"),
+                from_email=headers.get("from"),
+                snippet=m.get("snippet"),
+                internal_date=int(m.get("internalDate") or 0) or None,
+            )
+        )
+
+    selected = select_thread_messages(metas)
+    selected_ids = {m.id for m in selected}
+    superseded = [m.id for m in metas if m.id not in selected_ids]
     messages: List[GmailMessage] = []
+    for meta in selected:
+        try:
+            messages.append(fetch_message(service, meta.id, telemetry, message_format))
+        except HttpError as e:
+            # 一覧の後に削除されたメールは 404 になる
+            if getattr(e.resp, "status", None) != 404:
+                raise
+    if superseded and telemetry is not None:
+        telemetry.incr("messages_superseded", len(superseded))
+    return messages, superseded
+
+
+def _processed_label_id(config: Config, store: Optional[EventStore]) -> Optional[str]:
+    """GMAIL_PROCESSED_LABEL のとき、覚えている処理済みラベルの id（まだ作っていなければ None）。"""
+    if not config.gmail_processed_label or store is None:
+        return None
+    return store.get_state(PROCESSED_LABEL_ID_KEY) or None
+
+
+def iter_messages(
+    config: Config,
+    limit: int = 50,
+    telemetry: Optional[Telemetry] = None,
+    service=None,
+) -> Iterator[GmailMessage]:
+    """
+    GMAIL_QUERY に一致するメールを1通ずつ取得して返す（GMAIL_PROCESSED_LABEL なら処理済みを除く）。
+    全件をリストに溜めないので、大量バックフィルでも同時に生きているメールは1通だけ。
+    service が None なら専用の接続プールを作り、読み終わったとき（または close されたとき）に閉じる。
+    """
+    if service is not None:
+        yield from _iter_messages(config, service, limit, telemetry)
+        return
+    http = PooledHttp(load_credentials(config, gmail_scopes(config)), pool_size=config.http_pool_size)
+    try:
+        yield from _iter_messages(config, get_gmail_service(config, http=http), limit, telemetry)
+    finally:
+        http.close()
+
+
+def _iter_messages(config: Config, service, limit: int, telemetry: Optional[Telemetry]) -> Iterator[GmailMessage]:
+    user_id = "me"
+    query = exclude_processed(config, config.gmail_query)
+
     page_token = None
     fetched = 0
 
     while True:
-        req = service.users().messages().list(userId=user_id, q=query, maxResults=min(500, limit - fetched), pageToken=page_token)
-        resp = req.execute()
+        req = service.users().messages().list(
+            userId=user_id,
+            q=query,
+            maxResults=min(500, limit - fetched),
+            pageToken=page_token,
+            fields=MESSAGE_LIST_FIELDS,
+        )
+        resp = timed_execute(req, telemetry, "gmail.messages.list")
         for msg in resp.get("messages", []) or []:
             msg_id = msg.get("id")
             if not msg_id:
                 continue
-            full = service.users().messages().get(userId=user_id, id=msg_id, format="full").execute()
-            payload = full.get("payload", {})
-            headers = _parse_headers(payload.get("headers", []) or [])
-            text_plain, text_html = _extract_parts(payload)
-            messages.append(
-                GmailMessage(
-                    id=msg_id,
-                    thread_id=full.get("threadId"),
-                    subject=headers.get("subject"),
-                    from_email=headers.get("from"),
-                    snippet=full.get("snippet"),
-                    text_plain=text_plain,
-                    text_html=text_html,
-                )
-            )
+            yield fetch_message(service, msg_id, telemetry, config.gmail_format)
             fetched += 1
             if fetched >= limit:
-                return messages
+                return
 
         page_token = resp.get("nextPageToken")
         if not page_token or fetched >= limit:
             break
 
-    return messages
+
+def fetch_messages(
+    config: Config,
+    limit: int = 50,
+    telemetry: Optional[Telemetry] = None,
+    service=None,
+) -> List[GmailMessage]:
+    return list(iter_messages(config, limit=limit, telemetry=telemetry, service=service))
+
+
+def get_history_id(service, telemetry: Optional[Telemetry] = None) -> str:
+    """メールボックスの現在の historyId（差分取得の起点）。"""
+    profile = timed_execute(service.users().getProfile(userId="me", fields=PROFILE_FIELDS), telemetry, "gmail.getProfile")
+    return str(profile.get("historyId"))
+
+
+def fetch_new_messages(
+    service,
+    start_history_id: str,
+    telemetry: Optional[Telemetry] = None,
+    message_format: str = "full",
+) -> Tuple[List[GmailMessage], str]:
+    """
+    start_history_id 以降に追加されたメールだけを取得する（history.list）。
+    戻り値: (メール, 次回の起点にする historyId)
+
+    NOTE:
+      history.list は q で絞れないので GMAIL_QUERY は効かない。
+      新着分だけなので件数は小さく、provider判定で落とせば十分。
+    """
+    ids: List[str] = []
+    seen = set()
+    latest = start_history_id
+    page_token: Optional[str] = None
+
+    while True:
+        try:
+            resp = timed_execute(
+                service.users().history().list(
+                    userId="me",
+                    startHistoryId=start_history_id,
+                    historyTypes=["messageAdded"],
+                    pageToken=page_token,
+                    fields=HISTORY_LIST_FIELDS,
+                ),
+                telemetry,
+                "gmail.history.list",
+            )
+        except HttpError as e:
+            if getattr(e.resp, "status", None) == 404:
+                raise HistoryExpired(start_history_id) from e
+            raise
+
+        for h in resp.get("history", []) or []:
+            for added in h.get("messagesAdded", []) or []:
+                m = added.get("message") or {}
+                msg_id = m.get("id")
+                labels = m.get("labelIds") or []
+                # 自分が送ったメール・下書きは予約メールではない
+                if not msg_id or msg_id in seen or "SENT" in labels or "DRAFT" in labels:
+                    continue
+                seen.add(msg_id)
+                ids.append(msg_id)
+
+        latest = str(resp.get("historyId") or latest)
+        page_token = resp.get("nextPageToken")
+        if not page_token:
+            break
+
+    messages: List[GmailMessage] = []
+    for msg_id in ids:
+        try:
+            messages.append(fetch_message(service, msg_id, telemetry, message_format))
+        except HttpError as e:
+            # 追加直後に削除されたメールは 404 になる
+            if getattr(e.resp, "status", None) != 404:
+                raise
+    return messages, latest
+
+
+def collect_incremental(
+    config: Config,
+    service,
+    store: EventStore,
+    limit: int = 50,
+    telemetry: Optional[Telemetry] = None,
+) -> Tuple[List[GmailMessage], str]:
+    """
+    store に保存した historyId 以降の新着だけを取る。起点が無い / 古すぎる場合は通常の一覧取得。
+    戻り値の historyId は、メールを処理し終えてから store.set_state(HISTORY_ID_KEY, ...) すること。
+    """
+    history_id = store.get_state(HISTORY_ID_KEY)
+    if history_id:
+        try:
+            return fetch_new_messages(service, history_id, telemetry, config.gmail_format)
+        except HistoryExpired:
+            logger.warning("collector: history_id=%s expired, falling back to full listing", history_id)
+
+    # 先に現在の historyId を取ってから一覧取得する（その間の新着を取りこぼさない）
+    latest = get_history_id(service, telemetry)
+    if config.gmail_threads:
+        threads = ThreadCollector(config, service, store, limit=limit, telemetry=telemetry)
+        messages = list(threads)
+        if config.gmail_processed_label:
+            # 置き換わったメールは run_sync の label_processed でまとめてラベルを付ける
+            store.record_processed(threads.superseded)
+        return messages, latest
+    messages = fetch_messages(config, limit=limit, telemetry=telemetry, service=service)
+    return messages, latest
+
+
+def ensure_processed_label(service, store: EventStore, telemetry: Optional[Telemetry] = None) -> str:
+    """処理済みラベルの id。無ければ作る（id は sync_state に覚えて、次からは API を呼ばない）。"""
+    label_id = store.get_state(PROCESSED_LABEL_ID_KEY)
+    if label_id:
+        return label_id
+
+    resp = timed_execute(
+        service.users().labels().list(userId="me", fields="labels(id,name)"), telemetry, "gmail.labels.list"
+    )
+    label_id = next((lb["id"] for lb in resp.get("labels", []) or [] if lb.get("name") == PROCESSED_LABEL), None)
+    if label_id is None:
+        created = timed_execute(
+            service.users()
+            .labels()
+            .create(
+                userId="me",
+                body={"name": PROCESSED_LABEL, "labelListVisibility": "labelShow", "messageListVisibility": "show"},
+                fields="id",
+            ),
+            telemetry,
+            "gmail.labels.create",
+        )
+        label_id = created["id"]
+        logger.info("labels: created %s (%s)", PROCESSED_LABEL, label_id)
+    store.set_state(PROCESSED_LABEL_ID_KEY, label_id)
+    return label_id
+
+
+def label_processed(
+    service,
+    store: EventStore,
+    message_ids: Iterable[str] = (),
+    telemetry: Optional[Telemetry] = None,
+) -> int:
+    """
+    message_ids を processed_messages に記録し、まだラベルの無いもの（前回付け損ねた分も）に
+    batchModify でまとめて処理済みラベルを付ける（1回 1000 通まで・50 quota units）。
+    戻り値: ラベルを付けた件数
+    """
+    store.record_processed(message_ids)
+    label_id = ensure_processed_label(service, store, telemetry)
+    labeled = 0
+    retried = False
+    while True:
+        ids = store.unlabeled_messages(BATCH_MODIFY_MAX_IDS)
+        if not ids:
+            break
+        try:
+            timed_execute(
+                service.users().messages().batchModify(userId="me", body={"ids": ids, "addLabelIds": [label_id]}),
+                telemetry,
+                "gmail.messages.batchModify",
+            )
+        except HttpError as e:
+            # 覚えていたラベルが Gmail 側で消された: 1回だけ作り直してやり直す
+            if retried or getattr(e.resp, "status", None) not in (400, 404):
+                raise
+            retried = True
+            store.set_state(PROCESSED_LABEL_ID_KEY, "")
+            label_id = ensure_processed_label(service, store, telemetry)
+            continue
+        store.mark_labeled(ids)
+        labeled += len(ids)
+    if labeled:
+        if telemetry is not None:
+            telemetry.incr("messages_labeled", labeled)
+        logger.info("labels: marked %d messages as %s", labeled, PROCESSED_LABEL)
+    return labeled
+
+
+def partition_query(config: Config, provider: Provider, after: Optional[int] = None) -> str:
+    """
+    provider のルールから作った検索式に、GMAIL_QUERY（追加の絞り込み）と起点の after: を AND でつなぐ。
+    GMAIL_PROCESSED_LABEL なら処理済みラベルも除外する。
+    """
+    rule = next(r for r in PROVIDER_RULES if r.provider == provider)
+    parts = [rule.gmail_query()]
+    if config.gmail_query:
+        parts.append(f"({config.gmail_query})")
+    if after:
+        parts.append(f"after:{after}")
+    return exclude_processed(config, " ".join(parts))
+
+
+class ThreadCollector:
+    """
+    GMAIL_THREADS: GMAIL_QUERY に当たるスレッドを threads.list で一覧し、fetch_thread で選んだメールだけを1通ずつ返す。
+
+    - limit はスレッド数（新しい順に最大 limit スレッド）
+    - 選ばなかったメールの id は superseded に溜まる。GMAIL_PROCESSED_LABEL なら run_sync が処理済みラベルを付け、
+      スレッドが次回の一覧に出てこないようにする
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        service,
+        store: Optional[EventStore] = None,
+        limit: int = 50,
+        telemetry: Optional[Telemetry] = None,
+    ) -> None:
+        self.config = config
+        self.service = service
+        self.store = store
+        self.limit = limit
+        self.telemetry = telemetry
+        self.superseded: List[str] = []
+
+    def __iter__(self) -> Iterator[GmailMessage]:
+        query = exclude_processed(self.config, self.config.gmail_query)
+        skip_label_id = _processed_label_id(self.config, self.store)
+        listed = 0
+        page_token: Optional[str] = None
+        while True:
+            resp = timed_execute(
+                self.service.users().threads().list(
+                    userId="me",
+                    q=query,
+                    maxResults=min(500, self.limit - listed),
+                    pageToken=page_token,
+                    fields=THREAD_LIST_FIELDS,
+                ),
+                self.telemetry,
+                "gmail.threads.list",
+            )
+            for thread in resp.get("threads", []) or []:
+                thread_id = thread.get("id")
+                if not thread_id:
+                    continue
+                messages, superseded = fetch_thread(
+                    self.service, thread_id, self.telemetry, self.config.gmail_format, skip_label_id
+                )
+                self.superseded.extend(superseded)
+                yield from messages
+                listed += 1
+                if listed >= self.limit:
+                    return
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                break
+
+
+class PartitionedCollector:
+    """
+    provider ごとの検索式で Gmail を並行に一覧・取得し、取れたメールから順に1通ずつ返す。
+
+    - limit は provider ごと（それぞれ新しい順に最大 limit 通）
+    - 複数の provider の検索に当たったメールは1回だけ取得する（どの provider かは detect_provider が決める）
+    - provider を最後まで取り切れたら、その中で一番新しい受信日時を起点として覚え、
+      commit() で store に保存する（次回はそれ以降だけを検索する）
+    - 1つの provider の失敗は他に波及させず failed に入れる（その provider の起点は進めない）
+    - 取得したメールの処理（パース・store・reconcile）が失敗した provider は、起点をそのメールより前に留める
+    - GMAIL_THREADS なら threads.list で一覧し（limit はスレッド数）、fetch_thread で選んだメールだけを取得する。
+      選ばなかったメールの id は superseded に溜まる
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        service,
+        store: EventStore,
+        providers: Iterable[Provider],
+        limit: int = 50,
+        telemetry: Optional[Telemetry] = None,
+        max_workers: Optional[int] = None,
+    ) -> None:
+        self.config = config
+        self.service = service
+        self.store = store
+        self.providers = list(providers)
+        self.limit = limit
+        self.telemetry = telemetry
+        self.max_workers = max(1, min(max_workers or config.http_pool_size, len(self.providers) or 1))
+        self.failed: List[Provider] = []
+        self.superseded: List[str] = []
+        self._checkpoints: Dict[Provider, int] = {}
+        # 取得したメール id → どの provider の検索で取ったか（commit で失敗したメールの起点を留めるため）
+        self._origin: Dict[str, Provider] = {}
+        self._seen: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # 消費側より先に溜め込みすぎない（メモリはワーカー数ぶんのメールだけ）
+        self._queue: "queue.Queue[Optional[GmailMessage]]" = queue.Queue(maxsize=self.max_workers * 2)
+
+    def _claim(self, msg_id: str) -> bool:
+        with self._lock:
+            if msg_id in self._seen:
+                return False
+            self._seen.add(msg_id)
+            return True
+
+    def _put(self, msg: Optional[GmailMessage]) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(msg, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _collect(self, provider: Provider) -> None:
+        key = PARTITION_AFTER_KEY.format(provider=provider)
+        after = self.store.get_state(key)
+        query = partition_query(self.config, provider, int(after) if after else None)
+        logger.info("collector: partition provider=%s q=%s", provider, query)
+
+        # GMAIL_THREADS ならスレッドを一覧する（_seen・fetched もスレッド単位）
+        threads = self.config.gmail_threads
+        listing = self.service.users().threads() if threads else self.service.users().messages()
+        kind = "threads" if threads else "messages"
+        skip_label_id = _processed_label_id(self.config, self.store) if threads else None
+
+        fetched = 0
+        newest = 0
+        page_token: Optional[str] = None
+        while not self._stop.is_set():
+            resp = timed_execute(
+                listing.list(
+                    userId="me",
+                    q=query,
+                    maxResults=min(500, self.limit - fetched),
+                    pageToken=page_token,
+                    fields=THREAD_LIST_FIELDS if threads else MESSAGE_LIST_FIELDS,
+                ),
+                self.telemetry,
+                f"gmail.{kind}.list",
+            )
+            for m in resp.get(kind, []) or []:
+                item_id = m.get("id")
+                if not item_id:
+                    continue
+                fetched += 1
+                if self._claim(item_id):
+                    if threads:
+                        messages, superseded = fetch_thread(
+                            self.service, item_id, self.telemetry, self.config.gmail_format, skip_label_id
+                        )
+                        with self._lock:
+                            self.superseded.extend(superseded)
+                    else:
+                        messages = [fetch_message(self.service, item_id, self.telemetry, self.config.gmail_format)]
+                    for msg in messages:
+                        newest = max(newest, (msg.internal_date or 0) // 1000)
+                        with self._lock:
+                            self._origin[msg.id] = provider
+                        if not self._put(msg):
+                            return
+                if fetched >= self.limit:
+                    # 取り切れていない（古い方が残っている）ので起点は進めない
+                    return
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                break
+
+        if not self._stop.is_set() and newest:
+            with self._lock:
+                # 同じ秒に届いたメールを取りこぼさないよう1秒戻す（再取得分は store が skip する）
+                self._checkpoints[provider] = newest - 1
+
+    def _run(self, provider: Provider) -> None:
+        try:
+            self._collect(provider)
+        except Exception:
+            logger.exception("collector: partition provider=%s failed", provider)
+            with self._lock:
+                self.failed.append(provider)
+        finally:
+            # この provider は終わり、の印
+            self._put(None)
+
+    def __iter__(self) -> Iterator[GmailMessage]:
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="yogisync-partition")
+        try:
+            for provider in self.providers:
+                pool.submit(contextvars.copy_context().run, self._run, provider)
+            remaining = len(self.providers)
+            while remaining:
+                msg = self._queue.get()
+                if msg is None:
+                    remaining -= 1
+                    continue
+                yield msg
+        finally:
+            # 途中で打ち切られたらワーカーも止める
+            self._stop.set()
+            pool.shutdown(wait=True)
+
+    def commit(self, failed: Optional[Mapping[str, Tuple[Optional[str], int]]] = None) -> None:
+        """
+        処理し終えてから呼ぶ。取り切れた provider の起点を store に保存する。
+        failed（StageContext.failed: メール id → (provider, internalDate)）のメールを取った provider は、
+        起点を一番古い失敗メールの1秒前までに留める（受信日時が分からなければ起点を進めない）。
+        """
+        with self._lock:
+            checkpoints = dict(self._checkpoints)
+            origin = dict(self._origin)
+        caps: Dict[Provider, int] = {}
+        for msg_id, (provider, internal_date) in (failed or {}).items():
+            owner = origin.get(msg_id) or provider
+            # どの provider か分からない失敗は、全部の provider の起点を留める
+            for p in [owner] if owner else list(checkpoints):
+                cap = internal_date // 1000 - 1 if internal_date else 0
+                caps[p] = min(caps.get(p, cap), cap)
+        for provider, after in checkpoints.items():
+            if provider in caps:
+                if caps[provider] <= 0:
+                    logger.warning("collector: partition provider=%s had failures; checkpoint not advanced", provider)
+                    continue
+                after = min(after, caps[provider])
+                logger.warning("collector: partition provider=%s had failures; checkpoint held at %d", provider, after)
+            self.store.set_state(PARTITION_AFTER_KEY.format(provider=provider), str(after))
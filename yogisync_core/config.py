@@ -1,8 +1,9 @@
 from __future__ import annotations
 
+import json
 import os
-from dataclasses import dataclass
-from typing import Protocol, Optional
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Protocol, Optional
 
 from dotenv import load_dotenv
 
@@ -18,6 +19,21 @@ class EnvSource:
         return os.environ.get(key, default)
 
 
+@dataclass
+class AccountProfile:
+    """
+    1つの Gmail アカウント → 1つの YogiSync カレンダー。
+    未指定の項目は .env の値を引き継ぐ。
+    """
+
+    name: str
+    google_token_path: Optional[str] = None
+    yogisync_calendar_id: Optional[str] = None
+    gmail_query: Optional[str] = None
+    # このアカウントの Google API 呼び出し上限（req/sec）。0 なら制限しない
+    api_qps: float = 0.0
+
+
 @dataclass
 class Config:
     gmail_query: str
@@ -27,6 +43,107 @@ class Config:
     timezone: str
     sqlite_path: str
     default_event_duration_minutes: int
+    # OpenMetrics: 実行後にこのパスへ書き出す（空なら無効）/ 常駐モードで /metrics を出すポート（0なら無効）
+    metrics_path: str = ""
+    metrics_port: int = 0
+    # 複数アカウント（ACCOUNTS_PATH の JSON）。空なら .env の1アカウントだけ
+    accounts: List[AccountProfile] = field(default_factory=list)
+    # 同時に処理するアカウント数 / アカウントごとの API 上限の既定値（req/sec, 0=無制限）
+    account_concurrency: int = 4
+    api_qps: float = 0.0
+    # 同期のたびに ICS/JSON を書き出すディレクトリ（空なら無効。`cli export` でも書ける）
+    export_dir: str = ""
+    # provider別の検索式で並行に一覧取得する（GMAIL_QUERY は追加の絞り込みになる）
+    gmail_partitioned: bool = False
+    # Gmail/Calendar が共有する HTTP 接続プールの大きさ（同時に飛ばせるリクエスト数）
+    http_pool_size: int = 8
+    # 予定の書き込み先: "google"（Google Calendar）/ "local"（SQLite のローカルカレンダー。オフライン実行・ベンチ用）
+    calendar_backend: str = "google"
+    # local のときの SQLite ファイル（空なら sqlite_path と同じファイルの別テーブル）
+    local_calendar_path: str = ""
+    # パイプラインの早い段で落とす条件（Calendar API を呼ぶ前）: 対象 provider（空なら全部）/
+    # 今から何日前・何日先までのイベントだけ扱うか（0なら制限しない）/ confidence の下限
+    provider_allowlist: List[str] = field(default_factory=list)
+    past_horizon_days: int = 0
+    future_horizon_days: int = 0
+    min_confidence: float = 0.0
+    # ステージごとの並行数（例: {"reconcile": 4}）。書いていないステージは1
+    stage_concurrency: Dict[str, int] = field(default_factory=dict)
+    # 1回の run で reconcile に使う Calendar API の quota units / 秒数の上限（0なら無制限）。超えた分は次回に回す
+    quota_budget: int = 0
+    time_budget: float = 0.0
+    # パーサに渡す本文の上限（文字数, 0なら無制限）/ 1通のパースに使って良い秒数（超えたら諦めて skipped, 0なら無制限）/
+    # 正規表現エンジン（"re" / "re2"。re2 は google-re2 が入っているときだけ）
+    parse_max_body_chars: int = 1_000_000
+    parse_time_budget: float = 2.0
+    regex_engine: str = "re"
+    # 予定を store / カレンダーに書き終えたメールに Gmail ラベル（YogiSync/processed）を付け、
+    # 次回からの一覧取得で除外する。gmail.modify の同意が要るので既定は無効
+    gmail_processed_label: bool = False
+    # messages.get の format。"raw" はメール全体（RFC 822）を受け取り、MIME 索引から
+    # パーサが読むパートだけを初めて読まれたときにデコードする（添付も一緒に届くので転送量は増える）
+    gmail_format: str = "full"
+    # スレッド単位で一覧し、スレッドごとに provider 別の一番新しいメールと変更・キャンセルのメールだけを取得する
+    # （同じ予約の通知が1スレッドにまとまる provider 向け。古い方のメールは取得もパースもしない）
+    gmail_threads: bool = False
+    # Gmail/Calendar API の接続先を差し替える（例: http://127.0.0.1:8765 のローカルの fake サーバ）。
+    # 設定すると OAuth をせず匿名の資格情報で呼ぶ。空なら Google の本番
+    api_endpoint: str = ""
+    # `cli maintain`: 何日より前の過去イベントを events から archive に移すか（0なら移さない）/
+    # archive を置く SQLite ファイル（空なら sqlite_path の中の events_archive テーブル）
+    retention_days: int = 0
+    archive_path: str = ""
+    # `cli cross-dedupe`: 別 provider の2件を同じクラスとみなすスコア（0〜1）と、開始時刻のずれの許容（分）
+    duplicate_threshold: float = 0.8
+    duplicate_time_tolerance_minutes: int = 30
+    # for_account() で作った Config のアカウント名（単一アカウント運用では ""）
+    account: str = ""
+
+    def for_account(self, profile: AccountProfile) -> "Config":
+        return replace(
+            self,
+            google_token_path=profile.google_token_path or self.google_token_path,
+            yogisync_calendar_id=profile.yogisync_calendar_id or self.yogisync_calendar_id,
+            gmail_query=profile.gmail_query or self.gmail_query,
+            api_qps=profile.api_qps or self.api_qps,
+            accounts=[],
+            account=profile.name,
+        )
+
+
+def load_accounts(path: str) -> List[AccountProfile]:
+    """
+    ACCOUNTS_PATH の JSON を読む。形式:
+      [{"name": "me", "google_token_path": "token.me.json", "yogisync_calendar_id": "...", "api_qps": 5}, ...]
+    """
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    accounts: List[AccountProfile] = []
+    names = set()
+    for item in raw:
+        profile = AccountProfile(
+            name=str(item["name"]),
+            google_token_path=item.get("google_token_path"),
+            yogisync_calendar_id=item.get("yogisync_calendar_id"),
+            gmail_query=item.get("gmail_query"),
+            api_qps=float(item.get("api_qps") or 0),
+        )
+        if not profile.name or profile.name in names:
+            raise ValueError(f"account name must be unique and non-empty: {profile.name!r}")
+        names.add(profile.name)
+        accounts.append(profile)
+    return accounts
+
+
+def parse_stage_concurrency(value: str) -> Dict[str, int]:
+    """STAGE_CONCURRENCY="reconcile=4,parse=2" → {"reconcile": 4, "parse": 2}"""
+    workers: Dict[str, int] = {}
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        name, _, n = part.partition("=")
+        workers[name.strip()] = max(1, int(n))
+    return workers
 
 
 def load_config(source: Optional[SettingsSource] = None, dotenv_path: Optional[str] = None) -> Config:
@@ -58,6 +175,50 @@ def load_config(source: Optional[SettingsSource] = None, dotenv_path: Optional[s
         or src.get("default_event_duration_minutes")
         or "60"
     )
+    metrics_path = src.get("METRICS_PATH") or src.get("metrics_path") or ""
+    metrics_port = int(src.get("METRICS_PORT") or src.get("metrics_port") or "0")
+    accounts_path = src.get("ACCOUNTS_PATH") or src.get("accounts_path") or ""
+    accounts = load_accounts(accounts_path) if accounts_path else []
+    account_concurrency = int(src.get("ACCOUNT_CONCURRENCY") or src.get("account_concurrency") or "4")
+    api_qps = float(src.get("API_QPS") or src.get("api_qps") or "0")
+    export_dir = src.get("EXPORT_DIR") or src.get("export_dir") or ""
+    gmail_partitioned = (src.get("GMAIL_PARTITIONED") or src.get("gmail_partitioned") or "").lower() in (
+        "1",
+        "true",
+        "yes",
+        "on",
+    )
+    http_pool_size = int(src.get("HTTP_POOL_SIZE") or src.get("http_pool_size") or "8")
+    calendar_backend = (src.get("CALENDAR_BACKEND") or src.get("calendar_backend") or "google").lower()
+    local_calendar_path = src.get("LOCAL_CALENDAR_PATH") or src.get("local_calendar_path") or ""
+    provider_allowlist = [
+        p.strip()
+        for p in (src.get("PROVIDER_ALLOWLIST") or src.get("provider_allowlist") or "").split(",")
+        if p.strip()
+    ]
+    past_horizon_days = int(src.get("PAST_HORIZON_DAYS") or src.get("past_horizon_days") or "0")
+    future_horizon_days = int(src.get("FUTURE_HORIZON_DAYS") or src.get("future_horizon_days") or "0")
+    min_confidence = float(src.get("MIN_CONFIDENCE") or src.get("min_confidence") or "0")
+    quota_budget = int(src.get("QUOTA_BUDGET") or src.get("quota_budget") or "0")
+    time_budget = float(src.get("TIME_BUDGET") or src.get("time_budget") or "0")
+    parse_max_body_chars = int(
+        src.get("PARSE_MAX_BODY_CHARS") or src.get("parse_max_body_chars") or "1000000"
+    )
+    parse_time_budget = float(src.get("PARSE_TIME_BUDGET") or src.get("parse_time_budget") or "2")
+    regex_engine = (src.get("REGEX_ENGINE") or src.get("regex_engine") or "re").lower()
+    gmail_processed_label = (
+        src.get("GMAIL_PROCESSED_LABEL") or src.get("gmail_processed_label") or ""
+    ).lower() in ("1", "true", "yes", "on")
+    gmail_format = (src.get("GMAIL_FORMAT") or src.get("gmail_format") or "full").lower()
+    gmail_threads = (src.get("GMAIL_THREADS") or src.get("gmail_threads") or "").lower() in ("1", "true", "yes", "on")
+    api_endpoint = src.get("API_ENDPOINT") or src.get("api_endpoint") or ""
+    retention_days = int(src.get("RETENTION_DAYS") or src.get("retention_days") or "0")
+    archive_path = src.get("ARCHIVE_PATH") or src.get("archive_path") or ""
+    duplicate_threshold = float(src.get("DUPLICATE_THRESHOLD") or src.get("duplicate_threshold") or "0.8")
+    duplicate_time_tolerance_minutes = int(
+        src.get("DUPLICATE_TIME_TOLERANCE_MINUTES") or src.get("duplicate_time_tolerance_minutes") or "30"
+    )
+    stage_concurrency = parse_stage_concurrency(src.get("STAGE_CONCURRENCY") or src.get("stage_concurrency") or "")
 
     return Config(
         gmail_query=gmail_query,
@@ -67,4 +228,32 @@ def load_config(source: Optional[SettingsSource] = None, dotenv_path: Optional[s
         timezone=timezone,
         sqlite_path=sqlite_path,
         default_event_duration_minutes=default_event_duration_minutes,
+        metrics_path=metrics_path,
+        metrics_port=metrics_port,
+        accounts=accounts,
+        account_concurrency=account_concurrency,
+        api_qps=api_qps,
+        export_dir=export_dir,
+        gmail_partitioned=gmail_partitioned,
+        http_pool_size=http_pool_size,
+        calendar_backend=calendar_backend,
+        local_calendar_path=local_calendar_path,
+        provider_allowlist=provider_allowlist,
+        past_horizon_days=past_horizon_days,
+        future_horizon_days=future_horizon_days,
+        min_confidence=min_confidence,
+        stage_concurrency=stage_concurrency,
+        quota_budget=quota_budget,
+        time_budget=time_budget,
+        parse_max_body_chars=parse_max_body_chars,
+        parse_time_budget=parse_time_budget,
+        regex_engine=regex_engine,
+        gmail_processed_label=gmail_processed_label,
+        gmail_format=gmail_format,
+        gmail_threads=gmail_threads,
+        api_endpoint=api_endpoint,
+        retention_days=retention_days,
+        archive_path=archive_path,
+        duplicate_threshold=duplicate_threshold,
+        duplicate_time_tolerance_minutes=duplicate_time_tolerance_minutes,
     )
@@ -0,0 +1,357 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import re
+import sqlite3
+import unicodedata
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .accounts import open_sessions
+from .calendar_backend import as_calendar_backend
+from .config import Config
+from .models import CrossDedupeResult
+from .store import EventStore
+from .telemetry import Telemetry, timed
+
+logger = logging.getLogger(__name__)
+
+# タイトルの比較で落とすもの: 【Peatix】のような括弧のタグと、予約メール側が付ける定型の語
+_TAG_RE = re.compile(r"【[^】]*】|\[[^\]]*\]|［[^］]*］")
+_NOISE_WORDS = (
+    "予約確定",
+    "予約完了",
+    "予約確認",
+    "ご予約",
+    "予約",
+    "お申し込み",
+    "申込",
+    "チケット",
+    "reservation",
+    "booking",
+    "confirmed",
+    "ticket",
+    "peatix",
+    "mosh",
+)
+# 文字・数字以外（空白・記号・句読点）を落とす。表記ゆれ（全角/半角・空白の有無）を吸収する
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+# スコアの重み（会場が両方にあるとき / どちらかに無いとき）: (タイトル, 会場, 時刻)
+_WEIGHTS_WITH_VENUE = (0.5, 0.3, 0.2)
+_WEIGHTS_WITHOUT_VENUE = (0.7, 0.0, 0.3)
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """NFKC・小文字化し、括弧のタグ・定型語・記号・空白を落とした比較用の文字列。"""
+    if not text:
+        return ""
+    value = unicodedata.normalize("NFKC", text).lower()
+    stripped = _TAG_RE.sub(" ", value)
+    # タイトル全体が括弧の中（【朝ヨガ】など）ならタグを外さない
+    if _NON_WORD_RE.sub("", stripped):
+        value = stripped
+    for word in _NOISE_WORDS:
+        value = value.replace(word, " ")
+    return _NON_WORD_RE.sub("", value)
+
+
+def _bigrams(text: str) -> FrozenSet[str]:
+    if len(text) < 2:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i : i + 2] for i in range(len(text) - 1))
+
+
+def _jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    inter = len(a & b)
+    return inter / (len(a) + len(b) - inter)
+
+
+@dataclass
+class _Candidate:
+    """1行分の比較用の特徴（行ごとに1回だけ作る）。"""
+
+    row: sqlite3.Row
+    day: str
+    minute: Optional[int]
+    title: FrozenSet[str]
+    venue: FrozenSet[str]
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "_Candidate":
+        start = datetime.fromisoformat(row["date"])
+        minute = None if row["time_unknown"] else start.hour * 60 + start.minute
+        venue = normalize_text(row["location_name"]) or normalize_text(row["address"])
+        return cls(row, start.date().isoformat(), minute, _bigrams(normalize_text(row["title"])), _bigrams(venue))
+
+
+def similarity(a: _Candidate, b: _Candidate, tolerance_minutes: int) -> float:
+    """
+    2件が同じクラスである度合い（0〜1）。タイトル・会場は文字 bigram の Jaccard、時刻は開始のずれ。
+    開始時刻が tolerance_minutes より離れていれば 0。どちらかが時刻不明（終日）なら時刻は 0.5 とする。
+    """
+    if a.day != b.day:
+        return 0.0
+    if a.minute is None or b.minute is None:
+        time_score = 0.5
+    else:
+        diff = abs(a.minute - b.minute)
+        if diff > tolerance_minutes:
+            return 0.0
+        time_score = 1.0 - 0.5 * diff / max(tolerance_minutes, 1)
+    title_score = _jaccard(a.title, b.title)
+    if a.venue and b.venue:
+        w_title, w_venue, w_time = _WEIGHTS_WITH_VENUE
+        return w_title * title_score + w_venue * _jaccard(a.venue, b.venue) + w_time * time_score
+    w_title, _, w_time = _WEIGHTS_WITHOUT_VENUE
+    return w_title * title_score + w_time * time_score
+
+
+def _candidate_pairs(day: Sequence[_Candidate], tolerance_minutes: int) -> Iterator[Tuple[int, int]]:
+    """
+    1日分の中で比べる組（blocking）。開始時刻を tolerance_minutes 幅のバケットに分け、
+    同じバケットと次のバケットの間だけを組にする（tolerance 以内の組はこれで全部拾える）。
+    時刻不明のイベントはその日の全件と組にする。
+    """
+    width = max(tolerance_minutes, 1)
+    buckets: Dict[int, List[int]] = {}
+    unknown: List[int] = []
+    for i, c in enumerate(day):
+        if c.minute is None:
+            unknown.append(i)
+        else:
+            buckets.setdefault(c.minute // width, []).append(i)
+    for slot, members in buckets.items():
+        yield from itertools.combinations(members, 2)
+        for j in buckets.get(slot + 1, ()):
+            for i in members:
+                yield i, j
+    yield from itertools.combinations(unknown, 2)
+    for members in buckets.values():
+        for i in unknown:
+            for j in members:
+                yield i, j
+
+
+@dataclass
+class DuplicateGroup:
+    """同じクラスとみなした行の集まり（provider は全部別）。keep を残し、duplicates を重複として扱う。"""
+
+    keep: sqlite3.Row
+    duplicates: List[sqlite3.Row]
+    # 各行について、グループに入ったときのスコア（keep も含む）
+    scores: Dict[str, float] = field(default_factory=dict)
+
+
+def _keep_key(row: sqlite3.Row) -> Tuple:
+    """
+    残す1件の優先順。前回の cross-dedupe で残した行 → 時刻が分かっている → confidence が高い →
+    会場がある → カレンダーに同期済み → 終了時刻がある。同点なら event_uid の辞書順（毎回同じ行を選ぶ）。
+    """
+    return (
+        row["duplicate_of"] is not None,
+        bool(row["time_unknown"]),
+        -(row["confidence"] or 0.0),
+        not row["location_name"],
+        not row["gcal_event_id"],
+        not row["end_at"],
+        row["event_uid"],
+    )
+
+
+def _group_day(
+    day: Sequence[_Candidate], threshold: float, tolerance_minutes: int, counter: List[int]
+) -> Iterator[DuplicateGroup]:
+    """
+    1日分をグループにまとめる。スコアの高い組から順に、2つのグループを
+    - provider が重ならない（同じ provider の2件は別々の予約かもしれない）
+    - 合わせたときに全部の組がしきい値以上（complete linkage）
+    のときだけ1つにする。会場の無い1件を挟んで別会場のクラス同士がつながる、といった連鎖を防ぐ。
+    """
+    matches: List[Tuple[float, int, int]] = []
+    for i, j in _candidate_pairs(day, tolerance_minutes):
+        a, b = day[i], day[j]
+        # 同じ provider の重複は event_uid（reconcile / dedupe）で扱う
+        if a.row["provider"] == b.row["provider"]:
+            continue
+        counter[0] += 1
+        score = similarity(a, b, tolerance_minutes)
+        if score >= threshold:
+            matches.append((score, i, j))
+
+    group_of: Dict[int, List[int]] = {}
+    best: Dict[int, float] = {}
+    for score, i, j in sorted(matches, key=lambda m: (-m[0], m[1], m[2])):
+        gi, gj = group_of.get(i, [i]), group_of.get(j, [j])
+        if gi is gj:
+            continue
+        if {day[k].row["provider"] for k in gi} & {day[k].row["provider"] for k in gj}:
+            continue
+        if any(similarity(day[x], day[y], tolerance_minutes) < threshold for x in gi for y in gj if (x, y) != (i, j)):
+            continue
+        merged = gi + gj
+        for k in merged:
+            group_of[k] = merged
+        best[i] = max(best.get(i, 0.0), score)
+        best[j] = max(best.get(j, 0.0), score)
+
+    seen: Set[int] = set()
+    for members in group_of.values():
+        if id(members) in seen:
+            continue
+        seen.add(id(members))
+        rows = sorted((day[k].row for k in members), key=_keep_key)
+        yield DuplicateGroup(
+            keep=rows[0],
+            duplicates=rows[1:],
+            scores={day[k].row["event_uid"]: round(best[k], 3) for k in members},
+        )
+
+
+def find_duplicate_groups(
+    rows: Iterable[sqlite3.Row],
+    *,
+    threshold: float,
+    tolerance_minutes: int,
+    result: Optional[CrossDedupeResult] = None,
+) -> Iterator[DuplicateGroup]:
+    """
+    date 順の行（EventStore.iter_events）から、別 provider の同じクラスのグループを返す。
+    日付ごとに読み、その日の中を時間帯のバケットで blocking するので、比較は総当たり（n²）ではなく
+    「1日・1時間帯あたりの件数」の二乗の和で済み、メモリも1日分しか持たない。
+    result があれば scanned / blocks / comparisons を数える。
+    日付をまたぐ組（0時前後の開始）は比べない。
+    """
+    counter = [0]
+    scanned = blocks = 0
+    for _, day_rows in itertools.groupby((_Candidate.from_row(r) for r in rows), key=lambda c: c.day):
+        day = list(day_rows)
+        scanned += len(day)
+        blocks += len({c.minute // max(tolerance_minutes, 1) if c.minute is not None else -1 for c in day})
+        yield from _group_day(day, threshold, tolerance_minutes, counter)
+        if result is not None:
+            result.scanned, result.blocks, result.comparisons = scanned, blocks, counter[0]
+
+
+def _describe(row: sqlite3.Row) -> Dict[str, Optional[str]]:
+    return {
+        "event_uid": row["event_uid"],
+        "provider": row["provider"],
+        "title": row["title"],
+        "date": row["date"],
+        "location_name": row["location_name"],
+        "gcal_event_id": row["gcal_event_id"],
+    }
+
+
+def cross_dedupe(
+    config: Config,
+    service,
+    store: EventStore,
+    *,
+    dry_run: bool = False,
+    link_only: bool = False,
+    telemetry: Optional[Telemetry] = None,
+) -> CrossDedupeResult:
+    """
+    store のイベント（archive 含む）から、別 provider 経由で届いた同じクラスをまとめる（1アカウント分）。
+    - 残す1件は _keep_key の順。それ以外の行に duplicate_of（残した方の event_uid）を記録する
+    - link_only=False なら重複側のカレンダーの予定を（Google なら batch で）消し、gcal_event_id も外す。
+      次の sync で同じ内容のメールを読んでも作り直さない（内容が変われば duplicate_of を外して通常どおり同期する）
+    - export の feed は duplicate_of のある行を出さない
+    dry_run=True なら何も変更しない。service は CalendarBackend か googleapiclient の Calendar クライアント
+    （dry_run / link_only なら None で良い）。
+    """
+    result = CrossDedupeResult(dry_run=dry_run, link_only=link_only, threshold=config.duplicate_threshold)
+    links: List[Tuple[str, str, Optional[str]]] = []
+    with timed(telemetry, "cross_dedupe.scan"):
+        groups = find_duplicate_groups(
+            store.iter_events(),
+            threshold=config.duplicate_threshold,
+            tolerance_minutes=config.duplicate_time_tolerance_minutes,
+            result=result,
+        )
+        for group in groups:
+            result.groups += 1
+            new = [r for r in group.duplicates if r["duplicate_of"] != group.keep["event_uid"]]
+            if not new:
+                action = "already_linked"
+            else:
+                action = "would_link" if dry_run else "link"
+                links.extend((r["event_uid"], group.keep["event_uid"], r["gcal_event_id"]) for r in new)
+            result.details.append(
+                {
+                    "action": action,
+                    "keep": _describe(group.keep),
+                    "duplicates": [
+                        dict(_describe(r), score=group.scores.get(r["event_uid"], 0.0)) for r in group.duplicates
+                    ],
+                }
+            )
+    if dry_run or not links:
+        return result
+
+    failed: Set[str] = set()
+    to_delete = [gid for _, _, gid in links if gid] if not link_only else []
+    if to_delete:
+        with as_calendar_backend(config, service, telemetry) as backend, timed(telemetry, "cross_dedupe.delete"):
+            failed = set(backend.delete_many(to_delete))
+        result.deleted = len(to_delete) - len(failed)
+        result.errors = len(failed)
+    for uid, keep_uid, gcal_event_id in links:
+        if gcal_event_id in failed:
+            # 消せなかった予定は次回もう一度
+            continue
+        store.link_duplicate(uid, keep_uid, clear_gcal_event_id=not link_only)
+        result.linked += 1
+
+    logger.info(
+        "cross-dedupe: scanned=%d blocks=%d comparisons=%d groups=%d linked=%d deleted=%d errors=%d",
+        result.scanned,
+        result.blocks,
+        result.comparisons,
+        result.groups,
+        result.linked,
+        result.deleted,
+        result.errors,
+    )
+    return result
+
+
+def run_cross_dedupe(config: Config, *, dry_run: bool = False, link_only: bool = False) -> CrossDedupeResult:
+    """`cli cross-dedupe` の本体。複数アカウント運用なら各アカウントを順に見る（アカウントをまたいでは比べない）。"""
+    store = EventStore(config.sqlite_path, archive_path=config.archive_path)
+    try:
+        sessions = open_sessions(config, store)
+        per_account: Dict[str, CrossDedupeResult] = {}
+        for session in sessions:
+            try:
+                if not dry_run and not link_only:
+                    session.ensure_clients()
+                per_account[session.name] = cross_dedupe(
+                    session.config, session.calendar, session.store, dry_run=dry_run, link_only=link_only
+                )
+            finally:
+                session.reset()
+    finally:
+        store.close()
+
+    if len(sessions) == 1 and not sessions[0].config.account:
+        return next(iter(per_account.values()))
+
+    total = CrossDedupeResult(
+        dry_run=dry_run, link_only=link_only, threshold=config.duplicate_threshold, accounts=per_account
+    )
+    for r in per_account.values():
+        total.scanned += r.scanned
+        total.blocks += r.blocks
+        total.comparisons += r.comparisons
+        total.groups += r.groups
+        total.linked += r.linked
+        total.deleted += r.deleted
+        total.errors += r.errors
+    return total
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from .accounts import open_sessions
+from .calendar_backend import CalendarBackend, as_calendar_backend
+from .config import Config
+from .models import DedupeResult
+from .store import EventStore
+from .sync_gcal import _choose_keep_event_id
+from .telemetry import Telemetry, timed
+
+logger = logging.getLogger(__name__)
+
+# build_description() が書く "event_uid: ..." の行
+_EVENT_UID_RE = re.compile(r"^event_uid:[ \t]*(.+?)[ \t]*$", re.MULTILINE)
+
+
+def _event_uid_of(item: Dict[str, Any]) -> Optional[str]:
+    m = _EVENT_UID_RE.search(item.get("description") or "")
+    return m.group(1) if m else None
+
+
+def scan_calendar(backend: CalendarBackend) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    YogiSync カレンダーを先頭から1回だけ読み、event_uid ごとに {id, updated} をまとめる。
+    event_uid を持たない（YogiSync が作っていない）予定は無視する。
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for it in backend.iter_all():
+        uid = _event_uid_of(it)
+        if uid and it.get("id"):
+            groups.setdefault(uid, []).append({"id": it["id"], "updated": it.get("updated")})
+    return groups
+
+
+def dedupe_calendar(
+    config: Config,
+    service,
+    store: EventStore,
+    *,
+    dry_run: bool = False,
+    telemetry: Optional[Telemetry] = None,
+) -> DedupeResult:
+    """
+    カレンダー全体を1パスで重複掃除する。
+    - 残す1件は reconcile_event と同じ方針（DBの gcal_event_id がグループ内にあればそれ、
+      無ければ _choose_keep_event_id）
+    - 余分はまとめて（Google なら batch で）削除し、DBの gcal_event_id を残した1件に合わせる
+    dry_run=True なら何も変更せずに、やる予定の内容だけを返す。
+    service は CalendarBackend か googleapiclient の Calendar クライアント。
+    """
+    with as_calendar_backend(config, service, telemetry) as backend:
+        return _dedupe(config, backend, store, dry_run=dry_run, telemetry=telemetry)
+
+
+def _dedupe(
+    config: Config,
+    backend: CalendarBackend,
+    store: EventStore,
+    *,
+    dry_run: bool,
+    telemetry: Optional[Telemetry],
+) -> DedupeResult:
+    with timed(telemetry, "dedupe.scan"):
+        groups = scan_calendar(backend)
+
+    result = DedupeResult(dry_run=dry_run, scanned=sum(len(v) for v in groups.values()), event_uids=len(groups))
+    to_delete: List[str] = []
+    id_fixes: List[tuple] = []
+
+    for uid, items in groups.items():
+        # 保持期間を過ぎて archive に移した行の id も見る
+        row = store.get_event(uid) or store.get_archived_event(uid)
+        stored_id = row["gcal_event_id"] if row else None
+
+        if len(items) == 1:
+            # 重複は無いが、DB側の id がずれていれば直す
+            if row is not None and stored_id != items[0]["id"]:
+                id_fixes.append((uid, items[0]["id"]))
+            continue
+
+        ids = [it["id"] for it in items]
+        keep_id = stored_id if stored_id in ids else _choose_keep_event_id(items)
+        delete_ids = [eid for eid in ids if eid != keep_id]
+        to_delete.extend(delete_ids)
+        if row is not None and stored_id != keep_id:
+            id_fixes.append((uid, keep_id))
+        result.duplicate_groups += 1
+        result.details.append({"event_uid": uid, "keep": keep_id, "delete": delete_ids})
+
+    result.to_delete = len(to_delete)
+    result.store_fixes = len(id_fixes)
+    if dry_run:
+        return result
+
+    with timed(telemetry, "dedupe.delete"):
+        failed = set(backend.delete_many(to_delete))
+    result.deleted = len(to_delete) - len(failed)
+    result.errors = len(failed)
+
+    for uid, keep_id in id_fixes:
+        store.update_gcal_event_id(uid, keep_id)
+
+    logger.info(
+        "dedupe: scanned=%d uids=%d duplicate_groups=%d deleted=%d store_fixes=%d errors=%d",
+        result.scanned,
+        result.event_uids,
+        result.duplicate_groups,
+        result.deleted,
+        result.store_fixes,
+        result.errors,
+    )
+    return result
+
+
+def run_dedupe(config: Config, *, dry_run: bool = False) -> DedupeResult:
+    """`cli dedupe` の本体。複数アカウント運用なら各アカウントのカレンダーを順に掃除する。"""
+    store = EventStore(config.sqlite_path, archive_path=config.archive_path)
+    try:
+        sessions = open_sessions(config, store)
+        per_account: Dict[str, DedupeResult] = {}
+        for session in sessions:
+            try:
+                session.ensure_clients()
+                per_account[session.name] = dedupe_calendar(
+                    session.config, session.calendar, session.store, dry_run=dry_run
+                )
+            finally:
+                session.reset()
+    finally:
+        store.close()
+
+    if len(sessions) == 1 and not sessions[0].config.account:
+        return next(iter(per_account.values()))
+
+    total = DedupeResult(dry_run=dry_run, accounts=per_account)
+    for r in per_account.values():
+        total.scanned += r.scanned
+        total.event_uids += r.event_uids
+        total.duplicate_groups += r.duplicate_groups
+        total.to_delete += r.to_delete
+        total.deleted += r.deleted
+        total.store_fixes += r.store_fixes
+        total.errors += r.errors
+    return total
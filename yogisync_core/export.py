@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from .config import Config
+from .fileio import atomic_write_text
+from .models import Event, ExportResult
+from .store import EventStore
+from .sync_gcal import build_description, build_location, build_summary
+
+logger = logging.getLogger(__name__)
+
+# sync_state: 最後に export した行の updated_at（これより新しい行のある月だけ書き直す）
+WATERMARK_KEY = "export.watermark"
+INDEX_NAME = "index.json"
+FEED_NAME = "feed.ics"
+# feed.ics に入れる範囲: 今月の何か月前から（それより先は全部）
+FEED_MONTHS_BACK = 1
+
+_PRODID = "-//YogiSync//export//JA"
+
+
+def _row_event(row: sqlite3.Row) -> Event:
+    # DBに入った時点で検証済みなので model_construct で良い
+    return Event.model_construct(
+        provider=row["provider"],
+        title=row["title"] or "",
+        date=datetime.fromisoformat(row["date"]),
+        location_name=row["location_name"],
+        address=row["address"],
+        instructor=row["instructor"],
+        reservation_id=row["reservation_id"],
+        source_url=row["source_url"],
+        confidence=row["confidence"] if row["confidence"] is not None else 1.0,
+        event_uid=row["event_uid"],
+        gcal_event_id=row["gcal_event_id"],
+        time_unknown=bool(row["time_unknown"]),
+        end=datetime.fromisoformat(row["end_at"]) if row["end_at"] else None,
+    )
+
+
+def _time_range(config: Config, event: Event) -> Tuple[Any, Any]:
+    """(start, end)。time_unknown なら date（終日）、そうでなければ tz付き datetime。"""
+    if event.time_unknown:
+        start_date = event.date.date()
+        if event.end is not None and event.end.date() > start_date:
+            return start_date, event.end.date()
+        return start_date, start_date + timedelta(days=1)
+    start = event.date
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=ZoneInfo(config.timezone))
+    end = event.end
+    if end is not None and end.tzinfo is None:
+        end = end.replace(tzinfo=ZoneInfo(config.timezone))
+    if end is None or end <= start:
+        end = start + timedelta(minutes=config.default_event_duration_minutes)
+    return start, end
+
+
+def _ics_escape(text: str) -> str:
+    text = text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+    return text.replace("\r\n", "\\n").replace("\n", "\\n")
+
+
+def _ics_fold(line: str) -> str:
+    """RFC 5545: 75オクテットを超える行は CRLF + 空白 で折り返す（UTF-8 の文字の途中では切らない）。"""
+    if len(line.encode("utf-8")) <= 75:
+        return line
+    out: List[str] = []
+    current = ""
+    size = 0
+    for ch in line:
+        n = len(ch.encode("utf-8"))
+        if size + n > 75:
+            out.append(current)
+            current = " "
+            size = 1
+        current += ch
+        size += n
+    out.append(current)
+    return "\r\n".join(out)
+
+
+def _ics_time(name: str, value: Any) -> str:
+    if isinstance(value, datetime):
+        return f"{name}:{value.astimezone(timezone.utc):%Y%m%dT%H%M%SZ}"
+    return f"{name};VALUE=DATE:{value:%Y%m%d}"
+
+
+def render_vevent(config: Config, row: sqlite3.Row) -> str:
+    event = _row_event(row)
+    start, end = _time_range(config, event)
+    stamp = datetime.fromisoformat(row["updated_at"]) if row["updated_at"] else datetime.utcnow()
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{_ics_escape(event.event_uid)}@yogisync",
+        f"DTSTAMP:{stamp:%Y%m%dT%H%M%SZ}",
+        _ics_time("DTSTART", start),
+        _ics_time("DTEND", end),
+        f"SUMMARY:{_ics_escape(build_summary(event))}",
+        f"DESCRIPTION:{_ics_escape(build_description(event))}",
+    ]
+    location = build_location(event)
+    if location:
+        lines.append(f"LOCATION:{_ics_escape(location)}")
+    if event.source_url:
+        lines.append(f"URL:{event.source_url}")
+    lines.append("END:VEVENT")
+    return "".join(_ics_fold(line) + "\r\n" for line in lines)
+
+
+def render_calendar(vevents: Iterable[str], name: str) -> str:
+    head = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{_PRODID}",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{_ics_escape(name)}",
+    ]
+    return "".join(line + "\r\n" for line in head) + "".join(vevents) + "END:VCALENDAR\r\n"
+
+
+def _vevents_of(ics: str) -> str:
+    """render_calendar() で書いた ICS から VEVENT の部分だけを取り出す。"""
+    start = ics.find("BEGIN:VEVENT")
+    end = ics.rfind("END:VEVENT\r\n")
+    if start < 0 or end < 0:
+        return ""
+    return ics[start:end + len("END:VEVENT\r\n")]
+
+
+def render_json(config: Config, month: str, rows: List[sqlite3.Row]) -> str:
+    """ビューア用の軽い JSON（キーは短く、空の値は出さない）。"""
+    items: List[Dict[str, Any]] = []
+    for row in rows:
+        event = _row_event(row)
+        start, end = _time_range(config, event)
+        item: Dict[str, Any] = {
+            "uid": event.event_uid,
+            "provider": event.provider,
+            "title": event.title,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+        }
+        if event.time_unknown:
+            item["all_day"] = True
+        for key, value in (
+            ("location", event.location_name),
+            ("address", event.address),
+            ("instructor", event.instructor),
+            ("url", event.source_url),
+        ):
+            if value:
+                item[key] = value
+        item["confidence"] = round(event.confidence, 2)
+        items.append(item)
+    return json.dumps({"month": month, "events": items}, ensure_ascii=False, separators=(",", ":"))
+
+
+def etag(text: str) -> str:
+    return '"' + hashlib.sha256(text.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def export_dir_for(config: Config, out_dir: Optional[str] = None) -> str:
+    base = out_dir or config.export_dir
+    return os.path.join(base, config.account) if config.account else base
+
+
+def _load_index(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _remove(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def export_feed(config: Config, store: EventStore, out_dir: Optional[str] = None, full: bool = False) -> ExportResult:
+    """
+    EventStore から ICS / JSON を書き出す（カレンダー API は使わない）。
+
+    出力（out_dir、複数アカウントなら out_dir/<account>/）:
+      - YYYY-MM.ics / YYYY-MM.json: イベント日付の月ごとのパーティション
+      - feed.ics: 先月以降のパーティションをつないだ購読用フィード
+      - index.json: 各ファイルの ETag・件数・更新時刻
+    前回以降に updated_at が進んだ行のある月（と、その行が前回いた月）だけを書き直すので、
+    履歴が増えても1回の export で書くファイル数は変わらない。full=True なら全部書き直す。
+    """
+    started = time.perf_counter()
+    out = export_dir_for(config, out_dir)
+    if not out:
+        raise ValueError("EXPORT_DIR is not set")
+    os.makedirs(out, exist_ok=True)
+    index_path = os.path.join(out, INDEX_NAME)
+    index = {} if full else _load_index(index_path)
+    months_index: Dict[str, Dict[str, Any]] = index.get("months", {})
+
+    since = "" if full or not index else (store.get_state(WATERMARK_KEY) or "")
+    latest, changed = store.changed_months(since)
+    now = datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+    result = ExportResult(out_dir=out)
+
+    for month in sorted(changed):
+        rows = store.events_in_month(month)
+        ics_name, json_name = f"{month}.ics", f"{month}.json"
+        if not rows:
+            # 全部が別の月に動いた
+            _remove(os.path.join(out, ics_name))
+            _remove(os.path.join(out, json_name))
+            months_index.pop(month, None)
+            result.months_removed += 1
+            continue
+        ics = render_calendar((render_vevent(config, r) for r in rows), f"YogiSync {month}")
+        js = render_json(config, month, rows)
+        atomic_write_text(os.path.join(out, ics_name), ics)
+        atomic_write_text(os.path.join(out, json_name), js)
+        months_index[month] = {
+            "ics": ics_name,
+            "json": json_name,
+            "ics_etag": etag(ics),
+            "json_etag": etag(js),
+            "count": len(rows),
+            "updated_at": now,
+        }
+        result.months_written += 1
+        result.events_written += len(rows)
+
+    today = date.today()
+    y, m = divmod(today.year * 12 + today.month - 1 - FEED_MONTHS_BACK, 12)
+    feed_from = f"{y:04d}-{m + 1:02d}"
+    feed_months = sorted(k for k in months_index if k >= feed_from)
+    feed_info = index.get("feed") or {}
+    if full or feed_info.get("from") != feed_from or any(k in changed for k in feed_months) or any(
+        k not in months_index for k in feed_info.get("months", [])
+    ):
+        parts: List[str] = []
+        for month in feed_months:
+            with open(os.path.join(out, months_index[month]["ics"]), "r", encoding="utf-8", newline="") as f:
+                parts.append(_vevents_of(f.read()))
+        feed = render_calendar(parts, "YogiSync")
+        atomic_write_text(os.path.join(out, FEED_NAME), feed)
+        feed_info = {"ics": FEED_NAME, "etag": etag(feed), "from": feed_from, "months": feed_months, "updated_at": now}
+        result.feed_written = True
+
+    index = {"generated_at": now, "feed": feed_info, "months": dict(sorted(months_index.items()))}
+    atomic_write_text(index_path, json.dumps(index, ensure_ascii=False, indent=1))
+
+    # 書き終えてから起点を進める（途中で落ちたら次回同じ月を書き直す）
+    store.mark_exported(since, latest)
+    store.set_state(WATERMARK_KEY, latest)
+    result.seconds = round(time.perf_counter() - started, 3)
+    logger.info(
+        "export: out=%s months=%d removed=%d events=%d feed=%s %.3fs",
+        out,
+        result.months_written,
+        result.months_removed,
+        result.events_written,
+        result.feed_written,
+        result.seconds,
+    )
+    return result
+
+
+def run_export(config: Config, out_dir: Optional[str] = None, full: bool = False) -> List[ExportResult]:
+    """`cli export` の本体。複数アカウント運用ならアカウントごとのサブディレクトリに書く。"""
+    configs = [config.for_account(p) for p in config.accounts] if config.accounts else [config]
+    store = EventStore(config.sqlite_path, archive_path=config.archive_path)
+    try:
+        return [export_feed(c, store.for_account(c.account), out_dir=out_dir, full=full) for c in configs]
+    finally:
+        store.close()
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import replace
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .accounts import AccountSession, open_sessions
+from .collector_gmail import BATCH_MODIFY_MAX_IDS, iter_messages, label_processed
+from .config import Config
+from .models import GmailMessage, LabelMigrationResult, SyncResult
+from .stages import DetectStage, ParseStage, StageContext
+from .store import EventStore
+from .telemetry import Telemetry
+
+logger = logging.getLogger(__name__)
+
+
+def migrate_account(
+    session: AccountSession,
+    *,
+    limit: int = 0,
+    dry_run: bool = False,
+    telemetry: Optional[Telemetry] = None,
+) -> LabelMigrationResult:
+    """
+    処理済みラベルを使い始める前の既存メールにラベルを付ける（1アカウント分）。
+    GMAIL_QUERY のうちラベルの無いメールを取得・パースし、その event_uid がもう store で
+    カレンダーに同期済み（gcal_event_id あり）ならラベルを付ける。カレンダー API は呼ばない。
+    取得するメールの数だけ quota を使うので、1回きりの移行として実行する。
+    """
+    telemetry = telemetry or Telemetry()
+    ctx = StageContext(session.config, session.store, None, telemetry, SyncResult())
+    result = LabelMigrationResult(dry_run=dry_run)
+
+    def scanned(messages: Iterable[GmailMessage]) -> Iterator[GmailMessage]:
+        for msg in messages:
+            result.scanned += 1
+            yield msg
+
+    source = iter_messages(session.config, limit=limit or 10**9, telemetry=telemetry, service=session.gmail)
+    pending: List[str] = []
+    for item in ParseStage().stream(DetectStage().stream(scanned(source), ctx), ctx):
+        uid = item.event.ensure_event_uid()
+        row = session.store.get_event(uid) or session.store.get_archived_event(uid)
+        if row is None or not row["gcal_event_id"]:
+            continue
+        result.matched += 1
+        pending.append(item.message_id)
+        if len(pending) >= BATCH_MODIFY_MAX_IDS and not dry_run:
+            result.labeled += label_processed(session.gmail, session.store, pending, telemetry)
+            pending = []
+    if pending and not dry_run:
+        result.labeled += label_processed(session.gmail, session.store, pending, telemetry)
+    result.errors = ctx.result.errors
+    logger.info(
+        "labels[%s]: scanned=%d matched=%d labeled=%d errors=%d dry_run=%s",
+        session.name,
+        result.scanned,
+        result.matched,
+        result.labeled,
+        result.errors,
+        dry_run,
+    )
+    return result
+
+
+def migrate_processed_labels(config: Config, *, limit: int = 0, dry_run: bool = False) -> LabelMigrationResult:
+    """`cli label-processed` の本体。GMAIL_PROCESSED_LABEL が無効でも、このコマンドはラベルを前提に動く。"""
+    config = replace(config, gmail_processed_label=True)
+    store = EventStore(config.sqlite_path, archive_path=config.archive_path)
+    try:
+        sessions = open_sessions(config, store)
+        per_account: Dict[str, LabelMigrationResult] = {}
+        for session in sessions:
+            try:
+                session.ensure_clients()
+                per_account[session.name] = migrate_account(session, limit=limit, dry_run=dry_run)
+            finally:
+                session.reset()
+    finally:
+        store.close()
+
+    if len(sessions) == 1 and not sessions[0].config.account:
+        return next(iter(per_account.values()))
+
+    total = LabelMigrationResult(dry_run=dry_run, accounts=per_account)
+    for r in per_account.values():
+        total.scanned += r.scanned
+        total.matched += r.matched
+        total.labeled += r.labeled
+        total.errors += r.errors
+    return total
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from .config import Config
+from .models import MaintenanceResult
+from .store import EventStore
+
+logger = logging.getLogger(__name__)
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def run_maintenance(
+    config: Config,
+    *,
+    retention_days: Optional[int] = None,
+    dry_run: bool = False,
+    vacuum: bool = True,
+) -> MaintenanceResult:
+    """
+    `cli maintain` の本体。cron で sync の合間（同じ DB を開いていないとき）に流す想定。
+
+    1. date が retention_days 日より前の過去イベントを events から archive（ARCHIVE_PATH / events_archive）に移す。
+       events に残るのは保持期間内とこれからのイベントだけになるので、sync の検索・更新は件数が増えても重くならない。
+       archive に移したイベントのメールをもう一度読んだら、upsert のときに events に戻す
+    2. ラベルを付け終えた processed_messages のうち古いものを消す
+    3. incremental VACUUM で空いたページを返し、ANALYZE で統計を取り直す
+    retention_days=0（RETENTION_DAYS 未設定）なら 1・2 はしない。dry_run は件数を数えるだけで何も変えない。
+    """
+    days = config.retention_days if retention_days is None else retention_days
+    result = MaintenanceResult(dry_run=dry_run, retention_days=days)
+    result.db_bytes_before = _size(config.sqlite_path)
+    store = EventStore(config.sqlite_path, archive_path=config.archive_path)
+    try:
+        if days > 0:
+            today = datetime.now(ZoneInfo(config.timezone)).date()
+            result.cutoff = (today - timedelta(days=days)).isoformat()
+            start = time.perf_counter()
+            result.archived = store.archive_events(result.cutoff, dry_run=dry_run)
+            result.pruned_processed = store.prune_processed(result.cutoff, dry_run=dry_run)
+            result.seconds["archive"] = round(time.perf_counter() - start, 3)
+        if not dry_run and vacuum:
+            start = time.perf_counter()
+            result.freed_pages = store.vacuum()
+            result.seconds["vacuum"] = round(time.perf_counter() - start, 3)
+            start = time.perf_counter()
+            store.analyze()
+            result.seconds["analyze"] = round(time.perf_counter() - start, 3)
+        result.rows = store.table_rows()
+    finally:
+        store.close()
+    result.db_bytes_after = _size(config.sqlite_path)
+    result.archive_bytes = _size(config.archive_path) if config.archive_path else 0
+    logger.info(
+        "maintain: cutoff=%s archived=%d pruned_processed=%d bytes %d -> %d (archive %d) rows=%s dry_run=%s",
+        result.cutoff or "-",
+        result.archived,
+        result.pruned_processed,
+        result.db_bytes_before,
+        result.db_bytes_after,
+        result.archive_bytes,
+        result.rows,
+        dry_run,
+    )
+    return result
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from .fileio import atomic_write_text
+from .models import SyncResult
+from .telemetry import LabelKey, Telemetry
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Telemetry の counter 名 → (metric名, HELP)
+COUNTERS: Dict[str, Tuple[str, str]] = {
+    "messages_fetched": ("yogisync_messages_fetched", "Gmail messages downloaded."),
+    "messages_superseded": (
+        "yogisync_messages_superseded",
+        "Gmail messages not downloaded because a newer message in the same thread replaces them.",
+    ),
+    "messages_parsed": ("yogisync_messages_parsed", "Messages parsed into an event, by provider and source (ics/body)."),
+    "parse_failures": ("yogisync_parse_failures", "Messages that could not be turned into an event."),
+    "events_coalesced": ("yogisync_events_coalesced", "Parsed events dropped as same-run duplicates of an event_uid."),
+    "events_deferred": ("yogisync_events_deferred", "Events left for the next run when a quota/time budget ran out."),
+    "events_filtered": ("yogisync_events_filtered", "Messages/events dropped by a stage filter, by stage and reason."),
+    "messages_labeled": ("yogisync_messages_labeled", "Gmail messages given the processed label."),
+    "api_calls": ("yogisync_api_calls", "Google API calls, by api and method (retries included)."),
+    "api_retries": ("yogisync_api_retries", "Google API calls retried after 429/5xx."),
+    "api_errors": ("yogisync_api_errors", "Google API calls that failed after retries."),
+    "quota_units": ("yogisync_quota_units", "Estimated Google API quota units consumed."),
+}
+
+HISTOGRAMS: Dict[str, str] = {
+    "yogisync_api_latency_seconds": "Latency of one Google API call.",
+    "yogisync_sqlite_transaction_seconds": "Duration of one EventStore write transaction.",
+    "yogisync_stage_duration_seconds": "Duration of one pipeline stage invocation.",
+}
+
+GAUGES: Dict[str, str] = {
+    "yogisync_last_run_timestamp_seconds": "Unix time the last sync run finished.",
+    "yogisync_last_run_duration_seconds": "Wall-clock duration of the last sync run.",
+    "yogisync_last_run_events": "Event outcomes of the last sync run.",
+}
+
+
+class _Histogram:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self) -> None:
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, le in enumerate(LATENCY_BUCKETS):
+            if value <= le:
+                self.buckets[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _histogram_key(sample_name: str) -> Optional[Tuple[str, LabelKey]]:
+    """Telemetry の sample 名をヒストグラム名とラベルに振り分ける。"""
+    if sample_name.startswith("api."):
+        api, _, method = sample_name[len("api."):].partition(".")
+        return "yogisync_api_latency_seconds", (("api", api), ("method", method))
+    if sample_name == "sqlite.transaction":
+        return "yogisync_sqlite_transaction_seconds", ()
+    if sample_name == "total":
+        return None
+    return "yogisync_stage_duration_seconds", (("stage", sample_name),)
+
+
+class MetricsRegistry:
+    """
+    Telemetry（1回の実行分）を積算していく。
+    サンプルそのものは持たずバケット数だけ持つので、常駐モードでもメモリは増えない。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+
+    def absorb(self, telemetry: Telemetry, result: Optional[SyncResult] = None, account: str = "") -> None:
+        """account を渡すと全系列に account ラベルを付ける（複数アカウント運用）。"""
+        samples, _, counters = telemetry.snapshot()
+        base: LabelKey = (("account", account),) if account else ()
+        with self._lock:
+            for name, per_labels in counters.items():
+                family = self._counters.setdefault(name, {})
+                for labels, value in per_labels.items():
+                    key = base + labels
+                    family[key] = family.get(key, 0.0) + value
+
+            for sample_name, values in samples.items():
+                key = _histogram_key(sample_name)
+                if key is None:
+                    continue
+                metric, labels = key
+                labels = base + labels
+                hist = self._histograms.setdefault(metric, {}).setdefault(labels, _Histogram())
+                for v in values:
+                    hist.observe(v)
+
+            if result is not None:
+                now = time.time()
+                total = samples.get("total") or [0.0]
+                self._gauges.setdefault("yogisync_last_run_timestamp_seconds", {})[base] = now
+                self._gauges.setdefault("yogisync_last_run_duration_seconds", {})[base] = total[-1]
+                outcomes = self._gauges.setdefault("yogisync_last_run_events", {})
+                outcomes[base + (("outcome", "created"),)] = result.created
+                outcomes[base + (("outcome", "updated"),)] = result.updated
+                outcomes[base + (("outcome", "skipped"),)] = result.skipped
+                outcomes[base + (("outcome", "errors"),)] = result.errors
+                outcomes[base + (("outcome", "deferred"),)] = result.deferred
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, (metric, help_text) in COUNTERS.items():
+                family = self._counters.get(name)
+                if not family:
+                    continue
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"# HELP {metric} {help_text}")
+                for labels, value in sorted(family.items()):
+                    lines.append(f"{metric}_total{_fmt_labels(labels)} {_fmt_value(value)}")
+
+            for metric, help_text in HISTOGRAMS.items():
+                family_h = self._histograms.get(metric)
+                if not family_h:
+                    continue
+                lines.append(f"# TYPE {metric} histogram")
+                lines.append(f"# HELP {metric} {help_text}")
+                for labels, hist in sorted(family_h.items()):
+                    for le, count in zip(LATENCY_BUCKETS, hist.buckets):
+                        lines.append(f"{metric}_bucket{_fmt_labels(labels + (('le', repr(le)),))} {count}")
+                    lines.append(f"{metric}_bucket{_fmt_labels(labels + (('le', '+Inf'),))} {hist.count}")
+                    lines.append(f"{metric}_count{_fmt_labels(labels)} {hist.count}")
+                    lines.append(f"{metric}_sum{_fmt_labels(labels)} {_fmt_value(hist.sum)}")
+
+            for metric, help_text in GAUGES.items():
+                family_g = self._gauges.get(metric)
+                if not family_g:
+                    continue
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"# HELP {metric} {help_text}")
+                for labels, value in sorted(family_g.items()):
+                    lines.append(f"{metric}{_fmt_labels(labels)} {_fmt_value(value)}")
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: LabelKey) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels) + "}"
+
+
+def _fmt_value(value: float) -> str:
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def write_metrics_file(path: str, text: str) -> None:
+    """
+    textfile collector 用に原子的に書き出す（同じディレクトリに一時ファイル → os.replace）。
+    読み手が書きかけのファイルを見ることはない。
+    """
+    atomic_write_text(path, text)
+
+
+def start_metrics_server(registry: MetricsRegistry, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """常駐モード用に /metrics を返す小さなHTTPサーバをデーモンスレッドで起動する。"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: object) -> None:
+            logger.debug("metrics: " + format, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, name="yogisync-metrics", daemon=True)
+    thread.start()
+    logger.info("metrics: serving http://%s:%d/metrics", host, server.server_address[1])
+    return server
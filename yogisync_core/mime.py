@@ -0,0 +1,342 @@
+from __future__ import annotations
+
+import binascii
+import codecs
+import re
+from email.header import decode_header
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import unquote_to_bytes
+
+from .parsers.ics import MAX_CALENDAR_PART_BYTES, is_calendar_part
+
+# 壊れた・悪意のあるメールで索引づくりが膨らまないようにする上限
+MAX_MIME_PARTS = 256
+MAX_MIME_DEPTH = 16
+
+Buffer = Union[bytes, memoryview]
+
+# Shift_JIS と名乗るメールの多くは Windows の cp932（①・㈱・髙 など NEC / IBM 拡張文字を含む）
+_CP932_NAMES = frozenset(
+    ("shift_jis", "shift-jis", "sjis", "x-sjis", "s-jis", "ms_kanji", "csshiftjis", "windows-31j", "cp932", "ms932", "x-ms-cp932")
+)
+_ISO2022JP_NAMES = frozenset(
+    ("iso-2022-jp", "iso2022jp", "iso-2022-jp-1", "csiso2022jp", "iso-2022-jp-ms", "cp50220", "cp50221", "cp50222")
+)
+_EUCJP_NAMES = frozenset(("euc-jp", "eucjp", "x-euc-jp", "cseucpkdfmtjapanese", "euc-jis-2004"))
+
+# ISO-2022-JP のエスケープシーケンス（JIS X 0208 / JIS X 0201 カナ / ASCII・ローマ字）
+_ISO2022_ESC = re.compile(rb"\x1b(\$[@B]|\(I|\([BJ])")
+_PARAM_SPLIT = re.compile(r';(?=(?:[^"]*"[^"]*")*[^"]*$)')
+_UNFOLD = re.compile(rb"\r?\n[ \t]")
+
+
+def _iso2022jp_via_cp932(data: bytes) -> str:
+    """
+    Windows が送る ISO-2022-JP（CP50221 相当。①などの NEC 特殊文字を JIS X 0208 の空き区に入れてくる）を読む。
+    2バイトの区間を Shift_JIS に写して cp932 でデコードする（Python の iso2022_jp はこれらの文字でエラーになる）。
+    """
+    out = bytearray()
+    mode = b"(B"
+    pos = 0
+    for m in list(_ISO2022_ESC.finditer(data)) + [None]:
+        chunk = data[pos : m.start() if m else len(data)]
+        if mode in (b"$B", b"$@"):
+            for i in range(0, len(chunk) - 1, 2):
+                j1, j2 = chunk[i], chunk[i + 1]
+                if not (0x21 <= j1 <= 0x7E and 0x21 <= j2 <= 0x7E):
+                    out += b"?"
+                    continue
+                s1 = ((j1 - 0x21) >> 1) + 0x81
+                if s1 > 0x9F:
+                    s1 += 0x40
+                if j1 & 1:
+                    s2 = j2 + 0x1F + (1 if j2 >= 0x60 else 0)
+                else:
+                    s2 = j2 + 0x7E
+                out += bytes((s1, s2))
+        elif mode == b"(I":
+            # 半角カナ（JIS X 0201）: cp932 では 0xA1〜0xDF
+            out += bytes(b | 0x80 for b in chunk)
+        else:
+            out += chunk
+        if m is None:
+            break
+        mode = m.group(1)
+        pos = m.end()
+    return out.decode("cp932", errors="replace")
+
+
+def decode_text(data: Buffer, charset: Optional[str]) -> str:
+    """
+    パートの本体（bytes / memoryview）を str にする。日本語のメールでよくある宣言のずれを吸収する:
+    - Shift_JIS → cp932（NEC / IBM 拡張文字）
+    - ISO-2022-JP → 標準の codec で読めなければ cp932 経由（NEC 特殊文字入り）
+    - EUC-JP → euc_jp、読めなければ euc_jis_2004
+    - 宣言と違う / 知らない charset → UTF-8 として読めればそれ、無理なら置換文字で読めるところだけ
+    """
+    name = (charset or "utf-8").strip().strip('"').lower()
+    if name in _CP932_NAMES:
+        candidates: Tuple[str, ...] = ("cp932",)
+    elif name in _ISO2022JP_NAMES:
+        candidates = ("iso2022_jp_ext",)
+    elif name == "iso-2022-jp-2":
+        candidates = ("iso2022_jp_2",)
+    elif name in _EUCJP_NAMES:
+        candidates = ("euc_jp", "euc_jis_2004")
+    elif name in ("us-ascii", "ascii", "utf8"):
+        candidates = ("utf-8",)
+    else:
+        candidates = (name,)
+    for codec in candidates:
+        try:
+            return codecs.decode(data, codec)
+        except LookupError:
+            break
+        except UnicodeDecodeError:
+            continue
+    if name in _ISO2022JP_NAMES or name == "iso-2022-jp-2":
+        return _iso2022jp_via_cp932(bytes(data))
+    if candidates[0] != "utf-8":
+        try:
+            return codecs.decode(data, "utf-8")
+        except UnicodeDecodeError:
+            pass
+    try:
+        return codecs.decode(data, candidates[0], "replace")
+    except LookupError:
+        return codecs.decode(data, "utf-8", "replace")
+
+
+def decode_header_value(value: Optional[str]) -> Optional[str]:
+    """MIME エンコードされたヘッダ（=?ISO-2022-JP?B?...?= など）を decode_text と同じ charset の扱いで str にする。"""
+    if value is None:
+        return None
+    if "=?" not in value:
+        return value.strip() or None
+    try:
+        chunks = decode_header(value)
+    except (ValueError, binascii.Error):
+        return value.strip() or None
+    text = "".join(
+        chunk if isinstance(chunk, str) else decode_text(chunk, charset or "utf-8") for chunk, charset in chunks
+    )
+    return text.strip() or None
+
+
+def _parse_params(value: str) -> Tuple[str, Dict[str, str]]:
+    """`text/plain; charset="ISO-2022-JP"` → ("text/plain", {"charset": "ISO-2022-JP"})。RFC 2231（name*=）も読む。"""
+    fields = _PARAM_SPLIT.split(value) if '"' in value else value.split(";")
+    params: Dict[str, str] = {}
+    extended: Dict[str, List[Tuple[int, str, bool]]] = {}
+    for field in fields[1:]:
+        key, sep, val = field.strip().partition("=")
+        if not sep:
+            continue
+        key, val = key.strip().lower(), val.strip()
+        if len(val) >= 2 and val[0] == val[-1] == '"':
+            val = val[1:-1].replace('\\"', '"')
+        if "*" in key:
+            # name*=UTF-8''%E6%8B%9B%E5%BE%85.ics / name*0*=... / name*1=...
+            base, _, rest = key.partition("*")
+            index = rest.rstrip("*")
+            extended.setdefault(base, []).append((int(index) if index.isdigit() else 0, val, key.endswith("*")))
+        else:
+            params[key] = val
+    for base, pieces in extended.items():
+        pieces.sort()
+        charset = "utf-8"
+        raw = b""
+        for n, (_, val, encoded) in enumerate(pieces):
+            if encoded and n == 0 and val.count("'") >= 2:
+                charset, _, val = val.split("'", 2)
+                charset = charset or "utf-8"
+            raw += unquote_to_bytes(val) if encoded else val.encode("utf-8")
+        params[base] = decode_text(raw, charset)
+    return fields[0].strip().lower(), params
+
+
+def charset_of(content_type: Optional[str]) -> Optional[str]:
+    """Content-Type ヘッダの値の charset（無ければ None）。"""
+    return _parse_params(content_type)[1].get("charset") if content_type else None
+
+
+class MimePart:
+    """葉のパート1つ分の索引（本体は MimeIndex の raw の [start:end]。デコードはしない）。"""
+
+    __slots__ = ("content_type", "charset", "encoding", "filename", "attachment", "start", "end")
+
+    def __init__(
+        self,
+        content_type: str,
+        charset: Optional[str],
+        encoding: str,
+        filename: Optional[str],
+        attachment: bool,
+        start: int,
+        end: int,
+    ) -> None:
+        self.content_type = content_type
+        self.charset = charset
+        self.encoding = encoding
+        self.filename = filename
+        self.attachment = attachment
+        self.start = start
+        self.end = end
+
+    def __repr__(self) -> str:
+        return f"MimePart({self.content_type!r}, charset={self.charset!r}, encoding={self.encoding!r}, bytes={self.end - self.start})"
+
+
+class MimeIndex:
+    """
+    RFC 822 のメール1通（bytes）の MIME 構造の索引。
+    ヘッダと multipart の境界だけを読み、葉のパートは raw の中の位置（start, end）として持つ。
+    本体は memoryview のスライスで参照するのでコピーせず、base64 / quoted-printable と charset の
+    デコードは text_plain() などで初めて要求されたパートだけに行う（結果は GmailMessage 側で1回だけ覚える）。
+    """
+
+    def __init__(self, raw: bytes) -> None:
+        self.raw = raw
+        self._view = memoryview(raw)
+        self.parts: List[MimePart] = []
+        self.headers: Dict[str, str] = {}
+        end, body_start = self._split(0, len(raw))
+        self.headers = self._headers(0, end)
+        self._entity(self.headers, body_start, len(raw), 0)
+
+    # --- 索引づくり ---------------------------------------------------------
+
+    def _split(self, start: int, end: int) -> Tuple[int, int]:
+        """ヘッダの終わりと本体の始まり。"""
+        raw = self.raw
+        if raw.startswith(b"\r\n", start, end):
+            return start, start + 2
+        if raw.startswith(b"\n", start, end):
+            return start, start + 1
+        lf = raw.find(b"\n\n", start, end)
+        crlf = raw.find(b"\r\n\r\n", start, end)
+        if crlf >= 0 and (lf < 0 or crlf < lf):
+            return crlf, crlf + 4
+        if lf >= 0:
+            return lf, lf + 2
+        return end, end
+
+    def _headers(self, start: int, end: int) -> Dict[str, str]:
+        block = _UNFOLD.sub(b" ", self.raw[start:end]).decode("utf-8", errors="replace")
+        headers: Dict[str, str] = {}
+        for line in block.splitlines():
+            name, sep, value = line.partition(":")
+            if sep and name and name.lower().strip() not in headers:
+                headers[name.lower().strip()] = value.strip()
+        return headers
+
+    def _entity(self, headers: Dict[str, str], start: int, end: int, depth: int) -> None:
+        if len(self.parts) >= MAX_MIME_PARTS:
+            return
+        content_type, params = _parse_params(headers.get("content-type") or "text/plain")
+        if content_type.startswith("multipart/") and params.get("boundary") and depth < MAX_MIME_DEPTH:
+            for child_start, child_end in self._children(params["boundary"], start, end):
+                head_end, body_start = self._split(child_start, child_end)
+                self._entity(self._headers(child_start, head_end), body_start, child_end, depth + 1)
+            return
+        if content_type == "message/rfc822" and depth < MAX_MIME_DEPTH:
+            # 転送された予約メール。中のメールのパートも同じように見る
+            head_end, body_start = self._split(start, end)
+            self._entity(self._headers(start, head_end), body_start, end, depth + 1)
+            return
+        disposition, disp_params = _parse_params(headers.get("content-disposition") or "")
+        filename = disp_params.get("filename") or params.get("name")
+        self.parts.append(
+            MimePart(
+                content_type,
+                params.get("charset"),
+                (headers.get("content-transfer-encoding") or "7bit").strip().lower(),
+                decode_header_value(filename) if filename else None,
+                disposition == "attachment",
+                start,
+                end,
+            )
+        )
+
+    def _children(self, boundary: str, start: int, end: int) -> List[Tuple[int, int]]:
+        """`--boundary` の行で区切られた子パートの (start, end)。閉じ区切り `--boundary--` の後は読まない。"""
+        raw = self.raw
+        delimiter = b"--" + boundary.encode("utf-8", errors="replace")
+        children: List[Tuple[int, int]] = []
+        part_start: Optional[int] = None
+        pos = start
+        while pos < end:
+            found = raw.find(delimiter, pos, end)
+            if found < 0:
+                break
+            after = found + len(delimiter)
+            if found != start and raw[found - 1 : found] != b"\n":
+                pos = after
+                continue
+            if part_start is not None:
+                part_end = found - 1 if found > part_start else found
+                if part_end > part_start and raw[part_end - 1 : part_end] == b"\r":
+                    part_end -= 1
+                children.append((part_start, max(part_start, part_end)))
+                if len(children) >= MAX_MIME_PARTS:
+                    return children
+            if raw.startswith(b"--", after, end):
+                return children
+            line_end = raw.find(b"\n", after, end)
+            if line_end < 0:
+                return children
+            part_start = pos = line_end + 1
+        if part_start is not None and part_start < end:
+            # 閉じ区切りの無い壊れたメール: 最後のパートは終わりまで
+            children.append((part_start, end))
+        return children
+
+    # --- デコード（要求されたパートだけ） --------------------------------------
+
+    def body(self, part: MimePart) -> memoryview:
+        """パートの本体（transfer encoding のまま）。raw をコピーしない。"""
+        return self._view[part.start : part.end]
+
+    def payload(self, part: MimePart) -> Buffer:
+        data = self.body(part)
+        if part.encoding == "base64":
+            try:
+                return binascii.a2b_base64(data)
+            except binascii.Error:
+                # パディングの欠けた base64
+                stripped = bytes(data).replace(b"\r", b"").replace(b"\n", b"").rstrip(b"=")
+                try:
+                    return binascii.a2b_base64(stripped + b"=" * (-len(stripped) % 4))
+                except binascii.Error:
+                    return b""
+        if part.encoding == "quoted-printable":
+            return binascii.a2b_qp(data)
+        return data
+
+    def decode(self, part: MimePart) -> str:
+        return decode_text(self.payload(part), part.charset)
+
+    def _first(self, content_type: str) -> Optional[MimePart]:
+        for part in self.parts:
+            if part.content_type == content_type and not part.attachment and not is_calendar_part(None, part.filename):
+                return part
+        return None
+
+    def text_plain(self) -> Optional[str]:
+        part = self._first("text/plain")
+        return self.decode(part) if part is not None else None
+
+    def text_html(self) -> Optional[str]:
+        part = self._first("text/html")
+        return self.decode(part) if part is not None else None
+
+    def calendar_parts(self) -> Optional[List[str]]:
+        """text/calendar（.ics）のパート。添付（Content-Disposition: attachment）でも読む。"""
+        texts: List[str] = []
+        for part in self.parts:
+            if not is_calendar_part(part.content_type, part.filename):
+                continue
+            payload = self.payload(part)
+            if len(payload) <= MAX_CALENDAR_PART_BYTES:
+                texts.append(decode_text(payload, part.charset))
+        return texts or None
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import hashlib
 from datetime import datetime
-from typing import Literal, Optional
+from typing import Any, Dict, List, Literal, Optional, Protocol
 
 from pydantic import BaseModel
 
@@ -23,6 +23,8 @@ class Event(BaseModel):
     event_uid: str = ""
     gcal_event_id: Optional[str] = None
     time_unknown: bool = False
+    # 終了時刻（ICS の DTEND など分かるときだけ。無ければ DEFAULT_EVENT_DURATION_MINUTES）
+    end: Optional[datetime] = None
 
     def ensure_event_uid(self) -> str:
         if self.event_uid:
@@ -39,6 +41,13 @@ class Event(BaseModel):
             self.event_uid = f"{self.provider}:{date_key}:{title_key}"
         return self.event_uid
 
+    def checked(self) -> "Event":
+        """
+        パーサは Event.model_construct()（検証なし）で作るので、store に入れる直前にここで検証する。
+        不正な値なら pydantic.ValidationError。
+        """
+        return Event.model_validate(self.__dict__)
+
     def content_hash(self) -> str:
         payload = "|".join(
             [
@@ -54,17 +63,151 @@ class Event(BaseModel):
                 "1" if self.time_unknown else "0",
             ]
         )
+        if self.end is not None:
+            # end の無いイベントのハッシュは end を足す前と同じにする（既存の行が updated 扱いにならない）
+            payload += "|" + self.end.isoformat()
         return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 
-class GmailMessage(BaseModel):
-    id: str
-    thread_id: Optional[str] = None
-    subject: Optional[str] = None
-    from_email: Optional[str] = None
-    snippet: Optional[str] = None
-    text_plain: Optional[str] = None
-    text_html: Optional[str] = None
+class LazyBodies(Protocol):
+    """本文を最初に読まれたときにデコードする供給元（mime.MimeIndex）。"""
+
+    def text_plain(self) -> Optional[str]: ...
+
+    def text_html(self) -> Optional[str]: ...
+
+    def calendar_parts(self) -> Optional[List[str]]: ...
+
+
+# lazy の本文をまだデコードしていない印
+_UNREAD: Any = object()
+
+
+class GmailMessage:
+    """
+    取得したメール1通。大量バックフィルでも軽いように pydantic ではなく __slots__ のクラスにしている。
+    本文は provider 判定後に retain_for() で必要な方だけ残し、パース後は release_bodies() で捨てる。
+    calendar_parts は text/calendar（.ics）のパートをデコードしたもの。あればパーサより先に parsers.ics で読む。
+    lazy（GMAIL_FORMAT=raw の MIME 索引）を渡したときは、text_plain / text_html / calendar_parts を
+    最初に読まれたときにそのパートだけデコードする（retain_for で捨てた方はデコードしない）。
+    """
+
+    __slots__ = (
+        "id",
+        "thread_id",
+        "subject",
+        "from_email",
+        "snippet",
+        "_text_plain",
+        "_text_html",
+        "internal_date",
+        "_calendar_parts",
+        "_lazy",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        thread_id: Optional[str] = None,
+        subject: Optional[str] = None,
+        from_email: Optional[str] = None,
+        snippet: Optional[str] = None,
+        text_plain: Optional[str] = None,
+        text_html: Optional[str] = None,
+        internal_date: Optional[int] = None,
+        calendar_parts: Optional[List[str]] = None,
+        lazy: Optional[LazyBodies] = None,
+    ) -> None:
+        self.id = id
+        self.thread_id = thread_id
+        self.subject = subject
+        self.from_email = from_email
+        self.snippet = snippet
+        self._lazy = lazy
+        self._text_plain = _UNREAD if lazy is not None and text_plain is None else text_plain
+        self._text_html = _UNREAD if lazy is not None and text_html is None else text_html
+        # Gmail の internalDate（受信時刻, epoch ミリ秒）
+        self.internal_date = internal_date
+        self._calendar_parts = _UNREAD if lazy is not None and calendar_parts is None else calendar_parts
+
+    @property
+    def text_plain(self) -> Optional[str]:
+        if self._text_plain is _UNREAD:
+            self._text_plain = self._lazy.text_plain()
+            self._drop_lazy()
+        return self._text_plain
+
+    @text_plain.setter
+    def text_plain(self, value: Optional[str]) -> None:
+        self._text_plain = value
+        self._drop_lazy()
+
+    @property
+    def text_html(self) -> Optional[str]:
+        if self._text_html is _UNREAD:
+            self._text_html = self._lazy.text_html()
+            self._drop_lazy()
+        return self._text_html
+
+    @text_html.setter
+    def text_html(self, value: Optional[str]) -> None:
+        self._text_html = value
+        self._drop_lazy()
+
+    @property
+    def calendar_parts(self) -> Optional[List[str]]:
+        if self._calendar_parts is _UNREAD:
+            self._calendar_parts = self._lazy.calendar_parts()
+            self._drop_lazy()
+        return self._calendar_parts
+
+    @calendar_parts.setter
+    def calendar_parts(self, value: Optional[List[str]]) -> None:
+        self._calendar_parts = value
+        self._drop_lazy()
+
+    def _drop_lazy(self) -> None:
+        """もうデコードするものが無ければ、MIME 索引（raw の bytes）を手放す。"""
+        if self._lazy is not None and _UNREAD not in (self._text_plain, self._text_html, self._calendar_parts):
+            self._lazy = None
+
+    def __repr__(self) -> str:
+        # repr のために lazy の本文をデコードしない
+        def size(value: Any) -> Any:
+            return "lazy" if value is _UNREAD else len(value or "")
+
+        return (
+            f"GmailMessage(id={self.id!r}, subject={self.subject!r}, "
+            f"plain_len={size(self._text_plain)}, html_len={size(self._text_html)}, "
+            f"calendar_parts={size(self._calendar_parts)})"
+        )
+
+    def retain_for(self, provider: str) -> None:
+        """
+        provider のパーサが読む本文だけを残す。
+        - peatix: HTML だけを読む
+        - その他: text_plain があればそれ、無ければ HTML（`msg.text_plain or msg.text_html`）
+        """
+        if provider == "peatix":
+            self.text_plain = None
+        elif self.text_plain:
+            self.text_html = None
+
+    def clip_bodies(self, max_chars: int) -> bool:
+        """本文を先頭 max_chars 文字までにする（壊れたメルマガなどの巨大な本文をパーサに渡さない）。切ったら True。"""
+        clipped = False
+        if self.text_plain and len(self.text_plain) > max_chars:
+            self.text_plain = self.text_plain[:max_chars]
+            clipped = True
+        if self.text_html and len(self.text_html) > max_chars:
+            self.text_html = self.text_html[:max_chars]
+            clipped = True
+        return clipped
+
+    def release_bodies(self) -> None:
+        self.text_plain = None
+        self.text_html = None
+        self.calendar_parts = None
 
 
 class SyncResult(BaseModel):
@@ -72,3 +215,99 @@ class SyncResult(BaseModel):
     updated: int = 0
     skipped: int = 0
     errors: int = 0
+    # quota / 時間の予算を超えたので次回に回したイベント（scheduler.Scheduler）
+    deferred: int = 0
+    # stage / API 呼び出しごとの count・total・p50/p95/max（telemetry.Telemetry.summary()）
+    timings: Dict[str, Any] = {}
+    # 複数アカウント同期のときのアカウント別内訳（上の件数はその合計）
+    accounts: Dict[str, "SyncResult"] = {}
+
+
+SyncResult.model_rebuild()
+
+
+class ExportResult(BaseModel):
+    out_dir: str = ""
+    months_written: int = 0
+    months_removed: int = 0
+    events_written: int = 0
+    feed_written: bool = False
+    seconds: float = 0.0
+
+
+class DedupeResult(BaseModel):
+    dry_run: bool = False
+    # カレンダー上の YogiSync 予定（event_uid 付き）の件数と、その event_uid の種類数
+    scanned: int = 0
+    event_uids: int = 0
+    duplicate_groups: int = 0
+    to_delete: int = 0
+    deleted: int = 0
+    # DB の gcal_event_id を残した1件に付け替えた件数
+    store_fixes: int = 0
+    errors: int = 0
+    # 重複グループごとの {event_uid, keep, delete}
+    details: List[Dict[str, Any]] = []
+    accounts: Dict[str, "DedupeResult"] = {}
+
+
+DedupeResult.model_rebuild()
+
+
+class CrossDedupeResult(BaseModel):
+    """`cli cross-dedupe`（別 provider から届いた同じクラスの予定をまとめる）の結果と監査レポート。"""
+
+    dry_run: bool = False
+    # True なら DB に duplicate_of を記録するだけで、カレンダーの予定は消さない
+    link_only: bool = False
+    threshold: float = 0.0
+    scanned: int = 0
+    # blocking（日付 × 時間帯）のバケット数と、実際にスコアを計算した組の数（総当たりなら n(n-1)/2）
+    blocks: int = 0
+    comparisons: int = 0
+    groups: int = 0
+    linked: int = 0
+    deleted: int = 0
+    errors: int = 0
+    # 重複グループごとの {keep: {...}, duplicates: [{..., score}]}
+    details: List[Dict[str, Any]] = []
+    accounts: Dict[str, "CrossDedupeResult"] = {}
+
+
+CrossDedupeResult.model_rebuild()
+
+
+class LabelMigrationResult(BaseModel):
+    """`cli label-processed`（既存のメールに処理済みラベルを付ける移行）の結果。"""
+
+    dry_run: bool = False
+    # 処理済みラベルの無い GMAIL_QUERY のメールを何通見たか / そのうち store に同期済みの予定があったもの
+    scanned: int = 0
+    matched: int = 0
+    labeled: int = 0
+    errors: int = 0
+    accounts: Dict[str, "LabelMigrationResult"] = {}
+
+
+LabelMigrationResult.model_rebuild()
+
+
+class MaintenanceResult(BaseModel):
+    """`cli maintain`（保持期間を過ぎたイベントの archive・VACUUM・ANALYZE）の結果。"""
+
+    dry_run: bool = False
+    retention_days: int = 0
+    # date がこの日（YYYY-MM-DD）より前のイベントを archive に移した
+    cutoff: str = ""
+    archived: int = 0
+    # ラベルを付け終えて cutoff より前に処理した processed_messages を消した件数
+    pruned_processed: int = 0
+    # incremental VACUUM で返したページ数（main / archive）
+    freed_pages: Dict[str, int] = {}
+    # 実行後の行数（events / events_archive / deferred_events / processed_messages）
+    rows: Dict[str, int] = {}
+    db_bytes_before: int = 0
+    db_bytes_after: int = 0
+    archive_bytes: int = 0
+    # archive / vacuum / analyze の秒数
+    seconds: Dict[str, float] = {}
@@ -1,13 +1,81 @@
 from __future__ import annotations
 
+import logging
 import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
-from typing import Optional, Tuple
+from typing import Any, Dict, Iterator, Optional, Tuple
 
 from dateutil import parser, tz
 
+try:
+    # 任意: google-re2（線形時間の正規表現エンジン）。REGEX_ENGINE=re2 のときだけ使う
+    import re2
+except ImportError:
+    re2 = None
+
+logger = logging.getLogger(__name__)
+
 JST = tz.gettz("Asia/Tokyo")
 
+# extract_label_value などが返す値の最大長。text_plain が無くて HTML を読むと1行が丸ごと数百KBになることがある
+MAX_VALUE_CHARS = 300
+
+# ここのパターンは re / re2 の両方で同じ意味になる書き方だけを使う（後方参照・先読みなし）。
+# 同じ文字に掛かる量指定子を隣り合わせない（`\s*[:：]?\s*` は空白の長い連続で二乗になる）
+_engine = "re"
+_compiled: Dict[Tuple[str, str], Any] = {}
+
+
+def set_regex_engine(name: str) -> str:
+    """
+    パーサの正規表現エンジンを切り替える（"re" / "re2"）。戻り値: 実際に使うエンジン。
+    re2 は入力長に線形の時間で終わるが、空白・数字のクラスが ASCII だけに掛かる（全角スペース・全角数字は拾わない）。
+    """
+    global _engine
+    if name == "re2" and re2 is None:
+        logger.warning("parsers: REGEX_ENGINE=re2 but google-re2 is not installed; using re")
+        name = "re"
+    elif name not in ("re", "re2"):
+        raise ValueError(f"unknown regex engine: {name!r}")
+    _engine = name
+    return name
+
+
+def rx(pattern: str) -> Any:
+    """pattern をいまのエンジンでコンパイルしたもの（キャッシュする）。"""
+    key = (_engine, pattern)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        compiled = (re2 if _engine == "re2" else re).compile(pattern)
+        _compiled[key] = compiled
+    return compiled
+
+
+class ParseBudgetExceeded(Exception):
+    """1通のパースが parse_budget() の秒数を超えた（そのメールは諦める）。"""
+
+
+_deadline: ContextVar[Optional[float]] = ContextVar("yogisync_parse_deadline", default=None)
+
+
+@contextmanager
+def parse_budget(seconds: float) -> Iterator[None]:
+    """この中のパースに締め切りを付ける（0 なら無制限）。パーサは段の合間で checkpoint() を呼ぶ。"""
+    token = _deadline.set(time.monotonic() + seconds if seconds > 0 else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def checkpoint() -> None:
+    deadline = _deadline.get()
+    if deadline is not None and time.monotonic() > deadline:
+        raise ParseBudgetExceeded()
+
 
 def normalize_jp_datetime(text: str) -> str:
     return (
@@ -20,6 +88,7 @@ def normalize_jp_datetime(text: str) -> str:
 
 
 def parse_first_datetime(text: str) -> Optional[datetime]:
+    checkpoint()
     if not text:
         return None
     candidate = normalize_jp_datetime(text)
@@ -29,7 +98,7 @@ def parse_first_datetime(text: str) -> Optional[datetime]:
         r"\d{1,2}/\d{1,2}\s*\d{1,2}:\d{2}",
     ]
     for pat in patterns:
-        match = re.search(pat, candidate)
+        match = rx(pat).search(candidate)
         if match:
             try:
                 dt = parser.parse(match.group(0), dayfirst=False, yearfirst=True)
@@ -40,6 +109,7 @@ def parse_first_datetime(text: str) -> Optional[datetime]:
 
 
 def parse_first_date_only(text: str) -> Optional[datetime]:
+    checkpoint()
     if not text:
         return None
     candidate = normalize_jp_datetime(text)
@@ -49,7 +119,7 @@ def parse_first_date_only(text: str) -> Optional[datetime]:
         r"\d{1,2}/\d{1,2}",
     ]
     for pat in patterns:
-        match = re.search(pat, candidate)
+        match = rx(pat).search(candidate)
         if match:
             try:
                 dt = parser.parse(match.group(0), dayfirst=False, yearfirst=True)
@@ -60,15 +130,17 @@ def parse_first_date_only(text: str) -> Optional[datetime]:
 
 
 def extract_label_value(text: str, label: str) -> Optional[str]:
-    pattern = rf"{re.escape(label)}\s*[:：]\s*(.+)"
-    match = re.search(pattern, text)
+    """「label: 値」の値（コロンの後が改行なら次の行）。長さは MAX_VALUE_CHARS まで。"""
+    checkpoint()
+    match = rx(rf"{re.escape(label)}\s*[:：]\s*(\S[^\n]{{0,{MAX_VALUE_CHARS - 1}}})").search(text)
     if match:
         return match.group(1).strip()
     return None
 
 
 def extract_url(text: str) -> Optional[str]:
-    match = re.search(r"https?://[^\s>]+", text)
+    checkpoint()
+    match = rx(r"https?://[^\s>]+").search(text)
     if match:
         return match.group(0)
     return None
@@ -35,7 +35,7 @@ def parse_bonne(msg: GmailMessage) -> Optional[Event]:
 
     source_url = extract_url(text)
 
-    return Event(
+    return Event.model_construct(
         provider="bonne",
         title=title or "BONNE Class",
         date=date,
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from ..models import Event, GmailMessage
+from . import JST, MAX_VALUE_CHARS, checkpoint, rx
+
+# text/calendar として読むパート（.ics の添付は application/octet-stream のこともあるので拡張子でも見る）
+CALENDAR_MIME_TYPES = ("text/calendar", "application/ics")
+# これより大きい .ics は読まない（予約1件の招待は数KB。カレンダー丸ごとのエクスポートは読まない）
+MAX_CALENDAR_PART_BYTES = 256 * 1024
+
+# DURATION（RFC 5545 3.3.6）: P1W / P1DT2H / PT1H30M など
+_DURATION = r"^([+-])?P(?:([0-9]+)W)?(?:([0-9]+)D)?(?:T(?:([0-9]+)H)?(?:([0-9]+)M)?(?:([0-9]+)S)?)?$"
+
+Prop = Tuple[str, Dict[str, str], str]
+
+
+def is_calendar_part(mime_type: Optional[str], filename: Optional[str]) -> bool:
+    return (mime_type or "").lower() in CALENDAR_MIME_TYPES or (filename or "").lower().endswith(".ics")
+
+
+def _unfold(text: str) -> List[str]:
+    """行の折り返し（次の行が空白1文字で始まる）を戻す。"""
+    lines: List[str] = []
+    for line in text.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        if line[:1] in (" ", "\t") and lines:
+            lines[-1] += line[1:]
+        elif line:
+            lines.append(line)
+    return lines
+
+
+def _split_prop(line: str) -> Optional[Prop]:
+    """NAME;PARAM=v;PARAM="a:b":VALUE → (NAME, {PARAM: v}, VALUE)。引用符の中の ":" / ";" では切らない。"""
+    in_quote = False
+    fields: List[str] = []
+    start = 0
+    for i, ch in enumerate(line):
+        if ch == '"':
+            in_quote = not in_quote
+        elif not in_quote and ch in ";:":
+            fields.append(line[start:i])
+            start = i + 1
+            if ch == ":":
+                break
+    else:
+        return None
+    name, params = fields[0].upper(), {}
+    for field in fields[1:]:
+        key, _, value = field.partition("=")
+        params[key.upper()] = value.strip('"')
+    return name, params, line[start:]
+
+
+def _unescape(value: str) -> str:
+    out: List[str] = []
+    i = 0
+    while i < len(value):
+        ch = value[i]
+        if ch == "\\" and i + 1 < len(value):
+            nxt = value[i + 1]
+            out.append("\n" if nxt in "nN" else nxt)
+            i += 2
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _parse_time(value: str, params: Dict[str, str]) -> Optional[Tuple[datetime, bool]]:
+    """DTSTART/DTEND の値 → (JST の datetime, 終日か)。読めなければ None。"""
+    value = value.strip()
+    try:
+        if params.get("VALUE", "").upper() == "DATE" or len(value) == 8:
+            d = date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+            return datetime(d.year, d.month, d.day, tzinfo=JST), True
+        dt = datetime.strptime(value.rstrip("Z")[:15], "%Y%m%dT%H%M%S")
+    except ValueError:
+        return None
+    if value.endswith("Z"):
+        dt = dt.replace(tzinfo=ZoneInfo("UTC"))
+    elif params.get("TZID"):
+        try:
+            dt = dt.replace(tzinfo=ZoneInfo(params["TZID"]))
+        except (ZoneInfoNotFoundError, ValueError):
+            # Outlook の "Tokyo Standard Time" など IANA に無い名前は JST とみなす
+            dt = dt.replace(tzinfo=JST)
+    else:
+        # floating time（タイムゾーン無し）も JST とみなす
+        dt = dt.replace(tzinfo=JST)
+    # パーサが作る他のイベントと event_uid（日時は +09:00 表記）が揃うように JST にする
+    return dt.astimezone(JST), False
+
+
+def _parse_duration(value: str) -> Optional[timedelta]:
+    m = rx(_DURATION).match(value.strip())
+    if not m or not any(m.groups()[1:]):
+        return None
+    weeks, days, hours, minutes, seconds = (int(g or 0) for g in m.groups()[1:])
+    delta = timedelta(weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds)
+    return -delta if m.group(1) == "-" else delta
+
+
+def _first_vevent(text: str) -> Tuple[Optional[str], Dict[str, Prop]]:
+    """(METHOD, 最初の VEVENT のプロパティ)。VEVENT の中の VALARM などは読まない。"""
+    method: Optional[str] = None
+    props: Dict[str, Prop] = {}
+    depth = 0
+    in_event = False
+    for line in _unfold(text):
+        prop = _split_prop(line)
+        if prop is None:
+            continue
+        name, _, value = prop
+        if name == "BEGIN":
+            if in_event:
+                depth += 1
+            elif value.strip().upper() == "VEVENT":
+                in_event = True
+            continue
+        if name == "END":
+            if in_event and depth:
+                depth -= 1
+            elif in_event:
+                break
+            continue
+        if not in_event:
+            if name == "METHOD":
+                method = value.strip().upper()
+        elif not depth and name not in props:
+            props[name] = prop
+    return method, props
+
+
+def _text(props: Dict[str, Prop], name: str) -> Optional[str]:
+    prop = props.get(name)
+    if not prop:
+        return None
+    value = _unescape(prop[2]).strip()
+    return value[:MAX_VALUE_CHARS] or None
+
+
+def parse_ics(msg: GmailMessage, provider: str) -> Optional[Event]:
+    """
+    メールに付いた text/calendar（.ics）の最初の VEVENT から Event を作る。
+    DTSTART/DTEND（または DURATION）・SUMMARY・LOCATION・UID・URL をそのまま使うので、
+    HTML を BeautifulSoup で読む provider 別パーサより速くて正確。
+    読めない・キャンセル（METHOD:CANCEL / STATUS:CANCELLED）なら None（provider 別パーサに回す）。
+    """
+    for part in msg.calendar_parts or []:
+        checkpoint()
+        method, props = _first_vevent(part)
+        if not props or method == "CANCEL" or (_text(props, "STATUS") or "").upper() == "CANCELLED":
+            continue
+        if "DTSTART" not in props:
+            continue
+        _, params, value = props["DTSTART"]
+        start = _parse_time(value, params)
+        if start is None:
+            continue
+        date_value, all_day = start
+
+        end: Optional[datetime] = None
+        if "DTEND" in props:
+            _, end_params, end_value = props["DTEND"]
+            parsed = _parse_time(end_value, end_params)
+            end = parsed[0] if parsed else None
+        elif "DURATION" in props:
+            duration = _parse_duration(props["DURATION"][2])
+            end = date_value + duration if duration else None
+        if end is not None and end <= date_value:
+            end = None
+        if all_day:
+            # 終日は他のパーサ（日付しか分からないとき）と同じく 12:00 + time_unknown にする
+            date_value = date_value.replace(hour=12)
+            end = end.replace(hour=12) if end is not None else None
+
+        return Event.model_construct(
+            provider=provider,
+            title=_text(props, "SUMMARY") or msg.subject or "Reservation",
+            date=date_value,
+            location_name=_text(props, "LOCATION"),
+            address=None,
+            instructor=None,
+            reservation_id=_text(props, "UID"),
+            source_url=_text(props, "URL"),
+            confidence=1.0,
+            time_unknown=all_day,
+            end=end,
+        )
+    return None
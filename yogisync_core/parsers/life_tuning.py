@@ -6,7 +6,7 @@ from typing import Optional
 from bs4 import BeautifulSoup
 
 from ..models import Event, GmailMessage
-from . import extract_label_value, extract_url, parse_first_date_only, parse_first_datetime, first_non_empty
+from . import checkpoint, extract_label_value, extract_url, parse_first_date_only, parse_first_datetime, first_non_empty
 
 
 def parse_life_tuning(msg: GmailMessage) -> Optional[Event]:
@@ -17,6 +17,7 @@ def parse_life_tuning(msg: GmailMessage) -> Optional[Event]:
     if msg.text_html and not msg.text_plain:
         soup = BeautifulSoup(raw, "lxml")
         text = soup.get_text("\n")
+        checkpoint()
     else:
         text = raw
 
@@ -41,7 +42,7 @@ def parse_life_tuning(msg: GmailMessage) -> Optional[Event]:
 
     source_url = extract_url(text)
 
-    return Event(
+    return Event.model_construct(
         provider="life_tuning",
         title=title or "LIFE TUNING DAYS",
         date=date,
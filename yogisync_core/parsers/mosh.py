@@ -24,7 +24,7 @@ def parse_mosh(msg: GmailMessage) -> Optional[Event]:
 
     source_url = extract_url(text)
 
-    return Event(
+    return Event.model_construct(
         provider="mosh",
         title=title or "MOSH Reservation",
         date=date,
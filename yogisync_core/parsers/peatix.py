@@ -1,12 +1,11 @@
 from __future__ import annotations
 
-import re
 from typing import Optional
 
 from bs4 import BeautifulSoup
 
 from ..models import Event, GmailMessage
-from . import extract_label_value, parse_first_datetime, first_non_empty
+from . import MAX_VALUE_CHARS, checkpoint, extract_label_value, parse_first_datetime, first_non_empty, rx
 
 
 def _extract_peatix_url(soup: BeautifulSoup) -> Optional[str]:
@@ -38,17 +37,22 @@ def _cleanup_peatix_title(s: Optional[str]) -> Optional[str]:
     """
     if not s:
         return None
-    s = re.sub(r"\s+", " ", s).strip()
+    s = rx(r"\s+").sub(" ", s).strip()
 
     # remove leading peatix markers
-    s = re.sub(r"^\s*【\s*Peatix\s*】\s*", "", s).strip()
-    s = re.sub(r"^\s*\[\s*Peatix\s*\]\s*", "", s).strip()
+    s = rx(r"^【 ?Peatix ?】").sub("", s).strip()
+    s = rx(r"^\[ ?Peatix ?\]").sub("", s).strip()
 
     # remove trailing "...のチケットお申し込み詳細"
-    s = re.sub(r"\s*のチケット(お申し込み)?詳細\s*$", "", s).strip()
+    s = rx(r"のチケット(お申し込み)?詳細$").sub("", s).strip()
 
     # remove trailing venue in parentheses
-    s = re.sub(r"\s*[（(].+?[)）]\s*$", "", s).strip()
+    # （旧: re.sub(r"\s*[（(].+?[)）]\s*$", ...) と同じ結果。開き括弧ごとに末尾まで読み直すので
+    #   括弧の多いタイトルで二乗の時間になっていた。最初の開き括弧から後ろを落とすだけにする）
+    if s.endswith((")", "）")):
+        opens = [i for i in (s.find("("), s.find("（")) if i >= 0]
+        if opens and min(opens) <= len(s) - 3:
+            s = s[: min(opens)].strip()
 
     return s or None
 
@@ -76,7 +80,7 @@ def _extract_reservation_id(text: str) -> Optional[str]:
       確認番号:34041688
       確認番号：34041688
     """
-    m = re.search(r"(確認番号|予約番号)\s*[:：]?\s*([0-9]{5,})", text)
+    m = rx(r"(確認番号|予約番号)\s*(?:[:：]\s*)?([0-9]{5,})").search(text)
     if m:
         return m.group(2)
 
@@ -89,7 +93,7 @@ def _extract_reservation_id(text: str) -> Optional[str]:
     if not rid:
         return None
 
-    digits = re.sub(r"\D+", "", rid.strip())
+    digits = rx(r"\D+").sub("", rid.strip())
     return digits or rid.strip()
 
 
@@ -102,12 +106,13 @@ def _extract_address(text: str) -> Optional[str]:
         extract_label_value(text, "所在地"),
     )
     if addr:
-        return re.sub(r"\s+", " ", addr).strip()
+        return rx(r"\s+").sub(" ", addr).strip()
 
     # fallback: "住所 ..." が同一行になってるケース
-    m = re.search(r"住所\s*[:：]?\s*(.+)", text)
+    # （コロンの前後の空白を1つの量指定子にまとめる。`\s*[:：]?\s*` は改行が続くと二乗になる）
+    m = rx(rf"住所\s*(?:[:：]\s*)?(\S[^\n]{{0,{MAX_VALUE_CHARS - 1}}})").search(text)
     if m:
-        return re.sub(r"\s+", " ", m.group(1)).strip()
+        return rx(r"\s+").sub(" ", m.group(1)).strip()
 
     return None
 
@@ -119,6 +124,7 @@ def parse_peatix(msg: GmailMessage) -> Optional[Event]:
 
     soup = BeautifulSoup(html, "lxml")
     text = soup.get_text("\n")
+    checkpoint()
 
     # title
     title = _extract_title_from_body(text)
@@ -144,7 +150,7 @@ def parse_peatix(msg: GmailMessage) -> Optional[Event]:
 
     source_url = _extract_peatix_url(soup)
 
-    return Event(
+    return Event.model_construct(
         provider="peatix",
         title=title or "Peatix Event",
         date=date,
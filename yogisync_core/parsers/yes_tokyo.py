@@ -34,7 +34,7 @@ def parse_yes_tokyo(msg: GmailMessage) -> Optional[Event]:
 
     source_url = extract_url(text)
 
-    return Event(
+    return Event.model_construct(
         provider="yes_tokyo",
         title=title or "YES TOKYO Class",
         date=date,
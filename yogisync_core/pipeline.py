@@ -1,130 +1,155 @@
 from __future__ import annotations
 
 import logging
-
-from .collector_gmail import fetch_messages
+import time
+from typing import Iterable, Optional
+
+from .auth import load_credentials
+from .calendar_backend import BACKEND_LOCAL, CalendarBackend, open_calendar_backend
+from .collector_gmail import (
+    PartitionedCollector,
+    ThreadCollector,
+    get_gmail_service,
+    gmail_scopes,
+    iter_messages,
+    label_processed,
+)
 from .config import Config
-from .models import SyncResult
-from .provider_detect import detect_provider
-from .parsers.bonne import parse_bonne
-from .parsers.yes_tokyo import parse_yes_tokyo
-from .parsers.peatix import parse_peatix
-from .parsers.mosh import parse_mosh
-from .parsers.life_tuning import parse_life_tuning
+from .export import export_feed
+from .metrics import MetricsRegistry, write_metrics_file
+from .models import GmailMessage, SyncResult
+from .stages import PARSER_MAP, StageChain, StageContext, build_stages
 from .store import EventStore
-from .sync_gcal import reconcile_event
+from .telemetry import Telemetry, timed_iter
+from .transport import PooledHttp
 
 logger = logging.getLogger(__name__)
 
-PARSER_MAP = {
-    "bonne": parse_bonne,
-    "yes_tokyo": parse_yes_tokyo,
-    "peatix": parse_peatix,
-    "mosh": parse_mosh,
-    "life_tuning": parse_life_tuning,
-}
-
 
-def run_sync(config: Config, limit: int = 50) -> SyncResult:
+def _export_metrics(
+    config: Config, telemetry: Telemetry, result: SyncResult, metrics: Optional[MetricsRegistry]
+) -> None:
+    if metrics is None and not config.metrics_path:
+        return
+    registry = metrics or MetricsRegistry()
+    registry.absorb(telemetry, result, account=config.account)
+    if config.metrics_path:
+        try:
+            write_metrics_file(config.metrics_path, registry.render())
+        except OSError:
+            # メトリクスが書けなくても同期自体は成功扱いにする
+            logger.exception("metrics: failed to write %s", config.metrics_path)
+
+
+def run_sync(
+    config: Config,
+    limit: int = 50,
+    telemetry: Optional[Telemetry] = None,
+    metrics: Optional[MetricsRegistry] = None,
+    *,
+    messages: Optional[Iterable[GmailMessage]] = None,
+    gmail_service=None,
+    calendar_service=None,
+    store: Optional[EventStore] = None,
+    stages: Optional[StageChain] = None,
+) -> SyncResult:
+    """
+    メールを stages（省略時は build_stages(config)）に流す:
+    source → detect → parse → filter → coalesce → store → reconcile
+
+    telemetry: 計測値の入れ物（省略時は実行ごとに新規）
+    metrics: 常駐モードで積算していく MetricsRegistry（省略時は config.metrics_path 用にこの実行分だけ作る）
+
+    常駐モード（watch）は以下を渡して使い回す。渡されたものは閉じない。
+    - messages: 取得済み（またはストリーム）のメール（渡されたら Gmail の一覧取得はしない）
+    - gmail_service / calendar_service: build 済みのクライアント（calendar_service は CalendarBackend でも良い）
+    - store: 開いたままの EventStore
+    - stages: フィルタや並行数を変えたチェーン
+    """
     result = SyncResult()
-    store = EventStore(config.sqlite_path)
+    telemetry = telemetry or Telemetry()
+    started = time.perf_counter()
+    owns_store = store is None
+    if store is None:
+        store = EventStore(config.sqlite_path, telemetry=telemetry, archive_path=config.archive_path)
+    else:
+        store.telemetry = telemetry
     logger.info("pipeline: sqlite_path=%s", config.sqlite_path)
 
+    http: Optional[PooledHttp] = None
+    owned_calendar: Optional[CalendarBackend] = None
     try:
-        messages = fetch_messages(config, limit=limit)
-
-        for msg in messages:
-            logger.info("pipeline: processing msg id=%s subject=%s", msg.id, msg.subject)
-
-            try:
-                provider = detect_provider(msg)
-                if not provider:
-                    logger.info(
-                        "skip: provider not detected subject=%s from=%s snippet=%s plain_len=%s html_len=%s",
-                        msg.subject,
-                        msg.from_email,
-                        (msg.snippet or "")[:80],
-                        len(msg.text_plain or ""),
-                        len(msg.text_html or ""),
-                    )
-                    result.skipped += 1
-                    continue
-
-                parser = PARSER_MAP.get(provider)
-                if not parser:
-                    logger.info("skip: parser not found (%s)", provider)
-                    result.skipped += 1
-                    continue
-
-                event = parser(msg)
-                if not event:
-                    logger.info(
-                        "skip: parse failed (%s) subject=%s from=%s snippet=%s plain_len=%s html_len=%s",
-                        provider,
-                        msg.subject,
-                        msg.from_email,
-                        (msg.snippet or "")[:80],
-                        len(msg.text_plain or ""),
-                        len(msg.text_html or ""),
-                    )
-                    result.skipped += 1
-                    continue
-
-                action, gcal_event_id = store.upsert_event(event)
-
-                # ★重要:
-                # - action=="skipped" でも、カレンダー側に “同一event_uid重複” が残ってる可能性がある
-                # - なので reconcile_event を実行して、余分を削除して「残す1件」を確定させる
-                if action == "skipped":
-                    kept_id = reconcile_event(
-                        config,
-                        event,
-                        gcal_event_id,
-                        allow_create=False,       # skipped の時は新規作成しない
-                        cleanup_duplicates=True,  # 重複掃除はする
-                    )
-                    if kept_id and kept_id != gcal_event_id:
-                        store.update_gcal_event_id(event.ensure_event_uid(), kept_id)
-                        logger.info(
-                            "pipeline: gcal_event_id changed after reconcile event_uid=%s old=%s new=%s",
-                            event.ensure_event_uid(),
-                            gcal_event_id,
-                            kept_id,
-                        )
-
-                    logger.info(
-                        "skip: store skipped (%s) event_uid=%s gcal_event_id=%s subject=%s",
-                        provider,
-                        event.ensure_event_uid(),
-                        gcal_event_id,
-                        msg.subject,
-                    )
-                    result.skipped += 1
-                    continue
-
-                # created/updated の場合は “必ず reconcile” を通して、二重作成を避ける
-                kept_id = reconcile_event(
-                    config,
-                    event,
-                    gcal_event_id,
-                    allow_create=True,
-                    cleanup_duplicates=True,
+        if calendar_service is None and config.calendar_backend == BACKEND_LOCAL:
+            # ローカルカレンダーに書く（Calendar API の認証は要らない）
+            calendar_service = owned_calendar = open_calendar_backend(config)
+        if (messages is None and gmail_service is None) or calendar_service is None:
+            # Gmail/Calendar で認証と接続プールを1つだけ作り、実行中はクライアントを使い回す
+            creds = load_credentials(config, gmail_scopes(config))
+            http = PooledHttp(creds, pool_size=config.http_pool_size)
+            if messages is None and gmail_service is None:
+                gmail_service = get_gmail_service(config, http=http)
+            if calendar_service is None:
+                calendar_service = owned_calendar = open_calendar_backend(config, http=http)
+
+        partitioned: Optional[PartitionedCollector] = None
+        threaded: Optional[ThreadCollector] = None
+        if messages is None:
+            # 1通ずつ取得→処理する（全件をメモリに溜めない）。取得にかかった時間は gmail.fetch
+            if config.gmail_partitioned:
+                # provider ごとの検索式で並行に取る（limit は provider ごと）
+                # PROVIDER_ALLOWLIST があれば、許可していない provider は一覧すらしない
+                providers = [p for p in PARSER_MAP if not config.provider_allowlist or p in config.provider_allowlist]
+                partitioned = PartitionedCollector(
+                    config, gmail_service, store, providers, limit=limit, telemetry=telemetry
                 )
+                source: Iterable[GmailMessage] = partitioned
+            elif config.gmail_threads:
+                # スレッドごとに一番新しいメール（と変更・キャンセル）だけを取る（limit はスレッド数）
+                threaded = ThreadCollector(config, gmail_service, store, limit=limit, telemetry=telemetry)
+                source = threaded
+            else:
+                source = iter_messages(config, limit=limit, telemetry=telemetry, service=gmail_service)
+            messages = timed_iter(source, telemetry, "gmail.fetch")
+
+        chain = stages or build_stages(config)
+        ctx = StageContext(config, store, calendar_service, telemetry, result)
+        chain.run(messages, ctx)
+
+        if config.gmail_processed_label and gmail_service is not None:
+            # 書き終えたメールに処理済みラベルを付け、次回の一覧取得から外す。
+            # GMAIL_THREADS で取得しなかった（新しいメールに置き換わった）メールも付ける。
+            # 失敗しても同期結果には影響させない（processed_messages に残るので次の run で付け直す）
+            collector = partitioned or threaded
+            superseded = collector.superseded if collector is not None else []
+            try:
+                with telemetry.stage("gmail.label"):
+                    label_processed(gmail_service, store, ctx.processed + superseded, telemetry)
+            except Exception:
+                logger.exception("pipeline: failed to label %d processed messages", len(ctx.processed))
 
-                if kept_id:
-                    store.update_gcal_event_id(event.ensure_event_uid(), kept_id)
-
-                if action == "created":
-                    result.created += 1
-                else:
-                    result.updated += 1
+        if partitioned is not None:
+            result.errors += len(partitioned.failed)
+            # 処理に失敗したメールを取った provider は、そのメールをもう一度一覧するよう起点を留める
+            partitioned.commit(ctx.failed)
 
+        if config.export_dir:
+            # ビューア用の ICS/JSON を書き直す（変わった月だけ）。失敗しても同期結果には影響させない
+            try:
+                with telemetry.stage("export"):
+                    export_feed(config, store)
             except Exception:
-                logger.exception("error processing message: %s", msg.id)
-                result.errors += 1
+                logger.exception("pipeline: export failed (export_dir=%s)", config.export_dir)
 
     finally:
-        store.close()
+        if owned_calendar is not None:
+            owned_calendar.close()
+        if http is not None:
+            http.close()
+        if owns_store:
+            store.close()
+        telemetry.observe("total", time.perf_counter() - started)
+        result.timings = telemetry.summary()
+        _export_metrics(config, telemetry, result, metrics)
 
     logger.info("pipeline: result=%s", result)
     return result
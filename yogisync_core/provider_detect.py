@@ -1,29 +1,85 @@
 from __future__ import annotations
 
-from typing import Optional
+from dataclasses import dataclass
+from typing import Optional, Tuple
 
 from .models import GmailMessage, Provider
 
 
-def _combine_text(msg: GmailMessage) -> str:
-    parts = [msg.subject or "", msg.from_email or "", msg.text_plain or "", msg.text_html or "", msg.snippet or ""]
-    return "\n".join(parts).lower()
+@dataclass(frozen=True)
+class ProviderRule:
+    """
+    provider 判定のルール（上から順に最初に当たったものを採用）。
+    どれも小文字の部分一致で、
+    - from_terms: 送信元に含まれる
+    - text_terms: 件名・送信元・本文・snippet のどこかに含まれる
+    - subject_terms: 件名に含まれる
+    """
+
+    provider: Provider
+    from_terms: Tuple[str, ...] = ()
+    text_terms: Tuple[str, ...] = ()
+    subject_terms: Tuple[str, ...] = ()
+
+    def matches(self, from_email: str, subject: str, text: str) -> bool:
+        for t in self.from_terms:
+            if t in from_email:
+                return True
+        for t in self.text_terms:
+            if t in text:
+                return True
+        for t in self.subject_terms:
+            if t in subject:
+                return True
+        return False
+
+    def gmail_query(self) -> str:
+        """
+        このルールに当たりそうなメールだけを返す Gmail 検索式（各条件の OR）。
+        Gmail の検索は単語単位なので部分一致とは完全には一致しない。取得後に detect_provider で再判定する。
+        """
+        clauses = [f"from:{t}" for t in self.from_terms]
+        clauses += [f'"{t}"' for t in self.text_terms]
+        clauses += [f"subject:{_quote(t)}" for t in self.subject_terms]
+        return "{" + " ".join(clauses) + "}"
+
+
+def _quote(term: str) -> str:
+    return f'"{term}"' if " " in term else term
+
+
+PROVIDER_RULES: Tuple[ProviderRule, ...] = (
+    ProviderRule("peatix", from_terms=("peatix",), text_terms=("peatix.com",), subject_terms=("peatix",)),
+    ProviderRule("mosh", from_terms=("mosh",), text_terms=("mosh.jp",), subject_terms=("mosh",)),
+    ProviderRule(
+        "bonne",
+        from_terms=("bonne",),
+        text_terms=("スタジオbonne", "studio bonne"),
+        subject_terms=("bonne",),
+    ),
+    ProviderRule("yes_tokyo", text_terms=("yes tokyo", "yes-tokyo", "yestokyo"), subject_terms=("yes tokyo",)),
+    ProviderRule("life_tuning", text_terms=("life tuning", "life tuning days", "lifetuning")),
+)
 
 
 def detect_provider(msg: GmailMessage) -> Optional[Provider]:
-    text = _combine_text(msg)
+    """
+    PROVIDER_RULES を上から見て最初に当たった provider。
+    件名・送信元・snippet で当たるルールは本文を読まずに決める。本文（GMAIL_FORMAT=raw ならその時点でデコード）は
+    本文の text_terms を見る必要が出たときに1回だけ作る。
+    """
     from_email = (msg.from_email or "").lower()
     subject = (msg.subject or "").lower()
+    head = "\n".join([msg.subject or "", msg.from_email or "", msg.snippet or ""]).lower()
+    body: Optional[str] = None
 
-    if "peatix" in from_email or "peatix.com" in text or "peatix" in subject:
-        return "peatix"
-    if "mosh" in from_email or "mosh.jp" in text or "mosh" in subject:
-        return "mosh"
-    if "bonne" in from_email or "スタジオbonne".lower() in text or "studio bonne" in text or "bonne" in subject:
-        return "bonne"
-    if "yes tokyo" in text or "yes-tokyo" in text or "yestokyo" in text or "yes tokyo" in subject:
-        return "yes_tokyo"
-    if "life tuning" in text or "life tuning days" in text or "lifetuning" in text:
-        return "life_tuning"
+    for rule in PROVIDER_RULES:
+        if rule.matches(from_email, subject, head):
+            return rule.provider
+        if rule.text_terms:
+            if body is None:
+                body = "\n".join([msg.text_plain or "", msg.text_html or ""]).lower()
+            if any(t in body for t in rule.text_terms):
+                return rule.provider
 
     return None
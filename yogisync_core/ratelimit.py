@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+class RateLimiter:
+    """
+    token bucket。rate は 1秒あたりのリクエスト数、burst はまとめて出せる上限。
+    複数スレッドから同時に acquire() して良い。
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = float(burst if burst is not None else max(1, int(rate)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """token を1つ取る。待った秒数を返す。"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                delay = (1.0 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+# 今のスレッド（context）で Google API 呼び出しに掛けるアカウント別の制限
+_current: ContextVar[Optional[RateLimiter]] = ContextVar("yogisync_rate_limiter", default=None)
+
+
+@contextmanager
+def use_rate_limiter(limiter: Optional[RateLimiter]) -> Iterator[None]:
+    token = _current.set(limiter)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def acquire() -> float:
+    limiter = _current.get()
+    if limiter is None:
+        return 0.0
+    return limiter.acquire()
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from .models import Event
+
+if TYPE_CHECKING:
+    from .stages import ParsedEvent, StageContext
+
+logger = logging.getLogger(__name__)
+
+# reconcile 1件で使う Calendar API の呼び出し数（Calendar は 1 call = 1 quota unit）の見積もり。
+# 重複掃除の delete は事前に分からないので数えない（実際の消費は telemetry の quota_units で追う）
+COST_SEARCH = 1  # event_uid の events.list（1ページに収まる前提）
+COST_WRITE = 1  # insert / update
+# new / updated は 検索 + insert / update。unchanged（store は skipped）でも reconcile は検索で1件見つかれば
+# update するので同じ 2（見つからず allow_create=False で終わる時だけ 1 で済む）
+COST_RECONCILE = COST_SEARCH + COST_WRITE
+
+# 同じ日付なら new → updated → unchanged の順
+_KIND_RANK = {"new": 0, "updated": 1, "unchanged": 2}
+
+
+@dataclass
+class Planned:
+    item: ParsedEvent
+    kind: str  # new / updated / unchanged
+    cost: int
+    key: Tuple[int, float, int]
+
+
+class Scheduler:
+    """
+    coalesce の後、store / reconcile の前に置く。
+
+    - 1件ごとに Calendar API のコストを見積もり、急ぎのものから流す:
+      これから来るイベントを日付が近い順 → 過ぎたイベントを新しい順、同じ日時なら new → updated → unchanged
+    - quota_budget（quota units）/ time_budget（秒。run の開始から）を超える分は流さず、
+      store の deferred_events に入れて次の run に回す（次の run では StageChain が読み戻し、
+      新しく来たメールと一緒に coalesce してから並べ直す）
+    0 の予算は無制限。予算が無くても並べ替えはする（途中で止まっても直近の予約が先に入る）。
+    reconcile を並行にしていると、見積もりに入らない実行中の分だけ少し予算を超えることがある。
+    """
+
+    def __init__(self, quota_budget: int = 0, time_budget: float = 0.0, tz: str = "Asia/Tokyo") -> None:
+        self.quota_budget = max(0, quota_budget)
+        self.time_budget = max(0.0, time_budget)
+        self.zone = ZoneInfo(tz)
+
+    def _when(self, event: Event) -> float:
+        when = event.date
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=self.zone)
+        return when.timestamp()
+
+    def plan(self, items: List[ParsedEvent], ctx: StageContext) -> List[Planned]:
+        now = time.time()
+        planned: List[Planned] = []
+        for item in items:
+            row = ctx.store.get_event(item.event.ensure_event_uid())
+            if row is None:
+                kind = "new"
+            elif row["content_hash"] != item.event.content_hash():
+                kind = "updated"
+            else:
+                kind = "unchanged"
+            when = self._when(item.event)
+            # 未来: 近い順（when - now の昇順）/ 過去: 新しい順（now - when の昇順）
+            key = (0, when - now, _KIND_RANK[kind]) if when >= now else (1, now - when, _KIND_RANK[kind])
+            planned.append(Planned(item, kind, COST_RECONCILE, key))
+        planned.sort(key=lambda p: p.key)
+        return planned
+
+    def _over_budget(self, ctx: StageContext, baseline: float, committed: int, cost: int) -> Optional[str]:
+        if self.time_budget and time.perf_counter() - ctx.started >= self.time_budget:
+            return "time"
+        if self.quota_budget:
+            actual = ctx.telemetry.counter_total("quota_units", api="calendar") - baseline
+            if max(actual, committed) + cost > self.quota_budget:
+                return "quota"
+        return None
+
+    def run(self, items: List[ParsedEvent], ctx: StageContext) -> Iterator[ParsedEvent]:
+        """優先順に流し、予算を超えたところで残りを全部 deferred_events に入れる。"""
+        with ctx.telemetry.stage("schedule"):
+            planned = self.plan(items, ctx)
+        baseline = ctx.telemetry.counter_total("quota_units", api="calendar")
+        committed = 0
+        admitted: List[str] = []
+        leftover: List[Planned] = []
+        reason: Optional[str] = None
+        for i, p in enumerate(planned):
+            reason = self._over_budget(ctx, baseline, committed, p.cost)
+            if reason:
+                leftover = planned[i:]
+                break
+            committed += p.cost
+            admitted.append(p.item.event.ensure_event_uid())
+            yield p.item
+
+        ctx.store.clear_deferred(admitted)
+        if leftover:
+            ctx.store.defer_events(
+                [(p.item.event, p.item.message_id, p.item.internal_date, p.item.subject) for p in leftover]
+            )
+            ctx.count("deferred", len(leftover))
+            ctx.telemetry.incr("events_deferred", len(leftover), reason=reason or "")
+            first = leftover[0].item.event
+            logger.info(
+                "scheduler: %s budget reached after %d events (~%d units); deferred %d, next is %s on %s",
+                reason,
+                len(admitted),
+                committed,
+                len(leftover),
+                first.ensure_event_uid(),
+                first.date.isoformat(),
+            )
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import mmap
+import os
+import re
+from email.utils import parsedate_to_datetime
+from typing import Iterator, Optional, Protocol
+
+from .config import Config
+from .mime import MimeIndex, decode_header_value
+from .models import GmailMessage, SyncResult
+from .pipeline import run_sync
+from .telemetry import Telemetry, timed_iter
+
+logger = logging.getLogger(__name__)
+
+_FROM_LINE = b"\nFrom "
+# mboxrd / mboxo で本文中の "From " 行は ">From " にエスケープされている
+_ESCAPED_FROM = re.compile(rb"^>(>*From )", re.MULTILINE)
+
+
+class MessageSource(Protocol):
+    """
+    run_sync(messages=...) に渡せるメールの供給元。GmailMessage を1通ずつ返す iterable。
+    Gmail API（collector_gmail.iter_messages / PartitionedCollector）のほか、ローカルの mbox / Maildir がある。
+    """
+
+    def __iter__(self) -> Iterator[GmailMessage]: ...
+
+
+def message_from_bytes(raw: bytes, fallback_id: str) -> GmailMessage:
+    """
+    RFC 822 のメール1通を GmailMessage にする（Gmail API の GMAIL_FORMAT=raw で取ったときと同じ形）。
+    ここではヘッダと MIME の境界だけを読み、本文・.ics は GmailMessage が最初に読まれたときにそのパートだけデコードする。
+    """
+    index = MimeIndex(raw)
+    headers = index.headers
+    message_id = (headers.get("message-id") or "").strip().strip("<>")
+    internal_date: Optional[int] = None
+    if headers.get("date"):
+        try:
+            internal_date = int(parsedate_to_datetime(headers["date"]).timestamp() * 1000)
+        except (TypeError, ValueError, IndexError):
+            internal_date = None
+    return GmailMessage(
+        id=message_id or fallback_id,
+        # Google Takeout の mbox にはスレッドIDが入っている
+        thread_id=headers.get("x-gm-thrid"),
+        subject=decode_header_value(headers.get("subject")),
+        from_email=decode_header_value(headers.get("from")),
+        internal_date=internal_date,
+        lazy=index,
+    )
+
+
+class MboxSource:
+    """
+    mbox を mmap して "From " 区切りで1通ずつ切り出す。
+    ファイル全体を読み込まないので、数GBの Takeout でも同時にメモリにあるのは1通分だけ。
+    """
+
+    def __init__(self, path: str, limit: Optional[int] = None) -> None:
+        self.path = path
+        self.limit = limit
+
+    def _fallback_id(self, offset: int) -> str:
+        return "mbox:" + hashlib.sha1(f"{os.path.abspath(self.path)}:{offset}".encode("utf-8")).hexdigest()[:16]
+
+    def __iter__(self) -> Iterator[GmailMessage]:
+        count = 0
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, "madvise"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                size = len(mm)
+                if mm[:5] == b"From ":
+                    start = 0
+                else:
+                    found = mm.find(_FROM_LINE)
+                    if found < 0:
+                        logger.warning("mbox: no 'From ' separator in %s", self.path)
+                        return
+                    start = found + 1
+
+                while self.limit is None or count < self.limit:
+                    nxt = mm.find(_FROM_LINE, start)
+                    end = size if nxt < 0 else nxt + 1
+                    # 先頭の "From ..." 区切り行を飛ばす
+                    line_end = mm.find(b"\n", start, end)
+                    body_start = end if line_end < 0 else line_end + 1
+                    raw = mm[body_start:end]
+                    if b">From " in raw:
+                        raw = _ESCAPED_FROM.sub(rb"\1", raw)
+                    msg: Optional[GmailMessage] = None
+                    try:
+                        msg = message_from_bytes(raw, self._fallback_id(start))
+                    except Exception:
+                        logger.exception("mbox: could not parse message at offset %d in %s", start, self.path)
+                    if msg is not None:
+                        yield msg
+                        count += 1
+                    if nxt < 0:
+                        break
+                    start = end
+
+
+class MaildirSource:
+    """Maildir（cur/ と new/）のメールを1ファイルずつ読む。"""
+
+    def __init__(self, path: str, limit: Optional[int] = None) -> None:
+        self.path = path
+        self.limit = limit
+
+    def __iter__(self) -> Iterator[GmailMessage]:
+        count = 0
+        for sub in ("cur", "new"):
+            directory = os.path.join(self.path, sub)
+            if not os.path.isdir(directory):
+                continue
+            for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+                if self.limit is not None and count >= self.limit:
+                    return
+                if not entry.is_file() or entry.name.startswith("."):
+                    continue
+                with open(entry.path, "rb") as f:
+                    raw = f.read()
+                # ファイル名の ":2,FLAGS" より前が Maildir の一意な名前
+                fallback_id = "maildir:" + entry.name.split(":", 1)[0]
+                try:
+                    msg = message_from_bytes(raw, fallback_id)
+                except Exception:
+                    logger.exception("maildir: could not parse %s", entry.path)
+                    continue
+                yield msg
+                count += 1
+
+
+def open_source(path: str, limit: Optional[int] = None) -> MessageSource:
+    """ディレクトリなら Maildir、ファイルなら mbox として開く。"""
+    if os.path.isdir(path):
+        if not any(os.path.isdir(os.path.join(path, sub)) for sub in ("cur", "new")):
+            raise ValueError(f"{path} is a directory but not a Maildir (no cur/ or new/)")
+        return MaildirSource(path, limit=limit)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(path)
+    return MboxSource(path, limit=limit)
+
+
+def import_archive(
+    config: Config,
+    path: str,
+    limit: Optional[int] = None,
+    telemetry: Optional[Telemetry] = None,
+) -> SyncResult:
+    """`cli import` の本体。mbox / Maildir のメールを run_sync に流す（Gmail API は使わない）。"""
+    telemetry = telemetry or Telemetry()
+    source = open_source(path, limit=limit)
+    logger.info("import: %s (%s)", path, type(source).__name__)
+    messages = timed_iter(source, telemetry, "source.read")
+    return run_sync(config, limit=limit or 0, telemetry=telemetry, messages=messages)
@@ -0,0 +1,556 @@
+from __future__ import annotations
+
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Deque, Dict, Generic, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+from zoneinfo import ZoneInfo
+
+from .config import Config
+from .models import Event, GmailMessage, SyncResult
+from .parsers import ParseBudgetExceeded, parse_budget, set_regex_engine
+from .parsers.bonne import parse_bonne
+from .parsers.ics import parse_ics
+from .parsers.life_tuning import parse_life_tuning
+from .parsers.mosh import parse_mosh
+from .parsers.peatix import parse_peatix
+from .parsers.yes_tokyo import parse_yes_tokyo
+from .provider_detect import detect_provider
+from .scheduler import Scheduler
+from .store import EventStore
+from .sync_gcal import reconcile_event
+from .telemetry import Telemetry
+
+logger = logging.getLogger(__name__)
+
+PARSER_MAP = {
+    "bonne": parse_bonne,
+    "yes_tokyo": parse_yes_tokyo,
+    "peatix": parse_peatix,
+    "mosh": parse_mosh,
+    "life_tuning": parse_life_tuning,
+}
+
+In = TypeVar("In")
+Out = TypeVar("Out")
+T = TypeVar("T")
+
+# ステージの入力に掛けるフィルタ。通すなら None、落とすなら理由（events_filtered の reason ラベル）を返す
+Filter = Callable[[T], Optional[str]]
+
+
+@dataclass
+class Detected:
+    """provider が分かったメール（detect → parse）。"""
+
+    msg: GmailMessage
+    provider: str
+
+
+@dataclass
+class ParsedEvent:
+    """パース済みイベントと、それを運んできたメールの情報（coalesce の判断に使う）。"""
+
+    event: Event
+    message_id: str
+    internal_date: int
+    subject: Optional[str] = None
+
+
+@dataclass
+class Stored:
+    """store に書いた結果（store → reconcile）。"""
+
+    item: ParsedEvent
+    action: str  # created / updated / skipped
+    gcal_event_id: Optional[str]
+
+
+@dataclass
+class StageContext:
+    """1回の run_sync でステージが共有するもの。result はステージが並行に動いても lock を取って数える。"""
+
+    config: Config
+    store: EventStore
+    calendar: Any
+    telemetry: Telemetry
+    result: SyncResult
+    # run の開始時刻（perf_counter）。Scheduler の time_budget はここから数える
+    started: float = field(default_factory=time.perf_counter)
+    # 予定を store / カレンダーに書き終えたイベントを運んできたメールの id（coalesce で負けたメールも含む）
+    processed: List[str] = field(default_factory=list)
+    # 途中の段で例外になった（errors に数えた）メールの id → (provider, internalDate)。
+    # PartitionedCollector.commit が provider の起点をこのメールより前に留める（次回もう一度一覧する）
+    failed: Dict[str, Tuple[Optional[str], int]] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            setattr(self.result, name, getattr(self.result, name) + value)
+
+    def fail(self, message_id: str, provider: Optional[str], internal_date: int) -> None:
+        if not message_id:
+            return
+        with self._lock:
+            self.failed[message_id] = (provider, internal_date)
+
+    def drop(self, stage: str, reason: str, provider: Optional[str] = None) -> None:
+        """フィルタで落とした（API は呼ばずに skipped として数える）。"""
+        self.telemetry.incr("events_filtered", stage=stage, reason=reason, provider=provider or "unknown")
+        self.count("skipped")
+
+
+def coalesce_events(parsed: List[ParsedEvent]) -> Tuple[List[ParsedEvent], int]:
+    """
+    同じ event_uid のイベントを1件にまとめる。
+    採用するのは受信日時（internalDate）が新しいもの、同じなら confidence が高いもの
+    （変更通知は確認メールより後に届くので、最新の内容が残る）。
+    戻り値: (残したもの（最初に現れた順）, 捨てた件数)
+    """
+    best: Dict[str, ParsedEvent] = {}
+    order: List[str] = []
+    for item in parsed:
+        uid = item.event.ensure_event_uid()
+        cur = best.get(uid)
+        if cur is None:
+            best[uid] = item
+            order.append(uid)
+        elif (item.internal_date, item.event.confidence) > (cur.internal_date, cur.event.confidence):
+            best[uid] = item
+    return [best[uid] for uid in order], len(parsed) - len(order)
+
+
+class Stage(Generic[In, Out]):
+    """
+    パイプラインの1段。1件を受け取り、次の段へ渡すもの（落とすなら None）を返す。
+
+    - filters: process() の前に入力に掛ける。落とした理由は events_filtered{stage,reason} に数える
+    - concurrency: 2以上ならこの段だけスレッドプールで並行に処理する（出力の順序は入力どおり）
+    process() で None を返すときは、その段で skipped / errors を数えておくこと。
+    """
+
+    name = ""
+
+    def __init__(self, filters: Sequence[Filter[In]] = (), concurrency: int = 1) -> None:
+        self.filters = list(filters)
+        self.concurrency = max(1, concurrency)
+
+    def process(self, item: In, ctx: StageContext) -> Optional[Out]:
+        raise NotImplementedError
+
+    def provider_of(self, item: In) -> Optional[str]:
+        return None
+
+    def describe(self, item: In) -> str:
+        return repr(item)
+
+    def source_of(self, item: In) -> Tuple[str, int]:
+        """item を運んできたメールの (id, internalDate)。"""
+        return "", 0
+
+    def __call__(self, item: In, ctx: StageContext) -> Optional[Out]:
+        try:
+            for f in self.filters:
+                reason = f(item)
+                if reason:
+                    ctx.drop(self.name, reason, self.provider_of(item))
+                    self.on_drop(item)
+                    return None
+            return self.process(item, ctx)
+        except Exception:
+            logger.exception("pipeline: %s failed for %s", self.name, self.describe(item))
+            ctx.count("errors")
+            message_id, internal_date = self.source_of(item)
+            ctx.fail(message_id, self.provider_of(item), internal_date)
+            return None
+
+    def on_drop(self, item: In) -> None:
+        """フィルタで落としたときの後始末（本文を捨てるなど）。"""
+
+    def stream(self, items: Iterable[In], ctx: StageContext) -> Iterator[Out]:
+        """items を1件ずつこの段に通す。concurrency > 1 なら先読みしながら並行に処理する。"""
+        if self.concurrency == 1:
+            for item in items:
+                out = self(item, ctx)
+                if out is not None:
+                    yield out
+            return
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f"yogisync-{self.name}") as pool:
+            pending: Deque[Future] = deque()
+            for item in items:
+                # 上流のジェネレータはこのスレッドでだけ回す（先読みは concurrency*2 件まで）
+                pending.append(pool.submit(contextvars.copy_context().run, self, item, ctx))
+                while len(pending) >= self.concurrency * 2:
+                    out = pending.popleft().result()
+                    if out is not None:
+                        yield out
+            while pending:
+                out = pending.popleft().result()
+                if out is not None:
+                    yield out
+
+
+class _MessageStage(Stage[In, Out]):
+    def describe(self, item: Any) -> str:
+        msg = item.msg if isinstance(item, Detected) else item
+        return f"message {msg.id}"
+
+    def source_of(self, item: Any) -> Tuple[str, int]:
+        msg = item.msg if isinstance(item, Detected) else item
+        return msg.id, msg.internal_date or 0
+
+
+class _EventStage(Stage[In, Out]):
+    def _parsed(self, item: Any) -> ParsedEvent:
+        return item.item if isinstance(item, Stored) else item
+
+    def provider_of(self, item: Any) -> Optional[str]:
+        return self._parsed(item).event.provider
+
+    def describe(self, item: Any) -> str:
+        parsed = self._parsed(item)
+        return f"event {parsed.event.event_uid} (message {parsed.message_id})"
+
+    def source_of(self, item: Any) -> Tuple[str, int]:
+        parsed = self._parsed(item)
+        return parsed.message_id, parsed.internal_date
+
+
+class DetectStage(_MessageStage[GmailMessage, Detected]):
+    name = "detect"
+
+    def on_drop(self, item: GmailMessage) -> None:
+        item.release_bodies()
+
+    def process(self, msg: GmailMessage, ctx: StageContext) -> Optional[Detected]:
+        logger.info("pipeline: processing msg id=%s subject=%s", msg.id, msg.subject)
+        with ctx.telemetry.stage("detect"):
+            provider = detect_provider(msg)
+        if not provider:
+            logger.info(
+                "skip: provider not detected subject=%s from=%s snippet=%s plain_len=%s html_len=%s",
+                msg.subject,
+                msg.from_email,
+                (msg.snippet or "")[:80],
+                len(msg.text_plain or ""),
+                len(msg.text_html or ""),
+            )
+            ctx.telemetry.incr("parse_failures", provider="unknown", reason="provider_not_detected")
+            msg.release_bodies()
+            ctx.count("skipped")
+            return None
+        return Detected(msg, provider)
+
+
+class ParseStage(_MessageStage[Detected, ParsedEvent]):
+    name = "parse"
+
+    def provider_of(self, item: Detected) -> Optional[str]:
+        return item.provider
+
+    def on_drop(self, item: Detected) -> None:
+        item.msg.release_bodies()
+
+    def process(self, item: Detected, ctx: StageContext) -> Optional[ParsedEvent]:
+        msg, provider = item.msg, item.provider
+        parser = PARSER_MAP.get(provider)
+        if not parser:
+            logger.info("skip: parser not found (%s)", provider)
+            ctx.telemetry.incr("parse_failures", provider=provider, reason="parser_not_found")
+            msg.release_bodies()
+            ctx.count("skipped")
+            return None
+
+        # パーサが読む本文だけ残してパースし、終わったら本文は捨てる
+        msg.retain_for(provider)
+        plain_len, html_len = len(msg.text_plain or ""), len(msg.text_html or "")
+        if ctx.config.parse_max_body_chars > 0 and msg.clip_bodies(ctx.config.parse_max_body_chars):
+            logger.info(
+                "parse: clipped body to %d chars (%s) id=%s plain_len=%s html_len=%s",
+                ctx.config.parse_max_body_chars,
+                provider,
+                msg.id,
+                plain_len,
+                html_len,
+            )
+        started = time.perf_counter()
+        source = "ics"
+        try:
+            with ctx.telemetry.stage("parse", provider), parse_budget(ctx.config.parse_time_budget):
+                # 招待の .ics が付いていれば本文より先にそれを読む（読めなければ provider 別パーサ）
+                event = parse_ics(msg, provider) if msg.calendar_parts else None
+                if event is None:
+                    source = "body"
+                    event = parser(msg)
+        except ParseBudgetExceeded:
+            # 1通の壊れたメールで同期全体を止めない
+            logger.warning(
+                "skip: parse budget exceeded (%s) after %.2fs id=%s subject=%s plain_len=%s html_len=%s",
+                provider,
+                time.perf_counter() - started,
+                msg.id,
+                msg.subject,
+                plain_len,
+                html_len,
+            )
+            ctx.telemetry.incr("parse_failures", provider=provider, reason="parse_budget")
+            ctx.count("skipped")
+            return None
+        finally:
+            msg.release_bodies()
+        if not event:
+            logger.info(
+                "skip: parse failed (%s) subject=%s from=%s snippet=%s plain_len=%s html_len=%s",
+                provider,
+                msg.subject,
+                msg.from_email,
+                (msg.snippet or "")[:80],
+                plain_len,
+                html_len,
+            )
+            ctx.telemetry.incr("parse_failures", provider=provider, reason="parse_failed")
+            ctx.count("skipped")
+            return None
+
+        ctx.telemetry.incr("messages_parsed", provider=provider, source=source)
+        event.ensure_event_uid()
+        return ParsedEvent(event, msg.id, msg.internal_date or 0, msg.subject)
+
+
+class FilterStage(_EventStage[ParsedEvent, ParsedEvent]):
+    """パース済みイベントを filters だけで選り分ける段（date_horizon / min_confidence など）。"""
+
+    name = "filter"
+
+    def process(self, item: ParsedEvent, ctx: StageContext) -> Optional[ParsedEvent]:
+        return item
+
+
+class StoreStage(_EventStage[ParsedEvent, Stored]):
+    name = "store"
+
+    def process(self, item: ParsedEvent, ctx: StageContext) -> Optional[Stored]:
+        with ctx.telemetry.stage("store", item.event.provider):
+            action, gcal_event_id = ctx.store.upsert_event(item.event)
+        return Stored(item, action, gcal_event_id)
+
+
+class ReconcileStage(_EventStage[Stored, Stored]):
+    name = "reconcile"
+
+    def process(self, stored: Stored, ctx: StageContext) -> Optional[Stored]:
+        uid = stored.item.event.ensure_event_uid()
+        # 同じ event_uid の reconcile は store を共有する run_sync の間でも1つずつ（backfill のシャードは並行に動く）
+        with ctx.store.event_lock(uid):
+            return self._reconcile(stored, ctx, uid)
+
+    def _reconcile(self, stored: Stored, ctx: StageContext, uid: str) -> Stored:
+        event = stored.item.event
+        provider = event.provider
+        gcal_event_id = stored.gcal_event_id
+        if not gcal_event_id:
+            # lock を待つ間に別の run が作った予定の id（あれば insert せずにそれを update する）
+            row = ctx.store.get_event(uid)
+            gcal_event_id = row["gcal_event_id"] if row is not None and not row["duplicate_of"] else None
+
+        # ★重要:
+        # - action=="skipped" でも、カレンダー側に “同一event_uid重複” が残ってる可能性がある
+        # - なので reconcile_event を実行して、余分を削除して「残す1件」を確定させる
+        # - created/updated の場合は “必ず reconcile” を通して、二重作成を避ける
+        skipped = stored.action == "skipped"
+        with ctx.telemetry.stage("reconcile", provider):
+            kept_id = reconcile_event(
+                ctx.config,
+                event,
+                gcal_event_id,
+                allow_create=not skipped,  # skipped の時は新規作成しない
+                cleanup_duplicates=True,   # 重複掃除はする
+                telemetry=ctx.telemetry,
+                service=ctx.calendar,
+            )
+
+        if kept_id and kept_id != gcal_event_id:
+            with ctx.telemetry.stage("store", provider):
+                ctx.store.update_gcal_event_id(uid, kept_id)
+            if skipped:
+                logger.info(
+                    "pipeline: gcal_event_id changed after reconcile event_uid=%s old=%s new=%s",
+                    uid,
+                    gcal_event_id,
+                    kept_id,
+                )
+
+        if skipped:
+            logger.info(
+                "skip: store skipped (%s) event_uid=%s gcal_event_id=%s subject=%s",
+                provider,
+                uid,
+                gcal_event_id,
+                stored.item.subject,
+            )
+            ctx.count("skipped")
+        elif stored.action == "created":
+            ctx.count("created")
+        else:
+            ctx.count("updated")
+        return stored
+
+
+# --- 組み込みのフィルタ ---------------------------------------------------------
+
+
+def provider_allowlist(providers: Iterable[str]) -> Filter[Detected]:
+    """許可した provider 以外のメールをパース前に落とす。"""
+    allowed = frozenset(providers)
+
+    def check(item: Detected) -> Optional[str]:
+        return None if item.provider in allowed else "provider_not_allowed"
+
+    return check
+
+
+def date_horizon(
+    tz: str, past_days: int = 0, future_days: int = 0, now: Optional[datetime] = None
+) -> Filter[ParsedEvent]:
+    """
+    今から past_days 日より前 / future_days 日より先のイベントを落とす（0 ならその側は制限しない）。
+    古い予約メールを backfill しても、終わった予定のために Calendar API を呼ばない。
+    """
+    zone = ZoneInfo(tz)
+    base = now or datetime.now(zone)
+    earliest = base - timedelta(days=past_days) if past_days > 0 else None
+    latest = base + timedelta(days=future_days) if future_days > 0 else None
+
+    def check(item: ParsedEvent) -> Optional[str]:
+        when = item.event.date
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=zone)
+        if item.event.time_unknown:
+            # 終日（時刻不明）はその日の終わりまで有効
+            when = when.replace(hour=23, minute=59, second=59)
+        if earliest is not None and when < earliest:
+            return "before_horizon"
+        if latest is not None and when > latest:
+            return "after_horizon"
+        return None
+
+    return check
+
+
+def min_confidence(threshold: float) -> Filter[ParsedEvent]:
+    """パーサの confidence が threshold 未満のイベントを落とす。"""
+
+    def check(item: ParsedEvent) -> Optional[str]:
+        return "low_confidence" if item.event.confidence < threshold else None
+
+    return check
+
+
+# --- チェーン ------------------------------------------------------------------
+
+
+class StageChain:
+    """
+    source → detect → parse → filter → coalesce → schedule → store → reconcile。
+
+    coalesce より前はメールを1通ずつ流す（全件をメモリに溜めない）。
+    coalesce は同じ event_uid を1件にするために全件を待つ（前回 scheduler が回したイベントもここで混ぜる）。
+    その後 scheduler が急ぎの順に並べて予算の分だけ store → reconcile に1件ずつ流す。
+    reconcile まで済んだ event_uid のメール id は ctx.processed に入る（処理済みラベル用）。
+    filters は各段の入力に掛かるので、安い判定（provider・日付・confidence）は Calendar API を呼ぶ前に済む。
+    load_deferred=False なら deferred_events を読み戻さない（backfill のシャードのように、
+    同じ store に並行して何度も run するときは、読み戻しを別に1回だけする）。
+    """
+
+    def __init__(
+        self,
+        detect: DetectStage,
+        parse: ParseStage,
+        filter: FilterStage,
+        store: StoreStage,
+        reconcile: ReconcileStage,
+        scheduler: Optional[Scheduler] = None,
+        load_deferred: bool = True,
+    ) -> None:
+        self.detect = detect
+        self.parse = parse
+        self.filter = filter
+        self.store = store
+        self.reconcile = reconcile
+        self.scheduler = scheduler or Scheduler()
+        self.load_deferred = load_deferred
+
+    @property
+    def stages(self) -> List[Stage]:
+        return [self.detect, self.parse, self.filter, self.store, self.reconcile]
+
+    def run(self, messages: Iterable[GmailMessage], ctx: StageContext) -> None:
+        parsed = self._load_deferred(ctx) if self.load_deferred else []
+        parsed.extend(self.filter.stream(self.parse.stream(self.detect.stream(messages, ctx), ctx), ctx))
+        sources: Dict[str, List[str]] = {}
+        for item in parsed:
+            if item.message_id:
+                sources.setdefault(item.event.ensure_event_uid(), []).append(item.message_id)
+
+        # 確認メール・リマインダー・変更通知が同じ予約を指すので、event_uid ごとに1件にしてから同期する
+        with ctx.telemetry.stage("coalesce"):
+            kept, dropped = coalesce_events(parsed)
+        if dropped:
+            ctx.telemetry.incr("events_coalesced", dropped)
+            ctx.count("skipped", dropped)
+            logger.info("pipeline: coalesced %d duplicate events (%d unique)", dropped, len(kept))
+
+        scheduled = self.scheduler.run(kept, ctx)
+        for stored in self.reconcile.stream(self.store.stream(scheduled, ctx), ctx):
+            ctx.processed.extend(sources.get(stored.item.event.ensure_event_uid(), ()))
+
+    @staticmethod
+    def _load_deferred(ctx: StageContext) -> List[ParsedEvent]:
+        """前回までに予算切れで回されたイベント（先に並べておき、同じ event_uid の新しいメールがあれば coalesce で負ける）。"""
+        items: List[ParsedEvent] = []
+        for row in ctx.store.deferred_events():
+            try:
+                event = Event.model_validate_json(row["event_json"])
+            except ValueError:
+                logger.warning("pipeline: dropping unreadable deferred event %s", row["event_uid"])
+                ctx.store.clear_deferred([row["event_uid"]])
+                continue
+            items.append(ParsedEvent(event, row["message_id"] or "", row["internal_date"] or 0, row["subject"]))
+        if items:
+            logger.info("pipeline: %d deferred events from previous runs", len(items))
+        return items
+
+
+def build_stages(config: Config, load_deferred: bool = True) -> StageChain:
+    """
+    Config の PROVIDER_ALLOWLIST / PAST_HORIZON_DAYS / MIN_CONFIDENCE / STAGE_CONCURRENCY /
+    QUOTA_BUDGET / TIME_BUDGET からチェーンを作る（REGEX_ENGINE もここでパーサに設定する）。
+    """
+    set_regex_engine(config.regex_engine)
+    workers = config.stage_concurrency
+
+    parse_filters: List[Filter[Detected]] = []
+    if config.provider_allowlist:
+        parse_filters.append(provider_allowlist(config.provider_allowlist))
+
+    event_filters: List[Filter[ParsedEvent]] = []
+    if config.past_horizon_days > 0 or config.future_horizon_days > 0:
+        event_filters.append(date_horizon(config.timezone, config.past_horizon_days, config.future_horizon_days))
+    if config.min_confidence > 0:
+        event_filters.append(min_confidence(config.min_confidence))
+
+    return StageChain(
+        detect=DetectStage(concurrency=workers.get("detect", 1)),
+        parse=ParseStage(parse_filters, concurrency=workers.get("parse", 1)),
+        filter=FilterStage(event_filters, concurrency=workers.get("filter", 1)),
+        store=StoreStage(concurrency=workers.get("store", 1)),
+        reconcile=ReconcileStage(concurrency=workers.get("reconcile", 1)),
+        scheduler=Scheduler(config.quota_budget, config.time_budget, tz=config.timezone),
+        load_deferred=load_deferred,
+    )
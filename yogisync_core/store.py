@@ -1,51 +1,264 @@
 from __future__ import annotations
 
+import copy
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 from .models import Event
+from .telemetry import Telemetry, timed
+
+
+_EVENTS_DDL = """
+    CREATE TABLE IF NOT EXISTS events (
+        account TEXT NOT NULL DEFAULT '',
+        event_uid TEXT NOT NULL,
+        provider TEXT,
+        date TEXT,
+        title TEXT,
+        reservation_id TEXT,
+        source_url TEXT,
+        gcal_event_id TEXT,
+        content_hash TEXT,
+        updated_at TEXT,
+        location_name TEXT,
+        address TEXT,
+        instructor TEXT,
+        confidence REAL,
+        time_unknown INTEGER,
+        exported_month TEXT,
+        end_at TEXT,
+        duplicate_of TEXT,
+        PRIMARY KEY (account, event_uid)
+    )
+"""
+
+# 後から足した列（既存DBには ALTER TABLE で追加する）
+# location_name〜time_unknown: export がカレンダーを読まずに feed を作るための詳細
+# exported_month: 最後に export したときの月パーティション（日付が別の月に動いたら旧月も書き直す）
+# end_at: ICS の DTEND など終了時刻が分かったとき（無ければ NULL で既定の長さ）
+# duplicate_of: `cli cross-dedupe` が別 provider の同じクラスと判定したとき、残した方の event_uid
+_ADDED_COLUMNS = (
+    ("location_name", "TEXT"),
+    ("address", "TEXT"),
+    ("instructor", "TEXT"),
+    ("confidence", "REAL"),
+    ("time_unknown", "INTEGER"),
+    ("exported_month", "TEXT"),
+    ("end_at", "TEXT"),
+    ("duplicate_of", "TEXT"),
+)
+
+# 保持期間（RETENTION_DAYS）より前の過去イベントの移し先。列は events と同じ + archived_at。
+# ARCHIVE_PATH があればそのファイルを ATTACH した "archive" スキーマ、無ければ同じファイル（"main"）に置く
+_ARCHIVE_TABLE = "events_archive"
+# archive_events で1回のトランザクションに移す行数（初回に何年分もあっても書き込みロックを長く持たない）
+ARCHIVE_CHUNK_ROWS = 5000
 
 
 class EventStore:
-    def __init__(self, path: str) -> None:
+    """
+    同期状態の SQLite。
+    複数アカウントは1ファイルを共有し、行は (account, event_uid) で分ける。
+    for_account() で同じ接続を共有するアカウント別のビューを作れる（スレッドをまたいで使って良い）。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        telemetry: Optional[Telemetry] = None,
+        account: str = "",
+        archive_path: str = "",
+    ) -> None:
         self.path = path
-        self.conn = sqlite3.connect(self.path)
+        self.telemetry = telemetry
+        self.account = account
+        self.archive_path = archive_path
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        # event_lock() の (account, event_uid) → [lock, 待っている数]（for_account のビューとも共有する）
+        self._event_locks: Dict[Tuple[str, str], list] = {}
+        self._event_locks_guard = threading.Lock()
+        # 新しいファイルは incremental VACUUM できるようにしておく（既存ファイルは `cli maintain` が切り替える）
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._archive = "main"
+        if archive_path:
+            self.conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+            self.conn.execute("PRAGMA archive.auto_vacuum = INCREMENTAL")
+            self._archive = "archive"
         self._ensure_table()
 
+    def for_account(self, account: str, telemetry: Optional[Telemetry] = None) -> "EventStore":
+        """同じ接続・lock を使う別アカウント用のビュー。close() は元の store だけで呼ぶこと。"""
+        view = copy.copy(self)
+        view.account = account
+        view.telemetry = telemetry
+        return view
+
     def _ensure_table(self) -> None:
+        columns = [r["name"] for r in self.conn.execute("PRAGMA table_info(events)")]
+        if columns and "account" not in columns:
+            # 旧スキーマ（event_uid 単独PK）→ (account, event_uid) へ移行。既存行は account='' になる
+            self.conn.executescript(
+                "ALTER TABLE events RENAME TO events_v1;"
+                + _EVENTS_DDL
+                + """;
+                INSERT INTO events (
+                    account, event_uid, provider, date, title, reservation_id, source_url,
+                    gcal_event_id, content_hash, updated_at
+                )
+                SELECT '', event_uid, provider, date, title, reservation_id, source_url,
+                       gcal_event_id, content_hash, updated_at
+                FROM events_v1;
+                DROP TABLE events_v1;
+                """
+            )
+        self.conn.execute(_EVENTS_DDL)
+        archive = f"{self._archive}.{_ARCHIVE_TABLE}"
+        self.conn.execute(_EVENTS_DDL.replace("events", archive, 1))
+        for table, info in (("events", "main.table_info(events)"), (archive, f"{self._archive}.table_info({_ARCHIVE_TABLE})")):
+            columns = [r["name"] for r in self.conn.execute(f"PRAGMA {info}")]
+            for name, sql_type in _ADDED_COLUMNS:
+                if name not in columns:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}")
+            if table == archive and "archived_at" not in columns:
+                self.conn.execute(f"ALTER TABLE {archive} ADD COLUMN archived_at TEXT")
+        # archive との行の出し入れに使う events の列（archived_at 以外は同じ並び）
+        self._columns = ", ".join(r["name"] for r in self.conn.execute("PRAGMA main.table_info(events)"))
+        self.conn.execute("CREATE INDEX IF NOT EXISTS events_by_date ON events (account, date)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS events_by_updated_at ON events (account, updated_at)")
+        self.conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {self._archive}.{_ARCHIVE_TABLE}_by_date ON {_ARCHIVE_TABLE} (account, date)"
+        )
+        # quota / 時間の予算を使い切って次回に回したイベント（scheduler.Scheduler）
         self.conn.execute(
             """
-            CREATE TABLE IF NOT EXISTS events (
-                event_uid TEXT PRIMARY KEY,
-                provider TEXT,
-                date TEXT,
-                title TEXT,
-                reservation_id TEXT,
-                source_url TEXT,
-                gcal_event_id TEXT,
-                content_hash TEXT,
+            CREATE TABLE IF NOT EXISTS deferred_events (
+                account TEXT NOT NULL DEFAULT '',
+                event_uid TEXT NOT NULL,
+                event_json TEXT NOT NULL,
+                message_id TEXT,
+                internal_date INTEGER,
+                subject TEXT,
+                deferred_at TEXT,
+                PRIMARY KEY (account, event_uid)
+            )
+            """
+        )
+        # 予定を書き終えたメール（GMAIL_PROCESSED_LABEL）。labeled_at が NULL のものはまだ Gmail にラベルを付けていない
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS processed_messages (
+                account TEXT NOT NULL DEFAULT '',
+                message_id TEXT NOT NULL,
+                processed_at TEXT,
+                labeled_at TEXT,
+                PRIMARY KEY (account, message_id)
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS processed_messages_unlabeled ON processed_messages (account, labeled_at)"
+        )
+        # 差分取得の起点（Gmail historyId など）を保存する key-value
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value TEXT,
                 updated_at TEXT
             )
             """
         )
         self.conn.commit()
 
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """書き込み1回分（execute〜commit）。所要時間は sqlite.transaction として記録する。"""
+        with self._lock, timed(self.telemetry, "sqlite.transaction"):
+            yield self.conn
+            self.conn.commit()
+
+    @contextmanager
+    def event_lock(self, event_uid: str) -> Iterator[None]:
+        """
+        event_uid ごとの排他。同じ store を使う別スレッドの run_sync（backfill のシャードなど）が
+        同じ予約を同時に reconcile して、どちらも「見つからない」からカレンダーに2件作るのを防ぐ。
+        """
+        key = (self.account, event_uid)
+        with self._event_locks_guard:
+            entry = self._event_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._event_locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._event_locks[key]
+
+    def _state_key(self, key: str) -> str:
+        return f"{self.account}:{key}" if self.account else key
+
     def get_event(self, event_uid: str) -> Optional[sqlite3.Row]:
-        cur = self.conn.execute("SELECT * FROM events WHERE event_uid = ?", (event_uid,))
-        return cur.fetchone()
+        with self._lock:
+            cur = self.conn.execute(
+                "SELECT * FROM events WHERE account = ? AND event_uid = ?", (self.account, event_uid)
+            )
+            return cur.fetchone()
+
+    def get_archived_event(self, event_uid: str) -> Optional[sqlite3.Row]:
+        with self._lock:
+            cur = self.conn.execute(
+                f"SELECT * FROM {self._archive}.{_ARCHIVE_TABLE} WHERE account = ? AND event_uid = ?",
+                (self.account, event_uid),
+            )
+            return cur.fetchone()
 
     def upsert_event(self, event: Event) -> Tuple[str, Optional[str]]:
+        with self._lock:
+            return self._upsert_event(event)
+
+    def _restore_archived(self, event_uid: str) -> Optional[sqlite3.Row]:
+        """archive にある event_uid を events に戻す（古いメールをもう一度読んだときなど）。無ければ None。"""
+        archive = f"{self._archive}.{_ARCHIVE_TABLE}"
+        if self.get_archived_event(event_uid) is None:
+            return None
+        with self._transaction() as conn:
+            conn.execute(
+                f"""
+                INSERT OR REPLACE INTO events ({self._columns})
+                SELECT {self._columns} FROM {archive} WHERE account = ? AND event_uid = ?
+                """,
+                (self.account, event_uid),
+            )
+            conn.execute(f"DELETE FROM {archive} WHERE account = ? AND event_uid = ?", (self.account, event_uid))
+        return self.get_event(event_uid)
+
+    def _upsert_event(self, event: Event) -> Tuple[str, Optional[str]]:
         event_uid = event.ensure_event_uid()
+        # パーサ側は検証なしで作っているので、DBに入れる前にここで検証する
+        event = event.checked()
         content_hash = event.content_hash()
         now = datetime.utcnow().isoformat()
 
-        existing = self.get_event(event_uid)
+        existing = self.get_event(event_uid) or self._restore_archived(event_uid)
         if existing:
             existing_gcal_event_id = existing["gcal_event_id"]
             has_gcal_id = bool(existing_gcal_event_id)  # None / "" を両方 false扱い
 
+            if existing["content_hash"] == content_hash and existing["duplicate_of"]:
+                # cross-dedupe で別 provider の予定にまとめたもの。カレンダーには作り直さない
+                return "skipped", existing_gcal_event_id
+
+            if existing["content_hash"] == content_hash and existing["confidence"] is None:
+                # 詳細列を足す前に入った行。カレンダーは同期済みなので DB の詳細だけ埋める
+                self._fill_details(event)
+
             # 内容が同じ＆GCal同期済みならスキップ
             if existing["content_hash"] == content_hash and has_gcal_id:
                 return "skipped", existing_gcal_event_id
@@ -54,59 +267,343 @@ class EventStore:
             if existing["content_hash"] == content_hash and not has_gcal_id:
                 return "updated", None
 
-            # 内容が違う場合は UPDATE（gcal_event_id は保持）
-            self.conn.execute(
+            # 内容が違う場合は UPDATE（gcal_event_id は保持）。
+            # 日時などが変わったら別のクラスかもしれないので duplicate_of は外す（次の cross-dedupe で見直す）
+            with self._transaction() as conn:
+                conn.execute(
+                    """
+                    UPDATE events
+                    SET provider = ?, date = ?, title = ?, reservation_id = ?, source_url = ?,
+                        content_hash = ?, updated_at = ?,
+                        location_name = ?, address = ?, instructor = ?, confidence = ?, time_unknown = ?, end_at = ?,
+                        duplicate_of = NULL
+                    WHERE account = ? AND event_uid = ?
+                    """,
+                    (
+                        event.provider,
+                        event.date.isoformat(),
+                        event.title,
+                        event.reservation_id,
+                        event.source_url,
+                        content_hash,
+                        now,
+                        *_details(event),
+                        self.account,
+                        event_uid,
+                    ),
+                )
+            return "updated", existing_gcal_event_id
+
+        # existing が無い場合は INSERT
+        with self._transaction() as conn:
+            conn.execute(
                 """
-                UPDATE events
-                SET provider = ?, date = ?, title = ?, reservation_id = ?, source_url = ?,
-                    content_hash = ?, updated_at = ?
-                WHERE event_uid = ?
+                INSERT INTO events (
+                    account, event_uid, provider, date, title, reservation_id, source_url,
+                    gcal_event_id, content_hash, updated_at,
+                    location_name, address, instructor, confidence, time_unknown, end_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """,
                 (
+                    self.account,
+                    event_uid,
                     event.provider,
                     event.date.isoformat(),
                     event.title,
                     event.reservation_id,
                     event.source_url,
+                    event.gcal_event_id,
                     content_hash,
                     now,
-                    event_uid,
+                    *_details(event),
                 ),
             )
-            self.conn.commit()
-            return "updated", existing_gcal_event_id
-
-        # existing が無い場合は INSERT
-        self.conn.execute(
-            """
-            INSERT INTO events (
-                event_uid, provider, date, title, reservation_id, source_url,
-                gcal_event_id, content_hash, updated_at
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                event_uid,
-                event.provider,
-                event.date.isoformat(),
-                event.title,
-                event.reservation_id,
-                event.source_url,
-                event.gcal_event_id,
-                content_hash,
-                now,
-            ),
-        )
-        self.conn.commit()
         return "created", None
 
+    def _fill_details(self, event: Event) -> None:
+        now = datetime.utcnow().isoformat()
+        with self._transaction() as conn:
+            conn.execute(
+                """
+                UPDATE events
+                SET location_name = ?, address = ?, instructor = ?, confidence = ?, time_unknown = ?, end_at = ?,
+                    updated_at = ?
+                WHERE account = ? AND event_uid = ?
+                """,
+                (*_details(event), now, self.account, event.ensure_event_uid()),
+            )
+
     def update_gcal_event_id(self, event_uid: str, gcal_event_id: str) -> None:
         now = datetime.utcnow().isoformat()
-        self.conn.execute(
-            "UPDATE events SET gcal_event_id = ?, updated_at = ? WHERE event_uid = ?",
-            (gcal_event_id, now, event_uid),
-        )
-        self.conn.commit()
+        with self._transaction() as conn:
+            for table in ("events", f"{self._archive}.{_ARCHIVE_TABLE}"):
+                # dedupe は archive 済みのイベントの id も直す
+                conn.execute(
+                    f"UPDATE {table} SET gcal_event_id = ?, updated_at = ? WHERE account = ? AND event_uid = ?",
+                    (gcal_event_id, now, self.account, event_uid),
+                )
+
+    def iter_events(self) -> Iterator[sqlite3.Row]:
+        """
+        このアカウントのイベントを archive の分も含めて (date, event_uid) 順に返す（cross-dedupe の走査用）。
+        ARCHIVE_CHUNK_ROWS 行ずつの keyset ページで読むので、何年分あってもメモリに全件は載せない。
+        """
+        last: Tuple[str, str] = ("", "")
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    f"""
+                    SELECT {self._columns} FROM events WHERE account = ? AND (date, event_uid) > (?, ?)
+                    UNION ALL
+                    SELECT {self._columns} FROM {self._archive}.{_ARCHIVE_TABLE}
+                    WHERE account = ? AND (date, event_uid) > (?, ?)
+                    ORDER BY date, event_uid
+                    LIMIT ?
+                    """,
+                    (self.account, *last, self.account, *last, ARCHIVE_CHUNK_ROWS),
+                ).fetchall()
+            yield from rows
+            if len(rows) < ARCHIVE_CHUNK_ROWS:
+                return
+            last = (rows[-1]["date"], rows[-1]["event_uid"])
+
+    def link_duplicate(self, event_uid: str, duplicate_of: str, *, clear_gcal_event_id: bool = False) -> None:
+        """
+        event_uid を duplicate_of（残した方）の重複として記録する。
+        clear_gcal_event_id=True はカレンダーから消したとき（次の sync で作り直さないよう id も外す）。
+        """
+        now = datetime.utcnow().isoformat()
+        gcal = ", gcal_event_id = NULL" if clear_gcal_event_id else ""
+        with self._transaction() as conn:
+            for table in ("events", f"{self._archive}.{_ARCHIVE_TABLE}"):
+                conn.execute(
+                    f"UPDATE {table} SET duplicate_of = ?, updated_at = ?{gcal} WHERE account = ? AND event_uid = ?",
+                    (duplicate_of, now, self.account, event_uid),
+                )
+
+    def changed_months(self, since: str) -> Tuple[str, Set[str]]:
+        """
+        updated_at が since より新しい行が属する月（YYYY-MM）と、前回 export 時の月を返す。
+        戻り値の1つ目はその中で一番新しい updated_at（次回の since にする）。
+        """
+        with self._lock:
+            cur = self.conn.execute(
+                """
+                SELECT substr(date, 1, 7) AS month, exported_month, updated_at
+                FROM events
+                WHERE account = ? AND updated_at > ?
+                """,
+                (self.account, since),
+            )
+            months: Set[str] = set()
+            latest = since
+            for row in cur:
+                months.add(row["month"])
+                if row["exported_month"]:
+                    months.add(row["exported_month"])
+                latest = max(latest, row["updated_at"])
+        return latest, months
+
+    def events_in_month(self, month: str) -> List[sqlite3.Row]:
+        """
+        その月のイベント。保持期間の境目の月は一部が archive にあるので、それも合わせて返す。
+        cross-dedupe で別 provider の予定の重複とした行（duplicate_of あり）は含めない。
+        """
+        with self._lock:
+            cur = self.conn.execute(
+                f"""
+                SELECT {self._columns} FROM events
+                WHERE account = ? AND date >= ? AND date < ? AND duplicate_of IS NULL
+                UNION ALL
+                SELECT {self._columns} FROM {self._archive}.{_ARCHIVE_TABLE}
+                WHERE account = ? AND date >= ? AND date < ? AND duplicate_of IS NULL
+                ORDER BY date, event_uid
+                """,
+                (self.account, month, month + "~") * 2,
+            )
+            return cur.fetchall()
+
+    def mark_exported(self, since: str, until: str) -> None:
+        """since < updated_at <= until の行に、今の月パーティションを exported_month として記録する。"""
+        with self._transaction() as conn:
+            conn.execute(
+                """
+                UPDATE events SET exported_month = substr(date, 1, 7)
+                WHERE account = ? AND updated_at > ? AND updated_at <= ?
+                """,
+                (self.account, since, until),
+            )
+
+    def defer_events(self, items: List[Tuple[Event, str, int, Optional[str]]]) -> None:
+        """(event, message_id, internal_date, subject) を次回の run に回す（同じ event_uid は新しい方で上書き）。"""
+        if not items:
+            return
+        now = datetime.utcnow().isoformat()
+        with self._transaction() as conn:
+            conn.executemany(
+                """
+                INSERT INTO deferred_events (account, event_uid, event_json, message_id, internal_date, subject, deferred_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(account, event_uid) DO UPDATE SET
+                    event_json = excluded.event_json, message_id = excluded.message_id,
+                    internal_date = excluded.internal_date, subject = excluded.subject, deferred_at = excluded.deferred_at
+                """,
+                [
+                    (self.account, event.ensure_event_uid(), event.model_dump_json(), message_id, internal_date, subject, now)
+                    for event, message_id, internal_date, subject in items
+                ],
+            )
+
+    def deferred_events(self) -> List[sqlite3.Row]:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT * FROM deferred_events WHERE account = ? ORDER BY deferred_at", (self.account,)
+            ).fetchall()
+
+    def clear_deferred(self, event_uids: Iterable[str]) -> None:
+        uids = [(self.account, uid) for uid in event_uids]
+        if not uids:
+            return
+        with self._transaction() as conn:
+            conn.executemany("DELETE FROM deferred_events WHERE account = ? AND event_uid = ?", uids)
+
+    def record_processed(self, message_ids: Iterable[str]) -> None:
+        """ラベル付けの待ち行列に入れる（記録済みのメールはそのまま）。"""
+        now = datetime.utcnow().isoformat()
+        rows = [(self.account, mid, now) for mid in message_ids if mid]
+        if not rows:
+            return
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO processed_messages (account, message_id, processed_at) VALUES (?, ?, ?)", rows
+            )
+
+    def unlabeled_messages(self, limit: int) -> List[str]:
+        with self._lock:
+            rows = self.conn.execute(
+                """
+                SELECT message_id FROM processed_messages
+                WHERE account = ? AND labeled_at IS NULL ORDER BY processed_at LIMIT ?
+                """,
+                (self.account, limit),
+            ).fetchall()
+        return [r["message_id"] for r in rows]
+
+    def mark_labeled(self, message_ids: Iterable[str]) -> None:
+        now = datetime.utcnow().isoformat()
+        rows = [(now, self.account, mid) for mid in message_ids]
+        if not rows:
+            return
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE processed_messages SET labeled_at = ? WHERE account = ? AND message_id = ?", rows
+            )
+
+    def archive_events(self, before: str, *, dry_run: bool = False) -> int:
+        """
+        date が before（YYYY-MM-DD）より前の行を全アカウント分 archive に移す。戻り値は移した（dry_run なら移す）行数。
+        ARCHIVE_CHUNK_ROWS 行ずつのトランザクションで移す（別ファイルの archive でも1回ごとに原子的）。
+        """
+        archive = f"{self._archive}.{_ARCHIVE_TABLE}"
+        if dry_run:
+            with self._lock:
+                return self.conn.execute("SELECT count(*) FROM events WHERE date < ?", (before,)).fetchone()[0]
+        now = datetime.utcnow().isoformat()
+        moved = 0
+        while True:
+            with self._transaction() as conn:
+                rowids = [
+                    r[0]
+                    for r in conn.execute(
+                        "SELECT rowid FROM events WHERE date < ? LIMIT ?", (before, ARCHIVE_CHUNK_ROWS)
+                    )
+                ]
+                if not rowids:
+                    break
+                marks = ",".join("?" * len(rowids))
+                conn.execute(
+                    f"""
+                    INSERT OR REPLACE INTO {archive} ({self._columns}, archived_at)
+                    SELECT {self._columns}, ? FROM events WHERE rowid IN ({marks})
+                    """,
+                    (now, *rowids),
+                )
+                conn.execute(f"DELETE FROM events WHERE rowid IN ({marks})", rowids)
+            moved += len(rowids)
+        return moved
+
+    def prune_processed(self, before: str, *, dry_run: bool = False) -> int:
+        """ラベルを付け終えた processed_messages のうち、processed_at が before より前のものを消す。"""
+        where = "labeled_at IS NOT NULL AND processed_at < ?"
+        if dry_run:
+            with self._lock:
+                return self.conn.execute(f"SELECT count(*) FROM processed_messages WHERE {where}", (before,)).fetchone()[0]
+        with self._transaction() as conn:
+            return conn.execute(f"DELETE FROM processed_messages WHERE {where}", (before,)).rowcount
+
+    def table_rows(self) -> Dict[str, int]:
+        """events / archive / deferred / processed の行数（`cli maintain` のレポート用）。"""
+        with self._lock:
+            return {
+                table.split(".")[-1]: self.conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+                for table in ("events", f"{self._archive}.{_ARCHIVE_TABLE}", "deferred_events", "processed_messages")
+            }
+
+    def vacuum(self) -> Dict[str, int]:
+        """
+        空きページを incremental VACUUM でファイルから返す。戻り値: スキーマ（main / archive）ごとの返したページ数。
+        auto_vacuum が INCREMENTAL でない既存ファイルは、最初の1回だけ切り替えのための VACUUM（全体の書き直し）をする。
+        """
+        freed: Dict[str, int] = {}
+        with self._lock:
+            self.conn.commit()
+            for schema in dict.fromkeys(("main", self._archive)):
+                before = self.conn.execute(f"PRAGMA {schema}.page_count").fetchone()[0]
+                if self.conn.execute(f"PRAGMA {schema}.auto_vacuum").fetchone()[0] != 2:
+                    self.conn.execute(f"PRAGMA {schema}.auto_vacuum = INCREMENTAL")
+                    self.conn.execute(f"VACUUM {schema}")
+                else:
+                    # execute() だと1ステップ（1ページ）で止まるので、最後まで回る executescript で流す
+                    self.conn.executescript(f"PRAGMA {schema}.incremental_vacuum;")
+                freed[schema] = before - self.conn.execute(f"PRAGMA {schema}.page_count").fetchone()[0]
+        return freed
+
+    def analyze(self) -> None:
+        """クエリプランナ用の統計を取り直す（archive に移して行数が大きく変わった後など）。"""
+        with self._lock:
+            self.conn.execute("ANALYZE")
+            self.conn.commit()
+
+    def get_state(self, key: str) -> Optional[str]:
+        """key はアカウントごとに別の名前空間になる。"""
+        with self._lock:
+            cur = self.conn.execute("SELECT value FROM sync_state WHERE key = ?", (self._state_key(key),))
+            row = cur.fetchone()
+        return row["value"] if row else None
+
+    def set_state(self, key: str, value: str) -> None:
+        now = datetime.utcnow().isoformat()
+        with self._transaction() as conn:
+            conn.execute(
+                """
+                INSERT INTO sync_state (key, value, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+                """,
+                (self._state_key(key), value, now),
+            )
 
     def close(self) -> None:
-        self.conn.close()
+        with self._lock:
+            self.conn.close()
+
+
+def _details(event: Event) -> Tuple[Optional[str], Optional[str], Optional[str], float, int, Optional[str]]:
+    return (
+        event.location_name,
+        event.address,
+        event.instructor,
+        event.confidence,
+        1 if event.time_unknown else 0,
+        event.end.isoformat() if event.end is not None else None,
+    )
@@ -3,24 +3,10 @@ from __future__ import annotations
 from datetime import timedelta
 from typing import Optional, List, Dict, Any, Tuple
 
-from googleapiclient.discovery import build
-
-from .auth import get_credentials
+from .calendar_backend import CalendarBackend, as_calendar_backend
 from .config import Config
 from .models import Event
-
-# NOTE:
-# token.json を 1つで運用しているなら、モジュールごとに scope がズレると 403 になりがちなので
-# Gmail/Calendar 両方を入れておくのが安全（あなたの運用に合わせている）
-SCOPES_CAL = [
-    "https://www.googleapis.com/auth/gmail.readonly",
-    "https://www.googleapis.com/auth/calendar",
-]
-
-
-def get_calendar_service(config: Config):
-    creds = get_credentials(SCOPES_CAL, config.google_client_secret_path, config.google_token_path)
-    return build("calendar", "v3", credentials=creds)
+from .telemetry import Telemetry, timed
 
 
 def build_description(event: Event) -> str:
@@ -64,16 +50,23 @@ def build_location(event: Event) -> Optional[str]:
 def _build_gcal_time_range(config: Config, event: Event) -> Tuple[Dict[str, str], Dict[str, str]]:
     """
     Google Calendar API の start/end フォーマットを組み立てる
+    終了は event.end（ICS の DTEND など）があればそれ、無ければ DEFAULT_EVENT_DURATION_MINUTES 後
     """
     if event.time_unknown:
         start_date = event.date.date()
         end_date = start_date + timedelta(days=1)
+        if event.end is not None and event.end.date() > start_date:
+            # 複数日の終日イベント（end の日付は含まない）
+            end_date = event.end.date()
         start = {"date": start_date.isoformat()}
         end = {"date": end_date.isoformat()}
         return start, end
 
     start_dt = event.date
-    end_dt = start_dt + timedelta(minutes=config.default_event_duration_minutes)
+    if event.end is not None and event.end > start_dt:
+        end_dt = event.end
+    else:
+        end_dt = start_dt + timedelta(minutes=config.default_event_duration_minutes)
     start = {"dateTime": start_dt.isoformat(), "timeZone": config.timezone}
     end = {"dateTime": end_dt.isoformat(), "timeZone": config.timezone}
     return start, end
@@ -96,34 +89,38 @@ def _build_event_body(config: Config, event: Event) -> Dict[str, Any]:
     return body
 
 
-def upsert_event(config: Config, event: Event, gcal_event_id: Optional[str]) -> str:
+def upsert_event(
+    config: Config,
+    event: Event,
+    gcal_event_id: Optional[str],
+    telemetry: Optional[Telemetry] = None,
+    service=None,
+) -> str:
     """
     既存の eventId が分かっている場合：update
     無い場合：insert
+    service は CalendarBackend か googleapiclient の Calendar クライアント（None なら Config に従って開く）。
     """
-    if not config.yogisync_calendar_id:
-        raise ValueError("YOGISYNC_CALENDAR_ID is not set")
-
-    service = get_calendar_service(config)
     body = _build_event_body(config, event)
+    with as_calendar_backend(config, service, telemetry) as backend:
+        if gcal_event_id:
+            return backend.update(gcal_event_id, body)
+        return backend.insert(body)
 
-    if gcal_event_id:
-        updated = (
-            service.events()
-            .update(calendarId=config.yogisync_calendar_id, eventId=gcal_event_id, body=body)
-            .execute()
-        )
-        return updated.get("id")
 
-    created = (
-        service.events()
-        .insert(calendarId=config.yogisync_calendar_id, body=body)
-        .execute()
-    )
-    return created.get("id")
+def _search_window(event: Event) -> Tuple[str, str]:
+    """event_uid を検索する時間帯（日付の前後7日。大きいカレンダーだと重要）。"""
+    if event.time_unknown:
+        # all-day は date ベースなので、前後数日で十分
+        center = event.date.replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        center = event.date
+    return (center - timedelta(days=7)).isoformat(), (center + timedelta(days=7)).isoformat()
 
 
-def _find_events_by_event_uid(config: Config, event: Event) -> List[Dict[str, Any]]:
+def _find_events_by_event_uid(
+    config: Config, event: Event, telemetry: Optional[Telemetry] = None, service=None
+) -> List[Dict[str, Any]]:
     """
     description に入っている event_uid をキーに、該当イベントを検索して返す。
 
@@ -134,52 +131,9 @@ def _find_events_by_event_uid(config: Config, event: Event) -> List[Dict[str, An
       event_uid の仕様を変えたなら、ここも自動でその新UIDで検索される。
       （Peatixは reservation_id にする前提）
     """
-    if not config.yogisync_calendar_id:
-        raise ValueError("YOGISYNC_CALENDAR_ID is not set")
-
-    service = get_calendar_service(config)
-    event_uid = event.ensure_event_uid()
-
-    # 日付周辺だけを見る（大きいカレンダーだと重要）
-    if event.time_unknown:
-        # all-day は date ベースなので、前後数日で十分
-        center = event.date.replace(hour=0, minute=0, second=0, microsecond=0)
-    else:
-        center = event.date
-
-    time_min = (center - timedelta(days=7)).isoformat()
-    time_max = (center + timedelta(days=7)).isoformat()
-
-    items: List[Dict[str, Any]] = []
-    page_token: Optional[str] = None
-
-    while True:
-        resp = (
-            service.events()
-            .list(
-                calendarId=config.yogisync_calendar_id,
-                q=event_uid,
-                timeMin=time_min,
-                timeMax=time_max,
-                singleEvents=True,
-                maxResults=2500,
-                pageToken=page_token,
-            )
-            .execute()
-        )
-        items.extend(resp.get("items", []) or [])
-        page_token = resp.get("nextPageToken")
-        if not page_token:
-            break
-
-    # 念のため「本当に event_uid を含む」ものに絞る（q検索は緩いことがある）
-    filtered: List[Dict[str, Any]] = []
-    for it in items:
-        desc = it.get("description") or ""
-        if event_uid in desc:
-            filtered.append(it)
-
-    return filtered
+    time_min, time_max = _search_window(event)
+    with as_calendar_backend(config, service, telemetry) as backend:
+        return backend.find_by_uid(event.ensure_event_uid(), time_min, time_max)
 
 
 def _choose_keep_event_id(events: List[Dict[str, Any]]) -> str:
@@ -209,6 +163,8 @@ def reconcile_event(
     *,
     allow_create: bool = True,
     cleanup_duplicates: bool = True,
+    telemetry: Optional[Telemetry] = None,
+    service=None,
 ) -> Optional[str]:
     """
     “重複しない” を強制するための統合関数。
@@ -222,14 +178,33 @@ def reconcile_event(
       - 最終的に採用した gcal_event_id（作成/更新/保持）
       - allow_create=False で 0件なら None
     """
-    if not config.yogisync_calendar_id:
-        raise ValueError("YOGISYNC_CALENDAR_ID is not set")
+    with as_calendar_backend(config, service, telemetry) as backend:
+        return _reconcile_event(
+            config,
+            event,
+            stored_gcal_event_id,
+            backend,
+            allow_create=allow_create,
+            cleanup_duplicates=cleanup_duplicates,
+            telemetry=telemetry,
+        )
 
-    service = get_calendar_service(config)
+
+def _reconcile_event(
+    config: Config,
+    event: Event,
+    stored_gcal_event_id: Optional[str],
+    backend: CalendarBackend,
+    *,
+    allow_create: bool,
+    cleanup_duplicates: bool,
+    telemetry: Optional[Telemetry],
+) -> Optional[str]:
     body = _build_event_body(config, event)
 
     # まず event_uid で検索（既存を拾う）
-    found = _find_events_by_event_uid(config, event)
+    with timed(telemetry, "calendar.search", event.provider):
+        found = _find_events_by_event_uid(config, event, telemetry, backend)
 
     # 既にDBにgcal_event_idがあるなら、それが found の中にあるかも見る
     stored_in_found = False
@@ -243,12 +218,7 @@ def reconcile_event(
     if not found:
         if not allow_create:
             return None
-        created = (
-            service.events()
-            .insert(calendarId=config.yogisync_calendar_id, body=body)
-            .execute()
-        )
-        return created.get("id")
+        return backend.insert(body)
 
     # 1件：それを update（ただし stored id があるなら stored を優先）
     if len(found) == 1:
@@ -258,12 +228,7 @@ def reconcile_event(
             # 保険
             target_id = existing_id
 
-        updated = (
-            service.events()
-            .update(calendarId=config.yogisync_calendar_id, eventId=target_id, body=body)
-            .execute()
-        )
-        return updated.get("id")
+        return backend.update(target_id, body)
 
     # 複数件：重複掃除
     keep_id: str
@@ -277,12 +242,7 @@ def reconcile_event(
             eid = it.get("id")
             if not eid or eid == keep_id:
                 continue
-            service.events().delete(calendarId=config.yogisync_calendar_id, eventId=eid).execute()
+            backend.delete(eid)
 
     # 残す1件を最新情報で update
-    updated = (
-        service.events()
-        .update(calendarId=config.yogisync_calendar_id, eventId=keep_id, body=body)
-        .execute()
-    )
-    return updated.get("id")
+    return backend.update(keep_id, body)
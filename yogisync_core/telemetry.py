@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import logging
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from googleapiclient.errors import HttpError
+
+from . import ratelimit
+
+logger = logging.getLogger(__name__)
+
+# Gmail API の quota units（https://developers.google.com/gmail/api/reference/quota）
+# Calendar API は 1リクエスト = 1 として数える
+GMAIL_QUOTA_UNITS: Dict[str, int] = {
+    "messages.list": 5,
+    "messages.get": 5,
+    "messages.attachments.get": 5,
+    "messages.batchModify": 50,
+    "history.list": 2,
+    "threads.list": 10,
+    "threads.get": 10,
+    "labels.list": 1,
+    "labels.create": 5,
+    "getProfile": 1,
+}
+
+# 429 / 5xx はバックオフして再試行する
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DEFAULT_API_RETRIES = 3
+
+LabelKey = Tuple[Tuple[str, str], ...]
+T = TypeVar("T")
+
+
+def _percentile(sorted_samples: List[float], pct: float) -> float:
+    """nearest-rank 法。sorted_samples は昇順ソート済みであること。"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_samples)))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def _stats(samples: List[float]) -> Dict[str, float]:
+    s = sorted(samples)
+    return {
+        "count": len(s),
+        "total_ms": round(sum(s) * 1000, 3),
+        "p50_ms": round(_percentile(s, 50) * 1000, 3),
+        "p95_ms": round(_percentile(s, 95) * 1000, 3),
+        "max_ms": round(s[-1] * 1000, 3) if s else 0.0,
+    }
+
+
+class Telemetry:
+    """
+    1回の同期実行の計測値を集める。
+    - stage: "gmail.fetch" / "parse" / "store" / "reconcile" などの処理単位
+    - api.*: Google API 呼び出し1回ごと（"api.calendar.events.list" など）
+    provider を付けて記録したものは provider 別にも集計する。
+    ワーカースレッドから同時に呼ばれても良いように lock で守る。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = defaultdict(list)
+        self._provider_samples: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+        self._counters: Dict[str, Dict[LabelKey, float]] = defaultdict(lambda: defaultdict(float))
+
+    def observe(self, name: str, seconds: float, provider: Optional[str] = None) -> None:
+        with self._lock:
+            self._samples[name].append(seconds)
+            if provider:
+                self._provider_samples[provider][name].append(seconds)
+
+    def incr(self, name: str, value: float = 1.0, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._counters[name][key] += value
+
+    def counter_total(self, name: str, **labels: str) -> float:
+        """name のカウンタのうち、labels が全部一致するものの合計。"""
+        want = set(labels.items())
+        with self._lock:
+            return sum(v for key, v in self._counters.get(name, {}).items() if want <= set(key))
+
+    @contextmanager
+    def stage(self, name: str, provider: Optional[str] = None) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, provider)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {name: _stats(samples) for name, samples in sorted(self._samples.items())}
+            by_provider = {
+                provider: {name: _stats(samples) for name, samples in sorted(per.items())}
+                for provider, per in sorted(self._provider_samples.items())
+            }
+        return {"stages": stages, "by_provider": by_provider}
+
+    def snapshot(self) -> Tuple[Dict[str, List[float]], Dict[str, Dict[str, List[float]]], Dict[str, Dict[LabelKey, float]]]:
+        """metrics 出力用に生の値をコピーして返す（samples, provider別samples, counters）。"""
+        with self._lock:
+            samples = {k: list(v) for k, v in self._samples.items()}
+            provider_samples = {p: {k: list(v) for k, v in per.items()} for p, per in self._provider_samples.items()}
+            counters = {k: dict(v) for k, v in self._counters.items()}
+        return samples, provider_samples, counters
+
+
+def timed(telemetry: Optional[Telemetry], name: str, provider: Optional[str] = None) -> ContextManager[None]:
+    """telemetry が None なら何もしない stage()。"""
+    if telemetry is None:
+        return nullcontext()
+    return telemetry.stage(name, provider)
+
+
+def timed_iter(items: Iterable[T], telemetry: Optional[Telemetry], name: str) -> Iterator[T]:
+    """
+    ジェネレータから1件取り出すのにかかった時間を name として記録しながら流す。
+    （取得と処理が交互に進むストリーミングでも、取得側の時間だけを測れる）
+    """
+    it = iter(items)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            if telemetry is not None:
+                telemetry.observe(name, time.perf_counter() - start)
+            return
+        if telemetry is not None:
+            telemetry.observe(name, time.perf_counter() - start)
+        yield item
+
+
+def _quota_units(name: str) -> int:
+    api, _, method = name.partition(".")
+    if api == "gmail":
+        return GMAIL_QUOTA_UNITS.get(method, 5)
+    return 1
+
+
+def timed_execute(
+    request: Any,
+    telemetry: Optional[Telemetry],
+    name: str,
+    retries: int = DEFAULT_API_RETRIES,
+) -> Any:
+    """
+    googleapiclient の HttpRequest.execute() を計測付きで実行する。
+    name は "gmail.messages.get" / "calendar.events.list" の形式。
+    429 / 5xx は指数バックオフで retries 回まで再試行する（再試行も quota を消費する）。
+    """
+    api, _, method = name.partition(".")
+    attempt = 0
+    while True:
+        waited = ratelimit.acquire()
+        if telemetry is not None:
+            if waited:
+                telemetry.observe("ratelimit.wait", waited)
+            telemetry.incr("api_calls", api=api, method=method)
+            telemetry.incr("quota_units", _quota_units(name), api=api)
+        try:
+            with timed(telemetry, f"api.{name}"):
+                return request.execute()
+        except HttpError as e:
+            status = getattr(e.resp, "status", None)
+            if status not in RETRY_STATUSES or attempt >= retries:
+                if telemetry is not None:
+                    telemetry.incr("api_errors", api=api, method=method, status=str(status))
+                raise
+            attempt += 1
+            delay = min(32.0, 0.5 * (2 ** attempt)) + random.uniform(0, 0.25)
+            logger.warning("api: %s returned %s, retry %d/%d in %.1fs", name, status, attempt, retries, delay)
+            if telemetry is not None:
+                telemetry.incr("api_retries", api=api, method=method)
+            time.sleep(delay)
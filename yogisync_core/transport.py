@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import google_auth_httplib2
+import httplib2
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_TIMEOUT = 60
+
+# Google API は User-Agent に "gzip" を含むリクエストにだけ gzip で返す
+USER_AGENT = "yogisync"
+
+
+class PooledHttp:
+    """
+    googleapiclient の build(http=...) に渡す、スレッド安全な HTTP トランスポート。
+
+    httplib2.Http は1つを複数スレッドで同時に使えないので、AuthorizedHttp を pool_size 個までプールし、
+    request() ごとに1つ借りて返す。借りた Http は keep-alive の接続を持ったまま戻るので、
+    同じホストへの2回目以降は TLS ハンドシェイクをしない。
+    Gmail と Calendar のクライアントは同じ PooledHttp（= 同じ credentials と接続プール）を共有する。
+    """
+
+    def __init__(
+        self,
+        credentials: Credentials,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: Optional[float] = DEFAULT_TIMEOUT,
+    ) -> None:
+        self.credentials = credentials
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[google_auth_httplib2.AuthorizedHttp]" = queue.LifoQueue()
+        self._all: List[google_auth_httplib2.AuthorizedHttp] = []
+        self._lock = threading.Lock()
+
+    def _new_http(self) -> google_auth_httplib2.AuthorizedHttp:
+        return google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=self.timeout))
+
+    @contextmanager
+    def _borrow(self) -> Iterator[google_auth_httplib2.AuthorizedHttp]:
+        try:
+            http = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                http = self._new_http() if len(self._all) < self.pool_size else None
+                if http is not None:
+                    self._all.append(http)
+            if http is None:
+                # 全部使用中なら空くまで待つ
+                http = self._idle.get()
+        try:
+            yield http
+        finally:
+            self._idle.put(http)
+
+    def request(
+        self,
+        uri: str,
+        method: str = "GET",
+        body: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        redirections: int = httplib2.DEFAULT_MAX_REDIRECTS,
+        connection_type: Any = None,
+        **kwargs: Any,
+    ):
+        headers = dict(headers or {})
+        headers.setdefault("accept-encoding", "gzip, deflate")
+        ua = f"{USER_AGENT} {headers['user-agent']}" if headers.get("user-agent") else USER_AGENT
+        headers["user-agent"] = ua if "gzip" in ua else f"{ua} (gzip)"
+        with self._borrow() as http:
+            return http.request(
+                uri,
+                method=method,
+                body=body,
+                headers=headers,
+                redirections=redirections,
+                connection_type=connection_type,
+                **kwargs,
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            for http in self._all:
+                http.close()
+            self._all.clear()
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+
+def build_service(name: str, version: str, http: PooledHttp, api_endpoint: str = ""):
+    """
+    googleapiclient のクライアントを作る。api_endpoint を渡すと、同梱の discovery の rootUrl を差し替えて
+    そのサーバに向ける（client_options の api_endpoint では batch の URL が Google のままになるため）。
+    """
+    if not api_endpoint:
+        return build(name, version, http=http)
+    doc = json.loads(get_static_doc(name, version))
+    doc["rootUrl"] = doc["mtlsRootUrl"] = api_endpoint.rstrip("/") + "/"
+    return build_from_document(doc, http=http)
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import logging
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from .accounts import open_sessions, sync_accounts
+from .config import Config
+from .metrics import MetricsRegistry, start_metrics_server
+from .models import SyncResult
+from .store import EventStore
+
+logger = logging.getLogger(__name__)
+
+
+class Watcher:
+    """
+    `cli watch` の本体。1プロセスで常駐し、interval 秒ごとに新着メールだけを同期する。
+
+    - Gmail / Calendar クライアントと EventStore の接続は起動時に1回だけ作って使い回す
+    - 毎tickは Gmail history.list で前回以降の追加分だけを見る（起点はアカウント別に sync_state に保存）
+    - token が切れたら refresh、refresh できなければ次のtickで認証からやり直す
+    - 複数アカウントは1つのスレッドプールで並行に回す
+    - SIGINT / SIGTERM で実行中のtickを終えてから止まる
+    """
+
+    def __init__(self, config: Config, interval: float, limit: int = 50) -> None:
+        self.config = config
+        self.interval = interval
+        self.limit = limit
+        self.metrics = MetricsRegistry()
+        self._stop = threading.Event()
+        self.store = EventStore(config.sqlite_path, archive_path=config.archive_path)
+        self.sessions = open_sessions(config, self.store)
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, min(config.account_concurrency, len(self.sessions))),
+            thread_name_prefix="yogisync-account",
+        )
+
+    def tick(self) -> Optional[SyncResult]:
+        try:
+            result = sync_accounts(
+                self.sessions,
+                self.limit,
+                metrics=self.metrics,
+                incremental=True,
+                executor=self._pool,
+            )
+        except Exception:
+            logger.exception("watch: tick failed")
+            return None
+
+        if result.created or result.updated or result.errors:
+            logger.info(
+                "watch: tick created=%d updated=%d skipped=%d errors=%d",
+                result.created,
+                result.updated,
+                result.skipped,
+                result.errors,
+            )
+        return result
+
+    def stop(self, *_: object) -> None:
+        if not self._stop.is_set():
+            logger.info("watch: stopping after current tick")
+        self._stop.set()
+
+    def run(self) -> None:
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self.stop)
+            signal.signal(signal.SIGTERM, self.stop)
+
+        server = None
+        if self.config.metrics_port:
+            server = start_metrics_server(self.metrics, self.config.metrics_port)
+
+        logger.info(
+            "watch: interval=%ss accounts=%d sqlite_path=%s",
+            self.interval,
+            len(self.sessions),
+            self.config.sqlite_path,
+        )
+        try:
+            while not self._stop.is_set():
+                started = time.monotonic()
+                self.tick()
+                # tick にかかった分を差し引いて待つ（stop されたら即抜ける）
+                self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+        finally:
+            if server is not None:
+                server.shutdown()
+            self._pool.shutdown(wait=True)
+            for session in self.sessions:
+                session.reset()
+            self.store.close()
+            logger.info("watch: stopped")